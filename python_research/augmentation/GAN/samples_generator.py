@@ -5,7 +5,7 @@ from typing import List
 
 from python_research.augmentation.GAN.generator import Generator
 from python_research.dataset_structures import \
-    Dataset
+    Dataset, get_random_state
 from utils import calculate_augmented_count_per_class
 
 SMALLEST_POSSIBLE_BATCH_SIZE = 2
@@ -17,16 +17,19 @@ class SamplesGenerator:
     """
     def __init__(self, device='cpu',
                  noise_mean: float=0.5,
-                 noise_std: float=0.1):
+                 noise_std: float=0.1,
+                 seed: int=None):
         """
         :param device: Whether to use 'cpu' or 'gpu'
         :param noise_mean: center of the random noise provided to the generator
         :param noise_std: standard deviation of the random noise provided
         to the generator
+        :param seed: Seed of the random noise
         """
         self.device = device
         self.noise_mean = noise_mean
         self.noise_std = noise_std
+        self.random_state = get_random_state(seed)
 
     def generate(self, dataset: Dataset, generator: Generator,
                  sampling_mode='twice') -> [torch.Tensor, List[int]]:
@@ -43,8 +46,8 @@ class SamplesGenerator:
         :return: Synthesized samples (Tensor) and labels of all synthesized
         samples (list)
         """
-        labels, class_counts = np.unique(dataset.get_labels(), return_counts=True)
-        class_counts = dict(zip(labels, class_counts))
+        class_index = dataset.class_index
+        class_counts = dict(zip(class_index.classes, class_index.counts))
         to_generate_count = calculate_augmented_count_per_class(class_counts,
                                                                 sampling_mode)
         generated_x = torch.Tensor(0)
@@ -55,10 +58,9 @@ class SamplesGenerator:
             to_generate = to_generate_count[label]
             if to_generate < SMALLEST_POSSIBLE_BATCH_SIZE:
                 continue
-            noise = torch.FloatTensor(np.random.normal(self.noise_mean,
-                                                       self.noise_std,
-                                                       (to_generate,
-                                                        dataset.shape[-1])))
+            noise = torch.FloatTensor(
+                self.random_state.normal(self.noise_mean, self.noise_std,
+                                         (to_generate, dataset.shape[-1])))
             label_one_hot = to_categorical(np.full(to_generate, label),
                                            len(class_counts))
             label_one_hot = torch.from_numpy(label_one_hot)
@@ -1,9 +1,7 @@
-from random import shuffle
-
 import numpy as np
 from python_research.augmentation.transformations import ITransformation
 from python_research.dataset_structures import \
-    Dataset
+    Dataset, get_random_state
 from utils import calculate_augmented_count_per_class
 
 
@@ -13,7 +11,7 @@ class OfflineAugmenter:
     is based on the provided transformation.
     """
     def __init__(self, transformation: ITransformation,
-                 sampling_mode: str='max_twice'):
+                 sampling_mode: str='max_twice', seed: int=None):
         """
         :param transformation: Transformation to be applied to the dataset
         :param sampling_mode: 'max_twice: If twice the number of samples
@@ -22,9 +20,11 @@ class OfflineAugmenter:
         can be calculated as a difference between most numerous class count and
         number of samples in given class.
         'twice': double the number of samples for each class
+        :param seed: Seed used to draw samples to augment
         """
         self.transformation = transformation
         self.sampling_mode = sampling_mode
+        self.random_state = get_random_state(seed)
 
     def augment(self, dataset: Dataset, transformations: int=1)-> \
             [np.ndarray, np.ndarray]:
@@ -35,18 +35,13 @@ class OfflineAugmenter:
         sample
         :return: Augmented samples as well as their respective labels
         """
-        labels, class_counts = np.unique(dataset.get_labels(), return_counts=True)
-        class_counts = dict(zip(labels, class_counts))
+        class_index = dataset.class_index
+        class_counts = dict(zip(class_index.classes, class_index.counts))
         augmented_count = calculate_augmented_count_per_class(class_counts,
                                                               self.sampling_mode)
-        indices_to_augment = []
-        augmented_labels = []
-        for label in augmented_count.keys():
-            indices = np.where(dataset.get_labels() == label)[0]
-            shuffle(indices)
-            indices = indices[:augmented_count[label]]
-            indices_to_augment += list(indices)
-            augmented_labels += [label for _ in range(augmented_count[label])]
-        to_augment = dataset.get_data()[indices_to_augment, ...]
+        counts = [augmented_count[label] for label in class_index.classes]
+        indices_to_augment = class_index.sample(counts, self.random_state)
+        augmented_labels = np.repeat(class_index.classes, counts)
+        to_augment, _ = dataset[indices_to_augment]
         return self.transformation.transform(to_augment, transformations), \
-               np.array(augmented_labels)
+               augmented_labels
@@ -1,14 +1,11 @@
 import numpy as np
-from collections import OrderedDict
-from typing import List, Dict, Tuple
+from typing import Iterator, List, Tuple
 
 from python_research.dataset_structures import Dataset
 from python_research.augmentation.transformations import ITransformation
+from python_research.metrics import ConfusionMatrix
 from keras.models import Model
 
-TOTAL_COUNT = 0
-CORRECT_COUNT = 1
-
 
 class OnlineAugmenter:
     """
@@ -23,7 +20,8 @@ class OnlineAugmenter:
         self.class_accuracy = None
 
     def evaluate(self, model: Model, dataset: Dataset,
-                 transformation: ITransformation, transformations: int=4):
+                 transformation: ITransformation, transformations: int=4,
+                 batch_size: int=1024):
         """
         Evaluate overall and class accuracy for provided dataset using given
         transformation to augment each sample.
@@ -33,97 +31,101 @@ class OnlineAugmenter:
                                method
         :param transformations: Number of transformations to perform on each
                                 sample
+        :param batch_size: Number of samples augmented and classified at once
         :return: float, np.ndarray: Overall accuracy and a list of accuracies
                                     for each class
         """
-        samples_count = len(dataset)
-        labels = np.unique(dataset.get_labels())
-        class_counts = OrderedDict((label, [0, 0]) for label in labels)
-        for sample_index in range(samples_count):
-            sample, label = dataset[sample_index]
-            augmented_samples = transformation.transform(sample,
-                                                         transformations)
-            augmented_samples = np.expand_dims(augmented_samples, axis=-1)
-            sample = np.expand_dims(sample, axis=-1)
-            sample = np.expand_dims(sample, axis=0)
-            to_predict = np.vstack([sample, augmented_samples])
-            predictions = model.predict(x=to_predict)
-            predictions = np.argmax(predictions, axis=1)
-            predicted_label = self._vote(predictions)
-            class_counts[label][TOTAL_COUNT] += 1
-            if predicted_label == label:
-                class_counts[label][CORRECT_COUNT] += 1
-        accuracy = self._calculate_overall_accuracy(class_counts)
-        class_accuracies = self._calculate_class_accuracies(class_counts)
+        labels = dataset.get_labels()
+        classes_count = model.output_shape[-1]
+        if len(labels) > 0:
+            classes_count = max(classes_count, int(np.max(labels)) + 1)
+        confusion_matrix = ConfusionMatrix(classes_count)
+        for predicted_labels, batch_labels in self._predict_batches(
+                model, dataset, transformation, transformations, batch_size):
+            confusion_matrix.update(predicted_labels, batch_labels)
+        accuracy = confusion_matrix.overall_accuracy
+        class_accuracies = confusion_matrix.class_accuracies[np.unique(labels)]
         return accuracy, class_accuracies
 
     def predict(self, model: Model, dataset: Dataset,
-                transformation: ITransformation, transformations: int=4) -> \
-            List[int]:
+                transformation: ITransformation, transformations: int=4,
+                batch_size: int=1024) -> List[int]:
         """
-        Predict labels for given dataset
+        Predict labels for given dataset. Samples are processed batch_size at
+        a time: all augmentations of a batch are created with a single call
+        to the transformation and classified with a single call to the model.
         :param model: Keras model for predicting labels
         :param dataset: Dataset for which the labels should be predicted
         :param transformation: Transformation t obe used as an augmentation
                                method
         :param transformations: Number of transformations to perform on each
                                 sample
+        :param batch_size: Number of samples augmented and classified at once
         :return: List with predicted labels
         """
-        samples_count = len(dataset)
         predicted_labels = []
-        for sample_index in range(samples_count):
-            sample, label = dataset[sample_index]
-            augmented_samples = transformation.transform(sample,
-                                                         transformations)
-            augmented_samples = np.expand_dims(augmented_samples, axis=-1)
-            sample = np.expand_dims(sample, axis=-1)
-            sample = np.expand_dims(sample, axis=0)
-            to_predict = np.vstack([sample, augmented_samples])
-            predictions = model.predict(x=to_predict)
-            predictions = np.argmax(predictions, axis=1)
-            predicted_label = self._vote(predictions)
-            predicted_labels.append(predicted_label)
+        for batch_predicted_labels, _ in self._predict_batches(
+                model, dataset, transformation, transformations, batch_size):
+            predicted_labels.extend(batch_predicted_labels)
         return predicted_labels
 
-    @staticmethod
-    def _vote(predictions: np.ndarray) -> int:
+    def _predict_batches(self, model: Model, dataset: Dataset,
+                         transformation: ITransformation, transformations: int,
+                         batch_size: int) -> Iterator[Tuple[np.ndarray,
+                                                            np.ndarray]]:
         """
-        Perform the majority voting
-        :param predictions: Predictions returned by the model
-        :return: Final label
+        Predict labels of consecutive batches of samples
+        :param model: Keras model for predicting labels
+        :param dataset: Dataset for which the labels should be predicted
+        :param transformation: Transformation used for the augmentation
+        :param transformations: Number of transformations of each sample
+        :param batch_size: Number of samples augmented and classified at once
+        :return: Iterator over predicted and true labels
         """
-        unique, counts = np.unique(predictions, return_counts=True)
-        max_index = np.argmax(counts)
-        return unique[max_index]
+        for start in range(0, len(dataset), batch_size):
+            samples, labels = dataset[start:start + batch_size]
+            augmented_samples = self._augment(samples, transformation,
+                                              transformations)
+            to_predict = np.concatenate([samples[:, np.newaxis],
+                                         augmented_samples], axis=1)
+            votes = to_predict.shape[1]
+            to_predict = to_predict.reshape((-1, ) + samples.shape[1:])
+            to_predict = np.expand_dims(to_predict, axis=-1)
+            predictions = model.predict(x=to_predict,
+                                        batch_size=len(to_predict))
+            predictions = np.argmax(predictions, axis=1)
+            yield self._vote(predictions.reshape((-1, votes))), labels
 
     @staticmethod
-    def _calculate_class_accuracies(class_counts: Dict[int, Tuple]) \
-            -> List:
+    def _augment(samples: np.ndarray, transformation: ITransformation,
+                 transformations: int) -> np.ndarray:
         """
-        Calculate accuracy for each class separately
-        :param class_counts: Dictionary with the number of correctly predicted
-        samples as well as with total number of samples for each class.
-        :return: List of accuracies for each class
+        Augment a batch of samples
+        :param samples: Samples to be augmented
+        :param transformation: Transformation used for the augmentation
+        :param transformations: Number of transformations of each sample
+        :return: Augmented samples of shape (samples, augmentations, ...)
         """
-        accuracies = []
-        for key in class_counts.keys():
-            accuracies.append(float(class_counts[key][CORRECT_COUNT]) /
-                              float(class_counts[key][TOTAL_COUNT]))
-        return np.array(accuracies)
+        augmented_samples = transformation.transform(samples, transformations)
+        if augmented_samples.ndim > samples.ndim:
+            # Transformations of each sample stacked along the first axis
+            return np.swapaxes(augmented_samples, 0, 1)
+        # Consecutive transformations of each sample
+        return augmented_samples.reshape((len(samples), -1) +
+                                         samples.shape[1:])
 
     @staticmethod
-    def _calculate_overall_accuracy(class_counts: Dict[int, Tuple]) \
-            -> int:
+    def _vote(predictions: np.ndarray) -> np.ndarray:
         """
-        Calculate overall accuracy (percentage of correctly predicted samples)
-        :param class_counts: Dictionary with the number of correctly predicted
-        samples as well as with total number of samples for each class.
-        :return: Percentage of correctly predicted samples
+        Perform the majority voting for each sample. Votes of all samples are
+        counted with a single bincount, ties are resolved in favour of the
+        lowest label.
+        :param predictions: Predictions returned by the model, of shape
+                            (samples, votes)
+        :return: Final label of each sample
         """
-        total_count = 0
-        correct_count = 0
-        for key in class_counts.keys():
-            total_count += class_counts[key][TOTAL_COUNT]
-            correct_count += class_counts[key][CORRECT_COUNT]
-        return float(correct_count) / float(total_count)
+        classes = np.max(predictions) + 1
+        offsets = np.arange(len(predictions))[:, np.newaxis] * classes
+        counts = np.bincount((predictions + offsets).ravel(),
+                             minlength=len(predictions) * classes)
+        return np.argmax(counts.reshape((-1, classes)), axis=1)
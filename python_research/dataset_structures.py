@@ -1,28 +1,729 @@
+import os
 import abc
+import shutil
+import weakref
+import tempfile
 from copy import copy
 from math import ceil
 from os import PathLike
-from random import shuffle
-from itertools import product
-from collections import Iterable
+from queue import Queue, Full
+from threading import Thread, Event
+from collections.abc import Iterable
 
 import torch
 import numpy as np
 from typing import List
+from numpy.lib.stride_tricks import as_strided
 from keras.utils import to_categorical
 
 from python_research.io import load_data
+from python_research.sample_cache import SampleCache
+from python_research.running_statistics import RunningStatistics
 
 HEIGHT = 0
 WIDTH = 1
 DEPTH = 2
+CHUNK_SIZE = 4096
+CHUNK_ELEMENTS = 2 ** 16
+SHARED_MEMORY_DIRECTORY = '/dev/shm'
 
 
-class Dataset:
+def normalize_inplace(data: np.ndarray, shift: float,
+                      scale: float) -> np.ndarray:
+    """
+    Compute (data - shift) / scale in place, CHUNK_ELEMENTS values at a time
+    so each chunk stays in cache between the subtraction and the division.
+    Integer data is first copied to float64, read-only floating data is
+    copied with its dtype.
+    :param data: Array to normalize
+    :param shift: Value subtracted from the data
+    :param scale: Value the shifted data is divided by
+    :return: Normalized array, the same object as data unless it was copied
+    """
+    floating = np.issubdtype(data.dtype, np.floating)
+    if not floating or not data.flags.writeable:
+        data = data.astype(data.dtype if floating else np.float64)
+    if data.size == 0:
+        return data
+    sample_size = int(np.prod(data.shape[1:]))
+    rows = max(1, CHUNK_ELEMENTS // max(1, sample_size))
+    for start in range(0, len(data), rows):
+        chunk = data[start:start + rows]
+        np.subtract(chunk, shift, out=chunk)
+        np.divide(chunk, scale, out=chunk)
+    return data
+
+
+class ClassIndex:
+    """
+    Indices of samples grouped by class in a CSR layout: indices of samples
+    of classes[i] are indices[offsets[i]:offsets[i + 1]], in increasing
+    order. Built with a single stable argsort of the labels.
+    """
+    def __init__(self, labels: np.ndarray):
+        labels = np.asarray(labels)
+        self.indices = np.argsort(labels, kind='mergesort')
+        self.classes, starts, self.counts = np.unique(labels[self.indices],
+                                                      return_index=True,
+                                                      return_counts=True)
+        self.offsets = np.append(starts, len(labels))
+        self._positions = np.repeat(np.arange(len(self.classes)), self.counts)
+
+    def __getitem__(self, label) -> np.ndarray:
+        """
+        :param label: Class label
+        :return: Indices of samples of the class
+        """
+        position = np.searchsorted(self.classes, label)
+        if position == len(self.classes) or self.classes[position] != label:
+            return self.indices[0:0]
+        return self.indices[self.offsets[position]:self.offsets[position + 1]]
+
+    def shuffled(self, random_state=np.random) -> np.ndarray:
+        """
+        Shuffle indices within each class
+        :param random_state: np.random.RandomState used for shuffling,
+                             numpy's global state if not specified
+        :return: Indices grouped by class, in random order within each class
+        """
+        keys = self._positions + random_state.random_sample(len(self.indices))
+        return self.indices[np.argsort(keys)]
+
+    def sample(self, counts: np.ndarray, random_state=np.random) -> np.ndarray:
+        """
+        Draw random samples of each class without replacement
+        :param counts: Number of samples to draw from each class, given in
+                       the order of classes. Counts larger than the size of
+                       a class are clipped to it.
+        :param random_state: np.random.RandomState used for drawing,
+                             numpy's global state if not specified
+        :return: Indices of drawn samples grouped by class
+        """
+        counts = np.minimum(np.asarray(counts, dtype=np.intp), self.counts)
+        shifts = self.offsets[:-1] - (np.cumsum(counts) - counts)
+        positions = np.repeat(shifts, counts) + np.arange(np.sum(counts))
+        return self.shuffled(random_state)[positions]
+
+
+def get_random_state(seed: int=None):
+    """
+    :param seed: Seed of the random generator
+    :return: np.random.RandomState seeded with seed, numpy's global random
+             state if seed is not specified
+    """
+    return np.random if seed is None else np.random.RandomState(seed)
+
+
+def attach_shared_memory(worker_id: int):
+    """
+    Worker init hook of torch DataLoader (worker_init_fn) for datasets
+    backed by shared memory (see Dataset.share_memory). Maps the shared
+    arrays into the worker read-only and seeds numpy's global random state
+    with the seed of the worker, so that random augmentations differ between
+    workers.
+    :param worker_id: Index of the worker
+    :return: None
+    """
+    worker_info = torch.utils.data.get_worker_info()
+    np.random.seed(worker_info.seed % 2 ** 32)
+    storage = getattr(worker_info.dataset, 'storage', None)
+    if storage is not None:
+        storage.attach()
+
+
+class SampleStorage:
+    """
+    Backing store of a dataset, holding samples and labels in two arrays.
+    A storage can be shared between a dataset and subsets extracted from it,
+    each of them referring to its samples by row indices. Shared storage is
+    never modified, datasets copy their rows with take() before modifying
+    them.
+    """
+    # Names of attributes moved to shared memory by share_memory
+    shared_arrays = ('data', )
 
     def __init__(self, data: np.ndarray, labels: np.ndarray):
         self.data = data
         self.labels = labels
+        self.shared = False
+
+    def __len__(self) -> int:
+        return len(self.labels)
+
+    def share_memory(self, directory: PathLike=None):
+        """
+        Move samples to .npy files in shared memory and memory-map them.
+        Pickled storage refers to the files instead of holding the samples,
+        so data loader workers map them without copying. The files are
+        removed when the storage is garbage collected.
+        :param directory: Directory to store the files in, if not specified,
+                          a temporary directory in SHARED_MEMORY_DIRECTORY
+                          is created, or in the default temporary directory
+                          if there is no such directory
+        :return: None
+        """
+        if directory is None:
+            directory = tempfile.mkdtemp(
+                prefix='dataset_', dir=SHARED_MEMORY_DIRECTORY
+                if os.path.isdir(SHARED_MEMORY_DIRECTORY) else None)
+            weakref.finalize(self, shutil.rmtree, directory, True)
+        self.mapped = {}
+        for name in self.shared_arrays:
+            path = os.path.join(directory, name + '.npy')
+            np.save(path, getattr(self, name))
+            self.mapped[name] = (path, np.load(path, mmap_mode='r+'))
+            setattr(self, name, self.mapped[name][1])
+
+    def attach(self, mode: str='r'):
+        """
+        Map shared arrays again, e.g. in a data loader worker
+        :param mode: Mode in which the files are mapped
+        :return: None
+        """
+        for name, (path, _) in getattr(self, 'mapped', {}).items():
+            shape = getattr(self, name).shape
+            self.mapped[name] = (path, np.load(path, mmap_mode=mode))
+            setattr(self, name, self.mapped[name][1].reshape(shape))
+
+    def __getstate__(self) -> dict:
+        state = self.__dict__.copy()
+        mapped = state.pop('mapped', {})
+        state['mapped'] = {}
+        for name, (path, array) in mapped.items():
+            # Arrays replaced after sharing, e.g. converted to another dtype,
+            # are pickled with the storage
+            if np.may_share_memory(state[name], array):
+                state['mapped'][name] = (path, None)
+                state[name] = state[name].shape
+        return state
+
+    def __setstate__(self, state: dict):
+        self.__dict__.update(state)
+        for name, (path, _) in self.mapped.items():
+            self.mapped[name] = (path, np.load(path, mmap_mode='r'))
+            setattr(self, name, self.mapped[name][1].reshape(state[name]))
+
+    @property
+    def sample_shape(self) -> tuple:
+        return tuple(self.data.shape[1:])
+
+    def get_samples(self, rows=None):
+        """
+        :param rows: Index, slice or array of indices of samples,
+                     if not specified, all samples are returned without copying
+        :return: Samples at given rows
+        """
+        if rows is None:
+            return self.data
+        return self.data[rows, ...]
+
+    def get_labels(self, rows=None):
+        """
+        :param rows: Index, slice or array of indices of labels,
+                     if not specified, all labels are returned without copying
+        :return: Labels at given rows
+        """
+        if rows is None:
+            return self.labels
+        return self.labels[rows]
+
+    def crop(self, neighbourhood_size: int) -> 'SampleStorage':
+        """
+        Create a storage of samples cropped to a smaller neighbourhood around
+        their centers. Its data is a view of this storage's data.
+        :param neighbourhood_size: Neighbourhood size of cropped samples
+        :return: New storage
+        """
+        padding_size = HyperspectralDataset._get_padding_size(
+            neighbourhood_size)
+        if self.data.ndim == 2 and neighbourhood_size == 1:
+            return SampleStorage(self.data, self.labels)
+        offset = self.data.shape[1] // 2 - padding_size
+        if self.data.ndim != 4 or offset < 0:
+            raise ValueError("Samples of shape {} cannot be cropped to "
+                             "neighbourhood of size {}"
+                             .format(self.sample_shape, neighbourhood_size))
+        if neighbourhood_size > 1:
+            window = slice(offset, offset + padding_size * 2 + 1)
+            data = self.data[:, window, window, :]
+        else:
+            data = self.data[:, offset, offset, :]
+        return SampleStorage(data, self.labels)
+
+    def take(self, rows: np.ndarray=None) -> 'SampleStorage':
+        """
+        Copy given rows into a new, not shared storage
+        :param rows: Array of indices of samples to copy, if not specified,
+                     all samples are copied
+        :return: New storage
+        """
+        if rows is None:
+            rows = np.arange(len(self))
+        return SampleStorage(self.data[rows, ...], self.labels[rows])
+
+    def gather(self, rows: np.ndarray, samples: np.ndarray,
+               labels: np.ndarray):
+        """
+        Copy samples and labels at given rows into preallocated arrays
+        :param rows: Array of indices of samples
+        :param samples: Array the samples are copied to
+        :param labels: Array the labels are copied to
+        :return: None
+        """
+        # With mode='raise' np.take would write to a temporary array first
+        np.take(self.data, rows, axis=0, out=samples, mode='clip')
+        np.take(self.labels, rows, out=labels, mode='clip')
+
+    def normalize(self, shift: float, scale: float):
+        self.data = normalize_inplace(self.data, shift, scale)
+
+    def expand_dims(self, axis: int):
+        self.data = np.expand_dims(self.data, axis=axis)
+
+    def convert_to_tensors(self, device: str):
+        self.data = torch.from_numpy(self.data).to(device).float()
+        self.labels = torch.from_numpy(self.labels).to(device).float()
+
+    def convert_to_numpy(self):
+        self.data = self.data.numpy()
+        self.labels = self.labels.numpy()
+
+
+class PatchStorage(SampleStorage):
+    """
+    Backing store holding a padded cube and int32 coordinates of the labeled
+    pixels. Patches are gathered from the cube on access, so memory usage is
+    proportional to the size of the scene instead of the number of samples
+    times NEIGHBOURHOOD_SIZE^2. Samples are returned as torch tensors once
+    converted to them. Storages taken from a shared storage or cropped from
+    another one keep referring to the same cube, which is then never
+    modified: they normalize patches when gathering them instead.
+    """
+    shared_arrays = ('cube', )
+
+    def __init__(self, cube: np.ndarray, coordinates: np.ndarray,
+                 labels: np.ndarray, neighbourhood_size: int):
+        self.cube = cube
+        self.coordinates = coordinates
+        self.labels = labels
+        self.neighbourhood_size = neighbourhood_size
+        self.window_size = HyperspectralDataset._get_padding_size(
+            neighbourhood_size) * 2 + 1
+        self.expanded_axes = []
+        self.device = None
+        self.shared = False
+        self.cube_shared = False
+        self.normalization = None
+
+    @property
+    def sample_shape(self) -> tuple:
+        return tuple(self._gather(slice(0, 0)).shape[1:])
+
+    def _normalize(self, samples: np.ndarray) -> np.ndarray:
+        """
+        Apply the normalization deferred by normalize to gathered patches
+        :param samples: Patches, views of the cube are not modified
+        :return: Normalized patches
+        """
+        if self.normalization is None:
+            return samples
+        dtype = samples.dtype if np.issubdtype(samples.dtype, np.floating) \
+            else np.float64
+        return normalize_inplace(samples.astype(dtype), *self.normalization)
+
+    def _gather(self, rows) -> np.ndarray:
+        """
+        Gather patches from the padded cube
+        :param rows: Index, slice or array of indices of samples
+        :return: Patches at given rows
+        """
+        if np.ndim(rows) == 0 and not isinstance(rows, slice):
+            row, column = self.coordinates[rows]
+            if self.neighbourhood_size > 1:
+                samples = self.cube[row:row + self.window_size,
+                                    column:column + self.window_size, ...]
+            else:
+                samples = self.cube[row, column, ...]
+            samples = self._normalize(samples)
+            for axis in self.expanded_axes:
+                samples = np.expand_dims(samples, axis=axis - 1 if axis > 0
+                                         else axis)
+            return samples
+        rows, columns = self.coordinates[rows, 0], self.coordinates[rows, 1]
+        if self.neighbourhood_size > 1:
+            windows = HyperspectralDataset._get_sliding_windows(
+                self.cube, self.window_size)
+            samples = windows[rows, columns, ...]
+        else:
+            samples = self.cube[rows, columns, ...]
+        samples = self._normalize(samples)
+        for axis in self.expanded_axes:
+            samples = np.expand_dims(samples, axis=axis)
+        return samples
+
+    def _to_device(self, array):
+        if self.device is None:
+            return array
+        return torch.from_numpy(np.asarray(array)).to(self.device).float()
+
+    def get_samples(self, rows=None):
+        """
+        :param rows: Index, slice or array of indices of samples,
+                     if not specified, patches of all samples are gathered
+        :return: Samples at given rows
+        """
+        return self._to_device(self._gather(slice(None) if rows is None
+                                            else rows))
+
+    def get_labels(self, rows=None):
+        return self._to_device(super(PatchStorage, self).get_labels(rows))
+
+    def crop(self, neighbourhood_size: int) -> 'PatchStorage':
+        """
+        Create a storage of patches cropped to a smaller neighbourhood around
+        their centers. It gathers patches from the same cube, so it does not
+        modify it.
+        :param neighbourhood_size: Neighbourhood size of cropped patches
+        :return: New storage
+        """
+        padding_size = HyperspectralDataset._get_padding_size(
+            neighbourhood_size)
+        offset = self.window_size // 2 - padding_size
+        if offset < 0 or self.expanded_axes:
+            raise ValueError("Samples of shape {} cannot be cropped to "
+                             "neighbourhood of size {}"
+                             .format(self.sample_shape, neighbourhood_size))
+        storage = PatchStorage(self.cube, self.coordinates + offset,
+                               self.labels, neighbourhood_size)
+        storage.device = self.device
+        storage.cube_shared = True
+        storage.normalization = self.normalization
+        return storage
+
+    def take(self, rows: np.ndarray=None) -> 'PatchStorage':
+        """
+        Create a new, not shared storage with given samples. The cube is
+        not copied, if this storage is shared, the new one does not modify
+        the cube.
+        :param rows: Array of indices of samples to keep, if not specified,
+                     all samples are kept
+        :return: New storage
+        """
+        if rows is None:
+            rows = np.arange(len(self))
+        storage = PatchStorage(self.cube, self.coordinates[rows],
+                               self.labels[rows], self.neighbourhood_size)
+        storage.expanded_axes = list(self.expanded_axes)
+        storage.device = self.device
+        storage.cube_shared = self.cube_shared or self.shared
+        storage.normalization = self.normalization
+        return storage
+
+    def gather(self, rows: np.ndarray, samples: np.ndarray,
+               labels: np.ndarray):
+        """
+        Copy patches and labels at given rows into preallocated arrays
+        :param rows: Array of indices of samples
+        :param samples: Contiguous array the patches are copied to
+        :param labels: Array the labels are copied to
+        :return: None
+        """
+        np.take(self.labels, rows, out=labels, mode='clip')
+        rows, columns = self.coordinates[rows, 0], self.coordinates[rows, 1]
+        depth = self.cube.shape[DEPTH]
+        if self.neighbourhood_size > 1:
+            patches = samples.reshape((len(rows), self.window_size,
+                                       self.window_size, depth))
+            for patch, row, column in zip(patches, rows, columns):
+                patch[...] = self.cube[row:row + self.window_size,
+                                       column:column + self.window_size]
+        else:
+            pixels = samples.reshape((len(rows), depth))
+            np.take(self.cube.reshape((-1, depth)),
+                    rows * self.cube.shape[WIDTH] + columns, axis=0,
+                    out=pixels, mode='clip')
+        if self.normalization is not None:
+            normalize_inplace(samples, *self.normalization)
+
+    def normalize(self, shift: float, scale: float):
+        """
+        Normalize the whole padded cube, which yields the same samples as
+        normalizing extracted patches. If the cube is shared with other
+        storages, the normalization is combined with the deferred one
+        instead and applied to gathered patches.
+        """
+        if not self.cube_shared:
+            self.cube = normalize_inplace(self.cube, shift, scale)
+        elif self.normalization is None:
+            self.normalization = (shift, scale)
+        else:
+            previous_shift, previous_scale = self.normalization
+            self.normalization = (previous_shift + previous_scale * shift,
+                                  previous_scale * scale)
+
+    def expand_dims(self, axis: int):
+        self.expanded_axes.append(axis)
+
+    def convert_to_tensors(self, device: str):
+        self.device = device
+
+    def convert_to_numpy(self):
+        self.device = None
+
+
+class ConcatStorage(SampleStorage):
+    """
+    Backing store concatenating storages of multiple datasets without copying
+    their samples. Global rows are resolved to segments with a binary search
+    over the offsets of the segments. Labels are small, so they are kept
+    concatenated in a single array. Segments are shared with the
+    concatenated datasets, so they are copied before being modified.
+    """
+    def __init__(self, segments: List[SampleStorage], labels: np.ndarray):
+        self.segments = segments
+        self.offsets = np.cumsum([0] + [len(segment) for segment in segments])
+        self.labels = labels
+        self.shared = False
+
+    def __len__(self) -> int:
+        return len(self.labels)
+
+    @property
+    def sample_shape(self) -> tuple:
+        return self.segments[0].sample_shape
+
+    def _locate(self, rows: np.ndarray) -> np.ndarray:
+        """
+        :param rows: Array of global rows
+        :return: Indices of segments holding given rows
+        """
+        return np.searchsorted(self.offsets, rows, side='right') - 1
+
+    def get_samples(self, rows=None):
+        """
+        :param rows: Index, slice or array of indices of samples, if not
+                     specified, segments are compacted first and all samples
+                     are returned without copying
+        :return: Samples at given rows
+        """
+        if rows is None:
+            self.compact()
+            return self.segments[0].get_samples()
+        if isinstance(rows, slice):
+            start, stop, step = rows.indices(len(self))
+            segment = self._locate(start)
+            if step == 1 and start < stop <= self.offsets[segment + 1]:
+                offset = self.offsets[segment]
+                return self.segments[segment].get_samples(
+                    slice(start - offset, max(stop - offset, 0)))
+            rows = np.arange(start, stop, step)
+        if np.ndim(rows) == 0:
+            rows = rows + len(self) if rows < 0 else rows
+            segment = self._locate(rows)
+            return self.segments[segment].get_samples(
+                rows - self.offsets[segment])
+        rows = np.asarray(rows, dtype=np.intp)
+        samples = np.empty((len(rows), ) + self.sample_shape,
+                           dtype=self.segments[0].get_samples(
+                               slice(0, 0)).dtype)
+        self._gather_samples(rows, samples)
+        return samples
+
+    def _gather_samples(self, rows: np.ndarray, samples: np.ndarray):
+        """
+        Copy samples at given rows, possibly from many segments, into
+        a preallocated array
+        :param rows: Array of global rows
+        :param samples: Array the samples are copied to
+        :return: None
+        """
+        rows = np.where(rows < 0, rows + len(self), rows)
+        segments = self._locate(rows)
+        for segment in np.unique(segments):
+            mask = segments == segment
+            samples[mask] = self.segments[segment].get_samples(
+                rows[mask] - self.offsets[segment])
+
+    def compact(self):
+        """
+        Copy samples of all segments into a single array. Segments are
+        released one by one as they are copied, so as long as they are not
+        referenced elsewhere, pages of the new array replace them instead of
+        doubling the memory usage.
+        :return: None
+        """
+        if len(self.segments) == 1:
+            return
+        first = self.segments[0].get_samples(slice(0, 0))
+        data = np.empty((len(self), ) + first.shape[1:], dtype=first.dtype)
+        for index, (start, stop) in enumerate(zip(self.offsets[:-1],
+                                                  self.offsets[1:])):
+            data[start:stop] = self.segments[index].get_samples()
+            self.segments[index] = None
+        self.segments = [SampleStorage(data, self.labels)]
+        self.offsets = np.array([0, len(data)])
+
+    def share_memory(self, directory: PathLike=None):
+        self.compact()
+        self.segments[0].share_memory(directory)
+
+    def attach(self, mode: str='r'):
+        for segment in self.segments:
+            segment.attach(mode)
+
+    def _get_owned_segments(self) -> List[SampleStorage]:
+        """
+        Replace segments shared with other datasets by their copies, before
+        they are modified
+        :return: Segments owned by this storage
+        """
+        self.segments = [segment.take() if segment.shared else segment
+                         for segment in self.segments]
+        return self.segments
+
+    def crop(self, neighbourhood_size: int) -> 'ConcatStorage':
+        segments = [segment.crop(neighbourhood_size)
+                    for segment in self.segments]
+        # Cropped segments are views of the segments of this storage
+        for segment in segments:
+            segment.shared = True
+        return ConcatStorage(segments, self.labels)
+
+    def take(self, rows: np.ndarray=None) -> SampleStorage:
+        if rows is None:
+            rows = np.arange(len(self))
+        return SampleStorage(self.get_samples(rows), self.labels[rows])
+
+    def gather(self, rows: np.ndarray, samples: np.ndarray,
+               labels: np.ndarray):
+        """
+        Copy samples and labels at given rows into preallocated arrays.
+        Rows lying in a single segment are gathered by the segment itself.
+        :param rows: Array of indices of samples
+        :param samples: Array the samples are copied to
+        :param labels: Array the labels are copied to
+        :return: None
+        """
+        segments = self._locate(rows)
+        if len(rows) > 0 and np.all(segments == segments[0]):
+            self.segments[segments[0]].gather(
+                rows - self.offsets[segments[0]], samples, labels)
+        else:
+            self._gather_samples(rows, samples)
+        np.take(self.labels, rows, out=labels, mode='clip')
+
+    def normalize(self, shift: float, scale: float):
+        for segment in self._get_owned_segments():
+            segment.normalize(shift, scale)
+
+    def expand_dims(self, axis: int):
+        for segment in self._get_owned_segments():
+            segment.expand_dims(axis)
+
+    def convert_to_tensors(self, device: str):
+        self.compact()
+        segment = self._get_owned_segments()[0]
+        # Labels assigned after compacting are held by this storage only
+        segment.labels = self.labels
+        segment.convert_to_tensors(device)
+        self.labels = torch.from_numpy(self.labels).to(device).float()
+
+    def convert_to_numpy(self):
+        for segment in self.segments:
+            segment.convert_to_numpy()
+        if isinstance(self.labels, torch.Tensor):
+            self.labels = self.labels.numpy()
+
+
+class Dataset:
+    """
+    Samples and labels of a dataset. Subsets extracted from a dataset are
+    views of its storage selecting some of its rows, samples deleted from
+    a dataset are only masked out. Samples are copied when a view is
+    modified (see materialize).
+    """
+
+    def __init__(self, data: np.ndarray, labels: np.ndarray):
+        self._set_storage(SampleStorage(data, labels))
+
+    def _set_storage(self, storage: SampleStorage, rows: np.ndarray=None):
+        """
+        :param storage: Storage holding samples of the dataset
+        :param rows: Rows of the storage belonging to the dataset,
+                     if not specified, the dataset consists of all of them
+        :return: None
+        """
+        self.storage = storage
+        self._rows = rows
+        self._remaining = None
+        self._indices = None
+        self._class_index = None
+
+    def _set_view(self, dataset: 'Dataset', indices: Iterable):
+        """
+        Make this dataset a view of samples of another dataset, sharing its
+        storage
+        :param dataset: Dataset to take the samples from
+        :param indices: Indices of samples of the dataset
+        :return: None
+        """
+        indices = np.asarray(indices, dtype=np.intp)
+        rows = dataset._get_rows()
+        dataset.storage.shared = True
+        self._set_storage(dataset.storage,
+                          indices if rows is None else rows[indices])
+
+    def _get_rows(self):
+        """
+        :return: Rows of the storage belonging to the dataset, None if these
+                 are all rows of the storage
+        """
+        if self._remaining is None:
+            return self._rows
+        if self._indices is None:
+            positions = np.flatnonzero(self._remaining)
+            self._indices = positions if self._rows is None \
+                else self._rows[positions]
+        return self._indices
+
+    def materialize(self):
+        """
+        Copy samples of a view into a storage owned by this dataset only.
+        Called before every in-place modification, so that datasets sharing
+        the storage are not affected.
+        :return: None
+        """
+        rows = self._get_rows()
+        if rows is not None or self.storage.shared:
+            self._set_storage(self.storage.take(rows))
+
+    @property
+    def data(self):
+        return self.storage.get_samples(self._get_rows())
+
+    @data.setter
+    def data(self, data):
+        self._set_storage(SampleStorage(data, self.get_labels()))
+
+    @property
+    def labels(self):
+        return self.storage.get_labels(self._get_rows())
+
+    @labels.setter
+    def labels(self, labels):
+        self.materialize()
+        self.storage.labels = labels
+        self._class_index = None
+
+    @property
+    def class_index(self) -> ClassIndex:
+        """
+        Index of samples of each class, built on first use and rebuilt after
+        the dataset is modified
+        """
+        if self._class_index is None:
+            self._class_index = ClassIndex(self.get_labels())
+        return self._class_index
 
     def get_data(self) -> np.ndarray:
         """
@@ -43,15 +744,44 @@ class Dataset:
 
     @property
     def min(self):
-        return np.amin(self.data)
+        return self._reduce(np.amin)
 
     @property
     def max(self):
-        return np.amax(self.data)
+        return self._reduce(np.amax)
 
     @property
     def shape(self):
-        return self.data.shape
+        return (len(self), ) + self.storage.sample_shape
+
+    def _reduce(self, function, combine=None):
+        """
+        Apply a reduction to all samples, CHUNK_SIZE samples at a time
+        :param function: Reduction applied to each chunk, e.g. np.amin
+        :param combine: Reduction of the per-chunk results, if not specified,
+                        function is used
+        :return: Reduced value
+        """
+        partial = [function(self[start:start + CHUNK_SIZE][0])
+                   for start in range(0, len(self), CHUNK_SIZE)]
+        return (function if combine is None else combine)(partial)
+
+    def get_statistics(self, statistics: RunningStatistics=None,
+                       band_axis: int=None) -> RunningStatistics:
+        """
+        Collect min, max, mean and std of all samples in a single pass,
+        CHUNK_SIZE samples at a time
+        :param statistics: Statistics to update, e.g. collected on another
+                           dataset. If not specified, new ones are created
+        :param band_axis: Axis of samples holding bands, used only when new
+                          statistics are created
+        :return: Updated statistics
+        """
+        if statistics is None:
+            statistics = RunningStatistics(band_axis)
+        for start in range(0, len(self), CHUNK_SIZE):
+            statistics.update(self[start:start + CHUNK_SIZE][0])
+        return statistics
 
     def vstack(self, to_stack: np.ndarray):
         self.data = np.vstack([self.data, to_stack])
@@ -61,7 +791,8 @@ class Dataset:
 
     def expand_dims(self, axis: int=0, inplace: bool=True):
         if inplace:
-            self.data = np.expand_dims(self.data, axis=axis)
+            self.materialize()
+            self.storage.expand_dims(axis)
         else:
             return np.expand_dims(self.data, axis=axis)
 
@@ -74,22 +805,20 @@ class Dataset:
         :param max_: Maximal value for normalization, if not specified,
                      it will be deducted from data
         :param inplace: Whether to change data in-place (True) or return
-                        normalized data and labels
+                        normalized data and labels. In-place normalization
+                        overwrites the data array without allocating a copy.
         :return: If inplace is True - return None,
                  if inplace is False - return normalized (data, labels)
         """
         if min_ is None and max_ is None:
-            min_ = np.amin(self.get_data())
-            max_ = np.amax(self.get_data())
-            if inplace:
-                self.data = (self.get_data() - min_) / (max_ - min_)
-            else:
-                return (self.get_data() - min_) / (max_ - min_)
-        elif min_ is not None and max_ is not None:
-            if inplace:
-                self.data = (self.get_data() - min_) / (max_ - min_)
-            else:
-                return(self.get_data() - min_) / (max_ - min_)
+            min_, max_ = self.min, self.max
+        elif min_ is None or max_ is None:
+            return
+        if inplace:
+            self.materialize()
+            self.storage.normalize(min_, max_ - min_)
+        else:
+            return (self.get_data() - min_) / (max_ - min_)
 
     def standardize(self, mean: float=None, std: float=None,
                     inplace: bool=True):
@@ -98,19 +827,33 @@ class Dataset:
         :param mean: Mean value for standardization, if not specified,
                      it will be deducted from data
         :param std: Std value for standardization, if not specified,
-                     it will be deducted from data
+                    it will be deducted from data
         :param inplace: Whether to change data in-place (True) or return
-                        normalized data and labels
+                        normalized data and labels. In-place standardization
+                        overwrites the data array without allocating a copy.
         :return: If inplace is True - return None,
                  if inplace is False - return normalized (data, labels)
         """
         if mean is None and std is None:
-            mean = np.mean(self.get_data())
-            std = np.std(self.get_data())
+            statistics = self.get_statistics()
+            mean, std = statistics.mean, statistics.std
         if inplace:
-            self.data = (self.data - mean) / std
+            self.materialize()
+            self.storage.normalize(mean, std)
         else:
-            return (self.data - mean) / std
+            return (self.get_data() - mean) / std
+
+    def share_memory(self, directory: PathLike=None):
+        """
+        Move samples of the dataset to shared memory, so that workers of
+        a torch DataLoader map them instead of copying them. Workers should
+        be initialized with attach_shared_memory.
+        :param directory: Directory to store the samples in, if not
+                          specified, a temporary one in shared memory is used
+        :return: None
+        """
+        self.materialize()
+        self.storage.share_memory(directory)
 
     def normalize_labels(self):
         """
@@ -121,24 +864,30 @@ class Dataset:
 
     def delete_by_indices(self, indices: Iterable):
         """
-        Delete a chunk of data given as indices
-        :param indices: Indices to delete from both data and labels arrays
+        Delete samples given as indices. Deleted samples are only masked out,
+        the storage is left intact.
+        :param indices: Indices of samples to delete
         :return: None
         """
-        self.data = np.delete(self.data, indices, axis=HEIGHT)
-        self.labels = np.delete(self.labels, indices, axis=HEIGHT)
+        if self._remaining is None:
+            self._remaining = np.ones(len(self), dtype=bool)
+        positions = np.flatnonzero(self._remaining)
+        self._remaining[positions[np.asarray(indices, dtype=np.intp)]] = False
+        self._indices = None
+        self._class_index = None
 
     def convert_to_tensors(self, inplace: bool=True, device: str='cpu'):
         """
-        Convert data and labels from torch tensors.
+        Convert data and labels from torch tensors. Data that already is
+        float32 and stays on the CPU is shared with the tensor, not copied.
         :param inplace: Whether to change data in-place (True) or return
                         normalized data and labels
         :param device: Device on which tensors should be alocated
         :return:
         """
         if inplace:
-            self.data = torch.from_numpy(self.get_data()).float().to(device)
-            self.labels = torch.from_numpy(self.get_labels()).float().to(device)
+            self.materialize()
+            self.storage.convert_to_tensors(device)
         else:
             return torch.from_numpy(self.get_data()).to(device), \
                    torch.from_numpy(self.get_labels()).to(device)
@@ -151,8 +900,8 @@ class Dataset:
         :return:
         """
         if inplace:
-            self.data = self.data.numpy()
-            self.labels = self.labels.numpy()
+            self.materialize()
+            self.storage.convert_to_numpy()
         else:
             return self.data.numpy(), self.labels.numpy()
 
@@ -161,7 +910,8 @@ class Dataset:
         Method providing a size of the dataaset (number of samples)
         :return: Size of the dataset
         """
-        return len(self.labels)
+        rows = self._get_rows()
+        return len(self.storage) if rows is None else len(rows)
 
     def __getitem__(self, item) -> [np.ndarray, np.ndarray]:
         """
@@ -170,9 +920,45 @@ class Dataset:
                      returned
         :return: Data at given indexes
         """
-        sample_x = self.data[item, ...]
-        sample_y = self.labels[item]
-        return sample_x, sample_y
+        rows = self._get_rows()
+        if rows is not None:
+            item = rows[item]
+        return self.storage.get_samples(item), self.storage.get_labels(item)
+
+    def crop(self, neighbourhood_size: int) -> 'Dataset':
+        """
+        Create a dataset of the same samples in a smaller neighbourhood,
+        cropped from the centers of samples of this dataset. Samples are not
+        copied, the storage is shared as with subsets. Thus a sweep over
+        neighbourhood sizes needs only one extraction, at the largest size.
+        Samples have to be cropped before their dimensions are expanded.
+        :param neighbourhood_size: Neighbourhood size of cropped samples, not
+                                   larger than the size of this dataset's
+        :return: Dataset of cropped samples
+        """
+        storage = self.storage.crop(neighbourhood_size)
+        self.storage.shared = storage.shared = True
+        cropped = copy(self)
+        cropped._set_storage(storage, self._get_rows())
+        return cropped
+
+    def gather(self, indices: np.ndarray, samples: np.ndarray,
+               labels: np.ndarray):
+        """
+        Copy samples and labels at given indices into preallocated arrays,
+        instead of allocating new ones like indexing does
+        :param indices: Array of indices of samples
+        :param samples: Contiguous array the samples are copied to, of shape
+                        [len(indices), *self.shape[1:]]
+        :param labels: Array the labels are copied to
+        :return: None
+        """
+        # Storages gather with mode='clip', out of range indices have to be
+        # rejected by the caller
+        rows = self._get_rows()
+        if rows is not None:
+            indices = rows[indices]
+        self.storage.gather(indices, samples, labels)
 
 
 class HyperspectralDataset(Dataset):
@@ -184,73 +970,129 @@ class HyperspectralDataset(Dataset):
                                 NEIGHBOURHOOD_SIZE,
                                 NEIGHBOURHOOD_SIZE,
                                 NUMBER_OF_BANDS].
+    Samples are stored with the given dtype, e.g. np.float32 or np.float16
+    to reduce memory usage. If a cache is given and the dataset is loaded
+    from files, samples are stored in the cache and memory-mapped from it
+    when the same files are loaded again with the same parameters.
     """
     def __init__(self, dataset: [np.ndarray, PathLike],
                  ground_truth: [np.ndarray, PathLike],
                  neighbourhood_size: int = 1,
-                 background_label: int = 0):
-        if type(dataset) is np.ndarray and type(ground_truth) is np.ndarray:
-            raw_data = dataset
-            ground_truth = ground_truth
+                 background_label: int = 0,
+                 dtype: type = np.float64,
+                 cache: SampleCache = None):
+        key = self._get_cache_key(cache, dataset, ground_truth,
+                                  neighbourhood_size, background_label, dtype)
+        arrays = cache.load(key) if key is not None else None
+        if arrays is not None:
+            data, labels = arrays['data'], arrays['labels']
+        else:
+            raw_data, ground_truth = self._load(dataset, ground_truth)
+            data, labels = self._prepare_samples(raw_data,
+                                                 ground_truth,
+                                                 neighbourhood_size,
+                                                 background_label,
+                                                 dtype)
+            if key is not None:
+                cache.store(key, data=data, labels=labels)
+        super(HyperspectralDataset, self).__init__(data, labels)
+
+    def _get_cache_key(self, cache: SampleCache,
+                       dataset: [np.ndarray, PathLike],
+                       ground_truth: [np.ndarray, PathLike],
+                       neighbourhood_size: int,
+                       background_label: int,
+                       dtype: type) -> str:
+        """
+        :return: Key of the samples in the cache, None if there is no cache
+                 or the dataset is not loaded from files
+        """
+        if cache is None or type(dataset) is not str or \
+                type(ground_truth) is not str:
+            return None
+        return cache.get_key([dataset, ground_truth], type(self).__name__,
+                             neighbourhood_size, background_label,
+                             np.dtype(dtype).str)
+
+    @staticmethod
+    def _load(dataset: [np.ndarray, PathLike],
+              ground_truth: [np.ndarray, PathLike]) -> [np.ndarray, np.ndarray]:
+        if isinstance(dataset, np.ndarray) and \
+                isinstance(ground_truth, np.ndarray):
+            return dataset, ground_truth
         elif type(dataset) is str and type(ground_truth) is str:
-            raw_data = load_data(dataset)
-            ground_truth = load_data(ground_truth)
+            return load_data(dataset), load_data(ground_truth)
         else:
             raise TypeError("Dataset and ground truth should be "
                             "provided either as a string or a numpy array, "
                             "not {}".format(type(dataset)))
-        data, labels = self._prepare_samples(raw_data,
-                                             ground_truth,
-                                             neighbourhood_size,
-                                             background_label)
-        super(HyperspectralDataset, self).__init__(data, labels)
+
+    @staticmethod
+    def _get_padding_size(neighbourhood_size: int) -> int:
+        return neighbourhood_size % ceil(float(neighbourhood_size) / 2.)
 
     @staticmethod
     def _get_padded_cube(data, padding_size):
-        x = copy(data)
-        v_padding = np.zeros((padding_size, x.shape[WIDTH], x.shape[DEPTH]))
-        x = np.vstack((v_padding, x))
-        x = np.vstack((x, v_padding))
-        h_padding = np.zeros((x.shape[HEIGHT], padding_size, x.shape[DEPTH]))
-        x = np.hstack((h_padding, x))
-        x = np.hstack((x, h_padding))
-        return x
+        return np.pad(data, ((padding_size, padding_size),
+                             (padding_size, padding_size),
+                             (0, 0)), mode='constant')
 
     @staticmethod
-    def _prepare_1d(raw_data: np.ndarray,
+    def _get_sliding_windows(padded_cube: np.ndarray,
+                             window_size: int) -> np.ndarray:
+        """
+        Create a read-only view of the padded cube in which element [y, x]
+        is a window_size x window_size x bands patch with its upper left
+        corner at [y, x]. No data is copied.
+        :param padded_cube: Cube padded with window_size // 2 on each side
+        :param window_size: Spatial size of each patch
+        :return: View of shape [HEIGHT, WIDTH, window_size, window_size, DEPTH]
+        """
+        row_stride, col_stride, band_stride = padded_cube.strides
+        shape = (padded_cube.shape[HEIGHT] - window_size + 1,
+                 padded_cube.shape[WIDTH] - window_size + 1,
+                 window_size, window_size, padded_cube.shape[DEPTH])
+        strides = (row_stride, col_stride, row_stride, col_stride, band_stride)
+        return as_strided(padded_cube, shape=shape, strides=strides,
+                          writeable=False)
+
+    @staticmethod
+    def _get_labeled_coordinates(ground_truth: np.ndarray,
+                                 background_label: int):
+        """
+        Collect coordinates of all non-background pixels. Pixels are ordered
+        column by column, which is the order samples have always been
+        extracted in.
+        :param ground_truth: Ground truth map
+        :param background_label: Label of pixels to be skipped
+        :return: Row and column indices of labeled pixels
+        """
+        columns, rows = np.nonzero(ground_truth.T != background_label)
+        return rows, columns
+
+    def _prepare_1d(self, raw_data: np.ndarray,
                     ground_truth: np.ndarray,
                     background_label: int):
-        samples, labels = list(), list()
-        col_indexes = [x for x in range(0, raw_data.shape[WIDTH])]
-        row_indexes = [y for y in range(0, raw_data.shape[HEIGHT])]
-        for x, y in product(col_indexes, row_indexes):
-            if ground_truth[y, x] != background_label:
-                sample = copy(raw_data[y, x, ...])
-                samples.append(sample)
-                labels.append(ground_truth[y, x])
-        return samples, labels
+        rows, columns = self._get_labeled_coordinates(ground_truth,
+                                                      background_label)
+        return raw_data[rows, columns, ...], ground_truth[rows, columns]
 
     def _prepare_3d(self, raw_data: np.ndarray,
                     ground_truth: np.ndarray,
                     neighbourhood_size: int,
                     background_label: int):
-        col_indexes = [x for x in range(0, raw_data.shape[WIDTH])]
-        row_indexes = [y for y in range(0, raw_data.shape[HEIGHT])]
-        padding_size = neighbourhood_size % ceil(float(neighbourhood_size) / 2.)
+        padding_size = self._get_padding_size(neighbourhood_size)
         padded_cube = self._get_padded_cube(raw_data, padding_size)
-        samples, labels = list(), list()
-        for x, y in product(col_indexes, row_indexes):
-            if ground_truth[y, x] != background_label:
-                sample = copy(padded_cube[y:y + padding_size * 2 + 1,
-                                          x:x + padding_size * 2 + 1, ...])
-                samples.append(sample)
-                labels.append(ground_truth[y, x])
-        return samples, labels
+        windows = self._get_sliding_windows(padded_cube, padding_size * 2 + 1)
+        rows, columns = self._get_labeled_coordinates(ground_truth,
+                                                      background_label)
+        return windows[rows, columns, ...], ground_truth[rows, columns]
 
     def _prepare_samples(self, raw_data: np.ndarray,
                          ground_truth: np.ndarray,
                          neighbourhood_size: int,
-                         background_label: int):
+                         background_label: int,
+                         dtype: type = np.float64):
         if neighbourhood_size > 1:
             samples, labels = self._prepare_3d(raw_data,
                                                ground_truth,
@@ -260,16 +1102,56 @@ class HyperspectralDataset(Dataset):
             samples, labels = self._prepare_1d(raw_data,
                                                ground_truth,
                                                background_label)
-        return (np.array(samples).astype(np.float64),
-                np.array(labels).astype(np.uint8))
+        return (samples.astype(dtype, copy=False),
+                labels.astype(np.uint8, copy=False))
+
+
+class LazyHyperspectralDataset(HyperspectralDataset):
+    """
+    Hyperspectral samples which are not materialized up front. Only the padded
+    cube and int32 coordinates of the labeled pixels are stored (see
+    PatchStorage), patches are gathered from the cube when the dataset is
+    indexed. Indexing returns samples with the same dimensions, order and
+    dtype as HyperspectralDataset. The cube, coordinates and labels can be
+    cached like samples of HyperspectralDataset.
+    """
+    def __init__(self, dataset: [np.ndarray, PathLike],
+                 ground_truth: [np.ndarray, PathLike],
+                 neighbourhood_size: int = 1,
+                 background_label: int = 0,
+                 dtype: type = np.float64,
+                 cache: SampleCache = None):
+        key = self._get_cache_key(cache, dataset, ground_truth,
+                                  neighbourhood_size, background_label, dtype)
+        arrays = cache.load(key) if key is not None else None
+        if arrays is not None:
+            cube, coordinates, labels = arrays['cube'], \
+                                        arrays['coordinates'], \
+                                        arrays['labels']
+        else:
+            raw_data, ground_truth = self._load(dataset, ground_truth)
+            padding_size = self._get_padding_size(neighbourhood_size)
+            cube = self._get_padded_cube(raw_data, padding_size)
+            cube = cube.astype(dtype, copy=False)
+            rows, columns = self._get_labeled_coordinates(ground_truth,
+                                                          background_label)
+            coordinates = np.stack([rows, columns], axis=1).astype(np.int32)
+            labels = ground_truth[rows, columns].astype(np.uint8)
+            if key is not None:
+                cache.store(key, cube=cube, coordinates=coordinates,
+                            labels=labels)
+        self._set_storage(PatchStorage(cube, coordinates, labels,
+                                       neighbourhood_size))
 
 
 class Subset(abc.ABC):
 
     @abc.abstractmethod
-    def extract_subset(self, *args, **kwargs) -> [np.ndarray, np.ndarray]:
+    def extract_subset(self, *args, **kwargs) -> np.ndarray:
         """"
-        Extract some part of a given dataset
+        Extract some part of a given dataset. The subset is a view of the
+        dataset's storage, samples are not copied.
+        :return: Indices of extracted samples in the given dataset
         """
 
 
@@ -280,45 +1162,38 @@ class BalancedSubset(Dataset, Subset):
 
     def __init__(self, dataset: Dataset,
                  samples_per_class: int,
-                 delete_extracted: bool=True):
-        data, labels = self.extract_subset(dataset,
-                                           samples_per_class,
-                                           delete_extracted)
-        super(BalancedSubset, self).__init__(data, labels)
+                 delete_extracted: bool=True,
+                 seed: int=None):
+        self.extract_subset(dataset, samples_per_class, delete_extracted,
+                            seed)
 
     @staticmethod
-    def _collect_indices_to_extract(classes: List[int],
-                                    labels: np.ndarray,
-                                    samples_per_class: int):
-        indices_to_extract = []
-        for label in classes:
-            class_indices = list(np.where(labels == label)[0])
-            shuffle(class_indices)
-            if 0 < samples_per_class < 1:
-                samples_to_extract = int(len(class_indices) * samples_per_class)
-                indices_to_extract += class_indices[0:samples_to_extract]
-            else:
-                indices_to_extract += class_indices[0:int(samples_per_class)]
-        return indices_to_extract
+    def _collect_indices_to_extract(class_index: ClassIndex,
+                                    samples_per_class: int,
+                                    random_state) -> np.ndarray:
+        if 0 < samples_per_class < 1:
+            counts = (class_index.counts * samples_per_class).astype(np.intp)
+        else:
+            counts = np.full(len(class_index.classes), int(samples_per_class))
+        return class_index.sample(counts, random_state)
 
     def extract_subset(self, dataset: Dataset,
                        samples_per_class: int,
-                       delete_extracted: bool) -> [np.ndarray, np.ndarray]:
-        classes, counts = np.unique(dataset.get_labels(), return_counts=True)
-        if np.any(counts < samples_per_class):
+                       delete_extracted: bool,
+                       seed: int=None) -> np.ndarray:
+        class_index = dataset.class_index
+        if np.any(class_index.counts < samples_per_class):
             raise ValueError("Chosen number of samples per class is too big "
                              "for one of the classes")
-        indices_to_extract = self._collect_indices_to_extract(classes,
-                                                              dataset.get_labels(),
-                                                              samples_per_class)
+        indices_to_extract = self._collect_indices_to_extract(
+            class_index, samples_per_class, get_random_state(seed))
 
-        data = copy(dataset.get_data()[indices_to_extract, ...])
-        labels = copy(dataset.get_labels()[indices_to_extract, ...])
+        self._set_view(dataset, indices_to_extract)
 
         if delete_extracted:
             dataset.delete_by_indices(indices_to_extract)
 
-        return data, labels
+        return indices_to_extract
 
 
 class ImbalancedSubset(Dataset, Subset):
@@ -329,28 +1204,26 @@ class ImbalancedSubset(Dataset, Subset):
     """
     def __init__(self, dataset: Dataset,
                  total_samples_count: float,
-                 delete_extracted: bool=True):
-        data, labels = self.extract_subset(dataset,
-                                           total_samples_count,
-                                           delete_extracted)
-        super(ImbalancedSubset, self).__init__(data, labels)
+                 delete_extracted: bool=True,
+                 seed: int=None):
+        self.extract_subset(dataset, total_samples_count, delete_extracted,
+                            seed)
 
     def extract_subset(self, dataset: Dataset,
                        total_samples_count: int,
-                       delete_extracted: bool) -> [np.ndarray, np.ndarray]:
-        indices = [i for i in range(len(dataset))]
-        shuffle(indices)
+                       delete_extracted: bool,
+                       seed: int=None) -> np.ndarray:
+        indices = get_random_state(seed).permutation(len(dataset))
         if 0 < total_samples_count < 1:
             total_samples_count = int(len(dataset) * total_samples_count)
         indices_to_extract = indices[0:total_samples_count]
 
-        data = copy(dataset.get_data()[indices_to_extract, ...])
-        labels = copy(dataset.get_labels()[indices_to_extract, ...])
+        self._set_view(dataset, indices_to_extract)
 
         if delete_extracted:
             dataset.delete_by_indices(indices_to_extract)
 
-        return data, labels
+        return indices_to_extract
 
 
 class CustomSizeSubset(Dataset, Subset):
@@ -360,36 +1233,42 @@ class CustomSizeSubset(Dataset, Subset):
     """
     def __init__(self, dataset: Dataset,
                  samples_count: List[int],
-                 delete_extracted: bool=True):
-        data, labels = self.extract_subset(dataset, samples_count,
-                                           delete_extracted)
-        super(CustomSizeSubset, self).__init__(data, labels)
+                 delete_extracted: bool=True,
+                 seed: int=None):
+        self.extract_subset(dataset, samples_count, delete_extracted, seed)
 
     def extract_subset(self, dataset: Dataset, samples_count: List[int],
-                       delete_extracted: bool):
-        classes = np.unique(dataset.get_labels())
-        to_extract = []
-        for label in classes:
-            indices = np.where(dataset.get_labels() == label)[0]
-            shuffle(indices)
-            to_extract += list(indices[0:samples_count[label]])
+                       delete_extracted: bool,
+                       seed: int=None) -> np.ndarray:
+        class_index = dataset.class_index
+        counts = np.asarray(samples_count)[class_index.classes.astype(np.intp)]
+        to_extract = class_index.sample(counts, get_random_state(seed))
 
-        data = copy(dataset.get_data()[to_extract, ...])
-        labels = copy(dataset.get_labels()[to_extract, ...])
+        self._set_view(dataset, to_extract)
 
         if delete_extracted:
             dataset.delete_by_indices(to_extract)
 
-        return data, labels
+        return to_extract
 
 
 class ConcatDataset(Dataset):
     """Dataset to concatenate multiple datasets. Useful when loading patches
-    of the dataset and combining them"""
+    of the dataset and combining them. Samples are not copied, the dataset
+    refers to storages of the concatenated datasets until it is compacted
+    or modified."""
 
     def __init__(self, datasets: List[Dataset]):
-        data, labels = self.combine_datasets(datasets)
-        super(ConcatDataset, self).__init__(data, labels)
+        segments = []
+        for dataset in datasets:
+            rows = dataset._get_rows()
+            if rows is None:
+                dataset.storage.shared = True
+                segments.append(dataset.storage)
+            else:
+                segments.append(dataset.storage.take(rows))
+        labels = np.hstack([dataset.get_labels() for dataset in datasets])
+        self._set_storage(ConcatStorage(segments, labels))
 
     @staticmethod
     def combine_datasets(datasets: List[Dataset]) -> [np.ndarray, np.ndarray]:
@@ -397,50 +1276,201 @@ class ConcatDataset(Dataset):
         labels = [dataset.get_labels() for dataset in datasets]
         return np.vstack(data), np.hstack(labels)
 
+    def compact(self):
+        """
+        Copy samples of the concatenated datasets into a single array,
+        so that they are no longer gathered from multiple segments
+        :return: None
+        """
+        if isinstance(self.storage, ConcatStorage):
+            self.storage.compact()
+
 
-class OrderedDataLoader:
+class BatchLoader:
     """
-    Shuffling is performed only withing classes, the order of the
-    returned classes is fixed.
+    Iterator over batches of a dataset. Samples of each batch are gathered
+    into one of prefetch + 2 preallocated buffers, which are reused across
+    batches and epochs, and the next prefetch batches are prepared on
+    a background thread while the current one is processed. A returned batch
+    is overwritten after the following batches are requested, so it has to be
+    copied if it is needed for longer.
     """
     def __init__(self, dataset: Dataset, batch_size: int=64,
-                 use_tensors: bool=True):
+                 shuffle: bool=True, class_ordered: bool=False,
+                 drop_last: bool=True, prefetch: int=2,
+                 use_tensors: bool=True, pin_memory: bool=False,
+                 seed: int=None):
+        """
+        :param dataset: Dataset to iterate over, with data stored as
+                        numpy arrays
+        :param batch_size: Number of samples in a batch
+        :param shuffle: Whether to shuffle samples before each epoch
+        :param class_ordered: Whether samples should be grouped by class,
+                              classes are then returned in a fixed order and
+                              samples are shuffled only within them
+        :param drop_last: Whether to skip the last batch if it is smaller
+                          than batch_size
+        :param prefetch: Number of batches prepared in advance, if 0,
+                         batches are prepared when requested
+        :param use_tensors: Whether to return batches as float32 torch
+                            tensors instead of numpy arrays of the dataset's
+                            dtypes
+        :param pin_memory: Whether to allocate tensors in page-locked memory,
+                           which speeds up copying them to the GPU
+        :param seed: Seed used for shuffling
+        """
+        self.dataset = dataset
         self.batch_size = batch_size
-        self.label_samples_indices = self._get_label_samples_indices(dataset)
-        self.samples_returned = 0
-        self.samples_count = len(dataset)
-        self.indexes = self._get_indexes()
-        self.data = dataset
-        if use_tensors:
-            self.data.convert_to_tensors()
+        self.shuffle = shuffle
+        self.class_index = dataset.class_index if class_ordered else None
+        self.drop_last = drop_last
+        self.prefetch = prefetch
+        self.random_state = get_random_state(seed)
+        self.indexes = np.arange(len(dataset))
+        self.buffers = [self._allocate_buffers(use_tensors, pin_memory)
+                        for _ in range(prefetch + 2)]
 
-    def __iter__(self):
-        self.indexes = self._get_indexes()
-        return self
+    def _allocate_buffers(self, use_tensors: bool, pin_memory: bool):
+        """
+        :return: Batch of samples and labels to be returned, numpy arrays
+                 sharing memory with them, and numpy arrays of the dataset's
+                 dtypes that the batch is gathered into. Unless the dataset
+                 holds float32 samples or labels, the gathered ones are cast
+                 into the returned batch.
+        """
+        shape = (self.batch_size, ) + self.dataset.shape[1:]
+        empty_samples, empty_labels = self.dataset[0:0]
+        samples_staging = np.empty(shape, dtype=empty_samples.dtype)
+        labels_staging = np.empty(self.batch_size, dtype=empty_labels.dtype)
+        if not use_tensors:
+            return samples_staging, labels_staging, samples_staging, \
+                labels_staging, samples_staging, labels_staging
+        samples = torch.empty(shape, dtype=torch.float32)
+        labels = torch.empty(self.batch_size, dtype=torch.float32)
+        if pin_memory and torch.cuda.is_available():
+            samples, labels = samples.pin_memory(), labels.pin_memory()
+        samples_array, labels_array = samples.numpy(), labels.numpy()
+        if samples_staging.dtype == np.float32:
+            samples_staging = samples_array
+        if labels_staging.dtype == np.float32:
+            labels_staging = labels_array
+        return samples, labels, samples_array, labels_array, \
+            samples_staging, labels_staging
 
-    def __next__(self):
-        if (self.samples_returned + self.batch_size) > self.samples_count:
-            self.samples_returned = 0
-            raise StopIteration
-        else:
-            indexes = self.indexes[self.samples_returned:
-                                   self.samples_returned + self.batch_size]
-            batch = self.data[indexes]
-            self.samples_returned += self.batch_size
-            return batch
-
-    def _get_indexes(self):
-        labels = self.label_samples_indices.keys()
-        indexes = []
-        for label in labels:
-            shuffle(self.label_samples_indices[label])
-            indexes += self.label_samples_indices[label]
-        return indexes
+    def __len__(self) -> int:
+        """
+        :return: Number of batches in an epoch
+        """
+        if self.drop_last:
+            return len(self.indexes) // self.batch_size
+        return int(ceil(len(self.indexes) / self.batch_size))
+
+    def _get_indexes(self) -> np.ndarray:
+        if self.class_index is not None:
+            if self.shuffle:
+                return self.class_index.shuffled(self.random_state)
+            return self.class_index.indices
+        if self.shuffle:
+            self.random_state.shuffle(self.indexes)
+        return self.indexes
+
+    def _get_batches(self, indexes: np.ndarray):
+        """
+        Gather consecutive batches into the buffers
+        :param indexes: Indexes of samples in the order they are returned
+        :return: Generator of (samples, labels) batches
+        """
+        for number in range(len(self)):
+            batch_indexes = indexes[number * self.batch_size:
+                                    (number + 1) * self.batch_size]
+            count = len(batch_indexes)
+            samples, labels, samples_array, labels_array, \
+                samples_staging, labels_staging = \
+                self.buffers[number % len(self.buffers)]
+            self.dataset.gather(batch_indexes, samples_staging[:count],
+                                labels_staging[:count])
+            if samples_staging is not samples_array:
+                samples_array[:count] = samples_staging[:count]
+            if labels_staging is not labels_array:
+                labels_array[:count] = labels_staging[:count]
+            yield samples[:count], labels[:count]
 
     @staticmethod
-    def _get_label_samples_indices(dataset):
-        labels = np.unique(dataset.get_labels())
-        label_samples_indices = dict.fromkeys(labels)
-        for label in label_samples_indices:
-            label_samples_indices[label] = list(np.where(dataset.get_labels() == label)[0])
-        return label_samples_indices
+    def _put(queue: Queue, stop: Event, item) -> bool:
+        """
+        Put an item into the queue, unless the consumer stops iterating
+        :return: Whether the item was put into the queue
+        """
+        while not stop.is_set():
+            try:
+                queue.put(item, timeout=0.1)
+                return True
+            except Full:
+                continue
+        return False
+
+    def _produce(self, indexes: np.ndarray, queue: Queue, stop: Event):
+        """
+        Prepare batches on a background thread. The end of an epoch is
+        signalled by None, errors are passed to the consumer.
+        """
+        try:
+            for batch in self._get_batches(indexes):
+                if not self._put(queue, stop, batch):
+                    return
+        except Exception as exception:
+            self._put(queue, stop, exception)
+            return
+        self._put(queue, stop, None)
+
+    def _check_indexes(self, indexes: np.ndarray):
+        """
+        Check indexes of an epoch once, so that batches can be gathered
+        without bounds checking
+        :param indexes: Indexes of samples in the order they are returned
+        :return: None
+        """
+        if len(indexes) > 0 and (indexes.min() < 0 or
+                                 indexes.max() >= len(self.dataset)):
+            raise IndexError("Indexes of samples are out of range of "
+                             "a dataset with {} samples, it was modified "
+                             "after creating the loader"
+                             .format(len(self.dataset)))
+
+    def __iter__(self):
+        indexes = self._get_indexes()
+        self._check_indexes(indexes)
+        if self.prefetch == 0:
+            yield from self._get_batches(indexes)
+            return
+        queue, stop = Queue(self.prefetch), Event()
+        producer = Thread(target=self._produce, args=(indexes, queue, stop),
+                          daemon=True)
+        producer.start()
+        try:
+            while True:
+                batch = queue.get()
+                if batch is None:
+                    return
+                if isinstance(batch, Exception):
+                    raise batch
+                yield batch
+        finally:
+            stop.set()
+            producer.join()
+
+
+class OrderedDataLoader(BatchLoader):
+    """
+    Shuffling is performed only withing classes, the order of the
+    returned classes is fixed.
+    """
+    def __init__(self, dataset: Dataset, batch_size: int=64,
+                 use_tensors: bool=True, seed: int=None, prefetch: int=2,
+                 pin_memory: bool=False):
+        super(OrderedDataLoader, self).__init__(dataset, batch_size,
+                                                class_ordered=True,
+                                                prefetch=prefetch,
+                                                use_tensors=use_tensors,
+                                                pin_memory=pin_memory,
+                                                seed=seed)
@@ -1,6 +1,7 @@
 import argparse
 from typing import NamedTuple
 
+from python_research import io
 from python_research.experiments.band_selection_algorithms.utils import *
 
 ITER_RANGE = int(1e10)
@@ -125,42 +126,10 @@ def load_data(path: str, ref_map_path: str, drop_bg: bool = False) -> np.ndarray
     :param drop_bg: True if background drop is intended.
     :return: Prepared data cube.
     """
-    data = None
-    ref_map = None
-    if path.endswith(".npy"):
-        data = np.load(path)
-    elif path.endswith(".mat"):
-        mat = loadmat(path)
-        for key in mat.keys():
-            if "__" not in key:
-                data = mat[key]
-                break
-    else:
-        raise ValueError("This file type is not supported.")
-    if ref_map_path.endswith(".npy"):
-        ref_map = np.load(ref_map_path)
-    elif ref_map_path.endswith(".mat"):
-        mat = loadmat(ref_map_path)
-        for key in mat.keys():
-            if "__" not in key:
-                ref_map = mat[key]
-                break
-    else:
-        raise ValueError("This file type is not supported.")
-    assert data is not None and ref_map_path is not None, "There is no data to be loaded."
+    data = io.load_data(path)
+    ref_map = io.load_data(ref_map_path)
     data = min_max_normalize_data(data=data.astype(float))
     if drop_bg:
-        non_zeros = np.nonzero(ref_map)
-        prepared_data = []
-        for i in range(data.shape[SPECTRAL_AXIS]):
-            band = data[..., i][non_zeros]
-            prepared_data.append(band)
-        prepared_data = np.asarray(prepared_data).T
-        return prepared_data
+        return data[np.nonzero(ref_map)]
     else:
-        prepared_data = []
-        for i in range(data.shape[SPECTRAL_AXIS]):
-            band = data[..., i]
-            prepared_data.append(band.ravel())
-        prepared_data = np.asarray(prepared_data).T
-        return prepared_data
+        return data.reshape(-1, data.shape[SPECTRAL_AXIS])
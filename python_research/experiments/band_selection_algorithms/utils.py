@@ -1,5 +1,6 @@
 import numpy as np
-from scipy.io import loadmat
+
+from python_research import io
 
 BG_CLASS = -1
 ROW_AXIS = 0
@@ -16,25 +17,8 @@ def load_data(data_path: str, ref_map_path: str) -> tuple:
     :param ref_map_path: Path to labels.
     :return: Prepared data.
     """
-    data = None
-    ref_map = None
-    if data_path.endswith(".npy"):
-        data = np.load(data_path)
-    if data_path.endswith(".mat"):
-        mat = loadmat(data_path)
-        for key in mat.keys():
-            if "__" not in key:
-                data = mat[key]
-                break
-    if ref_map_path.endswith(".npy"):
-        ref_map = np.load(ref_map_path)
-    if ref_map_path.endswith(".mat"):
-        mat = loadmat(ref_map_path)
-        for key in mat.keys():
-            if "__" not in key:
-                ref_map = mat[key]
-                break
-    assert data is not None and ref_map is not None, "The specified path or format of file is incorrect."
+    data = io.load_data(data_path)
+    ref_map = io.load_data(ref_map_path)
     ref_map = ref_map.astype(int) + BG_CLASS
     return data.astype(float), ref_map.astype(int)
 
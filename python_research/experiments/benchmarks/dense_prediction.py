@@ -0,0 +1,82 @@
+"""
+Benchmark of whole-scene classification with a model built with
+build_3d_model. Classification of patches of every pixel is compared against
+the fully convolutional model obtained with build_dense_3d_model, on
+a synthetic scene with Pavia University dimensions by default. The dense
+model has to return the same probabilities.
+"""
+
+import argparse
+
+import numpy as np
+
+from python_research.keras_models import build_3d_model, \
+    build_settings_for_dataset, build_dense_3d_model
+from python_research.scene_inference import classify_scene, \
+    get_keras_predictor
+
+
+def parse_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--height', type=int, default=610,
+                        help="Height of the synthetic scene")
+    parser.add_argument('--width', type=int, default=340,
+                        help="Width of the synthetic scene")
+    parser.add_argument('--bands', type=int, default=103,
+                        help="Number of bands of the synthetic scene")
+    parser.add_argument('--classes', type=int, default=9,
+                        help="Number of classes of the model")
+    parser.add_argument('--neighbourhoods', type=int, nargs='+',
+                        default=[5, 7],
+                        help="Neighbourhood sizes to benchmark")
+    parser.add_argument('--tile_size', type=int, default=128,
+                        help="Height and width of tiles the scene is "
+                             "processed in")
+    parser.add_argument('--batch_size', type=int, default=1024,
+                        help="Number of patches classified at once")
+    parser.add_argument('--tolerance', type=float, default=1e-4,
+                        help="Maximal absolute difference of probabilities")
+    return parser.parse_args()
+
+
+def main(args):
+    random_state = np.random.RandomState(0)
+    cube = random_state.uniform(size=(args.height, args.width,
+                                      args.bands)).astype(np.float32)
+
+    for neighbourhood_size in args.neighbourhoods:
+        settings = build_settings_for_dataset((neighbourhood_size,
+                                               neighbourhood_size))
+        model = build_3d_model(settings, args.classes, args.bands)
+        dense_model = build_dense_3d_model(model)
+
+        patches = classify_scene(cube,
+                                 get_keras_predictor(model, args.batch_size),
+                                 neighbourhood_size=neighbourhood_size,
+                                 tile_size=args.tile_size,
+                                 batch_size=args.batch_size,
+                                 return_probabilities=True)
+        dense = classify_scene(cube, dense_model.predict,
+                               neighbourhood_size=neighbourhood_size,
+                               tile_size=args.tile_size,
+                               return_probabilities=True, dense=True)
+
+        difference = np.max(np.abs(patches.probabilities -
+                                   dense.probabilities))
+        if difference > args.tolerance:
+            raise AssertionError("Dense prediction differs from prediction "
+                                 "of patches by {} for neighbourhood {}"
+                                 .format(difference, neighbourhood_size))
+        print("Neighbourhood: {} Patches: {:.1f} pixels/s "
+              "Dense: {:.1f} pixels/s Speedup: {:.1f}x "
+              "Max difference: {:.2e} Same labels: {:.4f}"
+              .format(neighbourhood_size, patches.pixels_per_second,
+                      dense.pixels_per_second,
+                      dense.pixels_per_second / patches.pixels_per_second,
+                      difference,
+                      np.mean(patches.labels == dense.labels)))
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    main(args)
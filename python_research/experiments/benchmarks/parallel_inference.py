@@ -0,0 +1,83 @@
+"""
+Benchmark of scaling of whole-scene classification with the number of
+worker processes. A model built with build_3d_model classifies a synthetic
+scene with Pavia University dimensions by default, with each number of
+workers. Maps of labels have to be the same for any number of workers.
+Speedup and scaling efficiency are relative to the first number of workers
+benchmarked, a single worker by default.
+"""
+
+import os
+import shutil
+import argparse
+import tempfile
+
+import numpy as np
+
+from python_research.keras_models import build_3d_model, \
+    build_settings_for_dataset
+from python_research.scene_inference import classify_scene_parallel
+
+
+def parse_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--height', type=int, default=610,
+                        help="Height of the synthetic scene")
+    parser.add_argument('--width', type=int, default=340,
+                        help="Width of the synthetic scene")
+    parser.add_argument('--bands', type=int, default=103,
+                        help="Number of bands of the synthetic scene")
+    parser.add_argument('--classes', type=int, default=9,
+                        help="Number of classes of the model")
+    parser.add_argument('--neighbourhood_size', type=int, default=5,
+                        help="Neighbourhood size of the model")
+    parser.add_argument('--workers', type=int, nargs='+',
+                        default=[1, 2, 4, 8],
+                        help="Numbers of worker processes to benchmark")
+    parser.add_argument('--threads', type=int, default=1,
+                        help="Number of threads of each worker")
+    parser.add_argument('--tile_size', type=int, default=128,
+                        help="Height and width of tiles the scene is "
+                             "processed in")
+    parser.add_argument('--batch_size', type=int, default=1024,
+                        help="Number of patches classified at once")
+    return parser.parse_args()
+
+
+def main(args):
+    directory = tempfile.mkdtemp()
+    try:
+        cube_path = os.path.join(directory, 'scene.npy')
+        model_path = os.path.join(directory, 'model.h5')
+        random_state = np.random.RandomState(0)
+        np.save(cube_path, random_state.uniform(
+            size=(args.height, args.width, args.bands)).astype(np.float32))
+        settings = build_settings_for_dataset((args.neighbourhood_size,
+                                               args.neighbourhood_size))
+        build_3d_model(settings, args.classes, args.bands).save(model_path)
+
+        baseline = None
+        for workers in args.workers:
+            result = classify_scene_parallel(cube_path, model_path,
+                                             workers=workers,
+                                             threads=args.threads,
+                                             tile_size=args.tile_size,
+                                             batch_size=args.batch_size)
+            if baseline is None:
+                baseline = result
+            elif not np.array_equal(result.labels, baseline.labels):
+                raise AssertionError("Labels classified by {} workers "
+                                     "differ from labels of {} workers"
+                                     .format(workers, args.workers[0]))
+            speedup = result.pixels_per_second / baseline.pixels_per_second
+            print("Workers: {} {:.1f} pixels/s Speedup: {:.2f}x "
+                  "Efficiency: {:.2f}".format(
+                      workers, result.pixels_per_second, speedup,
+                      speedup * args.workers[0] / workers))
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    main(args)
@@ -0,0 +1,110 @@
+"""
+Benchmark of sample extraction in HyperspectralDataset. The vectorized
+extraction is compared against the per-pixel loop it replaced, on a synthetic
+scene with Pavia University dimensions by default.
+"""
+
+import time
+import argparse
+from copy import copy
+from math import ceil
+from itertools import product
+
+import numpy as np
+
+from python_research.dataset_structures import HyperspectralDataset, \
+    HEIGHT, WIDTH, DEPTH
+
+
+def parse_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--height', type=int, default=610,
+                        help="Height of the synthetic scene")
+    parser.add_argument('--width', type=int, default=340,
+                        help="Width of the synthetic scene")
+    parser.add_argument('--bands', type=int, default=103,
+                        help="Number of bands of the synthetic scene")
+    parser.add_argument('--classes', type=int, default=9,
+                        help="Number of classes in the synthetic ground truth")
+    parser.add_argument('--labeled_part', type=float, default=0.2,
+                        help="Fraction of pixels that are not background")
+    parser.add_argument('--neighbourhoods', type=int, nargs='+',
+                        default=[1, 5, 7],
+                        help="Neighbourhood sizes to benchmark")
+    parser.add_argument('--runs', type=int, default=3,
+                        help="Number of timed runs of the vectorized "
+                             "extraction for each neighbourhood")
+    return parser.parse_args()
+
+
+def loop_prepare_samples(raw_data: np.ndarray, ground_truth: np.ndarray,
+                         neighbourhood_size: int, background_label: int=0):
+    """
+    Reference implementation: the per-pixel loop previously used by
+    HyperspectralDataset.
+    """
+    col_indexes = [x for x in range(0, raw_data.shape[WIDTH])]
+    row_indexes = [y for y in range(0, raw_data.shape[HEIGHT])]
+    padding_size = 0
+    cube = raw_data
+    if neighbourhood_size > 1:
+        padding_size = neighbourhood_size % ceil(float(neighbourhood_size) / 2.)
+        cube = copy(raw_data)
+        v_padding = np.zeros((padding_size, cube.shape[WIDTH], cube.shape[DEPTH]))
+        cube = np.vstack((v_padding, cube))
+        cube = np.vstack((cube, v_padding))
+        h_padding = np.zeros((cube.shape[HEIGHT], padding_size, cube.shape[DEPTH]))
+        cube = np.hstack((h_padding, cube))
+        cube = np.hstack((cube, h_padding))
+    samples, labels = list(), list()
+    for x, y in product(col_indexes, row_indexes):
+        if ground_truth[y, x] != background_label:
+            if neighbourhood_size > 1:
+                sample = copy(cube[y:y + padding_size * 2 + 1,
+                                   x:x + padding_size * 2 + 1, ...])
+            else:
+                sample = copy(cube[y, x, ...])
+            samples.append(sample)
+            labels.append(ground_truth[y, x])
+    return (np.array(samples).astype(np.float64),
+            np.array(labels).astype(np.uint8))
+
+
+def main(args):
+    random_state = np.random.RandomState(0)
+    raw_data = random_state.randint(0, 8000, (args.height, args.width,
+                                              args.bands)).astype(np.uint16)
+    ground_truth = random_state.randint(1, args.classes + 1,
+                                        (args.height, args.width))
+    background = random_state.uniform(size=ground_truth.shape) > \
+        args.labeled_part
+    ground_truth[background] = 0
+
+    for neighbourhood_size in args.neighbourhoods:
+        start = time.time()
+        expected_data, expected_labels = loop_prepare_samples(
+            raw_data, ground_truth, neighbourhood_size)
+        loop_time = time.time() - start
+
+        vectorized_times = []
+        for _ in range(args.runs):
+            start = time.time()
+            dataset = HyperspectralDataset(raw_data, ground_truth,
+                                           neighbourhood_size)
+            vectorized_times.append(time.time() - start)
+        vectorized_time = min(vectorized_times)
+
+        if not (np.array_equal(dataset.get_data(), expected_data) and
+                np.array_equal(dataset.get_labels(), expected_labels)):
+            raise AssertionError("Vectorized extraction differs from the loop "
+                                 "for neighbourhood {}"
+                                 .format(neighbourhood_size))
+        print("Neighbourhood: {} Samples: {} Loop: {:.3f}s "
+              "Vectorized: {:.3f}s Speedup: {:.1f}x"
+              .format(neighbourhood_size, len(dataset), loop_time,
+                      vectorized_time, loop_time / vectorized_time))
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    main(args)
@@ -0,0 +1,64 @@
+"""
+Benchmark of updates of the array-backed PSO swarm. A cheap objective,
+the negated sphere function, is optimized with an objective scoring the
+whole swarm at once and with one scoring particle by particle. Both have to
+find the same best position for the same seed.
+"""
+
+import time
+import argparse
+
+import numpy as np
+
+from python_research.fastPSO.pso import Pso
+
+
+def parse_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--swarm_size', type=int, default=10000,
+                        help="Number of particles")
+    parser.add_argument('--dimensions', type=int, default=10,
+                        help="Number of dimensions of the search space")
+    parser.add_argument('--iterations', type=int, default=100,
+                        help="Number of iterations of the swarm")
+    parser.add_argument('--history_size', type=int, default=0,
+                        help="Number of recent iterations kept by the swarm")
+    return parser.parse_args()
+
+
+def sphere(positions: np.ndarray) -> np.ndarray:
+    return -np.sum(np.square(positions - 0.5), axis=-1)
+
+
+def run(objective, args, vectorized: bool):
+    np.random.seed(0)
+    pso = Pso(objective, -np.ones(args.dimensions), np.ones(args.dimensions),
+              swarm_size=args.swarm_size,
+              maximum_iterations=args.iterations, minimum_step=-1,
+              minimum_improvement=-np.inf, vectorized=vectorized,
+              history_size=args.history_size)
+    start = time.perf_counter()
+    position, score = pso.run()
+    updates_per_second = args.swarm_size * args.iterations / \
+        (time.perf_counter() - start)
+    return position, score, updates_per_second
+
+
+def main(args):
+    results = {}
+    for vectorized in [True, False]:
+        objective = sphere if vectorized else \
+            lambda position: float(sphere(position))
+        results[vectorized] = run(objective, args, vectorized)
+        print("Vectorized objective: {} Best score: {:.3e} "
+              "{:.1f} particle updates/s".format(vectorized,
+                                                 results[vectorized][1],
+                                                 results[vectorized][2]))
+    if not np.array_equal(results[True][0], results[False][0]):
+        raise AssertionError("Vectorized objective found a different best "
+                             "position")
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    main(args)
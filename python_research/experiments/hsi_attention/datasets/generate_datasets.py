@@ -1,6 +1,6 @@
 import numpy as np
-from scipy.io import loadmat
 
+from python_research import io
 from python_research.experiments.band_selection_algorithms.utils import min_max_normalize_data
 
 
@@ -76,31 +76,8 @@ def get_loader_function(data_path: str, ref_map_path: str) -> tuple:
     :param ref_map_path: Path to labels.
     :return: Prepared data as a tuple.
     """
-    data = None
-    ref_map = None
-    if data_path.endswith(".npy"):
-        data = np.load(data_path)
-    if data_path.endswith(".mat"):
-        mat = loadmat(data_path)
-        for key in mat.keys():
-            if "__" not in key:
-                data = mat[key]
-                break
-    if ref_map_path.endswith(".npy"):
-        ref_map = np.load(ref_map_path)
-    if ref_map_path.endswith(".mat"):
-        mat = loadmat(ref_map_path)
-        for key in mat.keys():
-            if "__" not in key:
-                ref_map = mat[key]
-                break
-    assert data is not None and ref_map is not None, "The specified path or format of file is incorrect."
+    data = io.load_data(data_path)
+    ref_map = io.load_data(ref_map_path)
     data = min_max_normalize_data(data=data.astype(float))
     non_zeros = np.nonzero(ref_map)
-    prepared_data = []
-    for i in range(data.shape[-1]):
-        band = data[..., i][non_zeros]
-        prepared_data.append(band)
-    ref_map = ref_map[non_zeros] - 1
-    prepared_data = np.asarray(prepared_data).T
-    return prepared_data, ref_map
+    return data[non_zeros], ref_map[non_zeros] - 1
@@ -55,6 +55,15 @@ class Model2(torch.nn.Module):
             return f.softmax(prediction + first_module_prediction + second_module_prediction, dim=1)
         return f.softmax(prediction, dim=1)
 
+    def predict(self, x: torch.Tensor) -> torch.Tensor:
+        """
+        Inference-only feed forward method, which does not collect attention heatmaps.
+
+        :param x: Input tensor.
+        :return: Class probabilities.
+        """
+        return self(x, None, infer=False)
+
     def get_heatmaps(self, input_size: int) -> np.ndarray:
         """
         Return averaged heatmaps for model with two attention modules.
@@ -61,6 +61,15 @@ class Model3(torch.nn.Module):
                              dim=1)
         return f.softmax(prediction, dim=1)
 
+    def predict(self, x: torch.Tensor) -> torch.Tensor:
+        """
+        Inference-only feed forward method, which does not collect attention heatmaps.
+
+        :param x: Input tensor.
+        :return: Class probabilities.
+        """
+        return self(x, None, infer=False)
+
     def get_heatmaps(self, input_size: int) -> np.ndarray:
         """
        Return averaged heatmaps for model with three attention modules.
@@ -103,7 +103,7 @@ class AttentionBlock(torch.nn.Module):
         cross_product = torch.einsum("ijk,ilk->ijlk", (heatmap.clone(), z.clone())) \
             .reshape(heatmap.shape[0], -1, heatmap.shape[2])
         cross_product = f.avg_pool1d(cross_product.permute(0, 2, 1), cross_product.shape[1])
-        cross_product = cross_product.squeeze()
+        cross_product = cross_product.squeeze(dim=2)
         return self._attention_net(cross_product) * self._confidence_net(cross_product)
 
     def get_heatmaps(self, input_size: int) -> np.ndarray:
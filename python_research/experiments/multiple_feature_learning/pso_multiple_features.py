@@ -1,5 +1,6 @@
 from train_multiple_features import build_training_set
-from python_research.fastPSO.pso import Pso, Particle, Bounds
+from python_research.fastPSO.archive import open_archive
+from python_research.fastPSO.pso import Pso
 from keras.callbacks import EarlyStopping
 import numpy as np
 import os
@@ -15,7 +16,8 @@ class MultipleFeaturesPso:
         stddev_path,
         diagonal_path,
         moment_path,
-        patience
+        patience,
+        archive_path=None
     ):
         self.original_path = original_path
         self.gt_path = gt_path
@@ -24,7 +26,7 @@ class MultipleFeaturesPso:
         self.diagonal_path = diagonal_path
         self.moment_path = moment_path
         self.patience = patience
-        self.archive = {}
+        self.archive = open_archive(archive_path)
 
     def run(
         self,
@@ -34,7 +36,8 @@ class MultipleFeaturesPso:
         min_nb_samples,
         max_nb_samples,
         min_neighborhood,
-        max_neighborhood
+        max_neighborhood,
+        threads=1
     ):
         if min_nb_samples < 10:
             raise ValueError('min_nb_samples must greater or equal to 10')
@@ -57,7 +60,9 @@ class MultipleFeaturesPso:
             objective_function=self._objective_function,
             lower_bound=lower_bounds,
             upper_bound=upper_bounds,
-            threads=1
+            threads=threads,
+            archive=self.archive,
+            key=self._archive_key
         )
         best_position, best_score = pso.run()
 
@@ -71,8 +76,8 @@ class MultipleFeaturesPso:
             )
         )
 
-    def _objective_function(self, particle: Particle):
-        batch_size, nb_samples, neighborhood = self._extract_parameters(particle.position())
+    def _objective_function(self, position: np.ndarray):
+        batch_size, nb_samples, neighborhood = self._extract_parameters(position)
 
         print(
             'Processing: batch size = {}, samples = {}, neighborhood = {}'.format(
@@ -82,10 +87,6 @@ class MultipleFeaturesPso:
             )
         )
 
-        archive_index = '{}_{}_{}'.format(batch_size, nb_samples, neighborhood)
-        if archive_index in self.archive:
-            return 1 - self.archive[archive_index]['val_acc'][-1]
-
         training_set = build_training_set(
             self.original_path,
             self.gt_path,
@@ -116,13 +117,14 @@ class MultipleFeaturesPso:
             verbose=1
         )[1]
 
-        self.archive[archive_index] = history.history
-
         score = 1 - history.history['val_acc'][-1]
         print('Score = {}'.format(score))
 
         return score
 
+    def _archive_key(self, position):
+        return '{}_{}_{}'.format(*self._extract_parameters(position))
+
     def _extract_parameters(self, position):
         batch_size, nb_samples, neighborhood = position
         batch_size = int(batch_size)
@@ -186,6 +188,23 @@ if __name__ == '__main__':
         type=int,
         help='Number of epochs without improvement on validation score before stopping the learning'
     )
+    parser.add_argument(
+        '-w',
+        action='store',
+        dest='threads',
+        type=int,
+        default=1,
+        help='Number of processes training particles concurrently'
+    )
+    parser.add_argument(
+        '-r',
+        action='store',
+        dest='archive_path',
+        type=str,
+        default=None,
+        help='Path to the archive of scores of trained particles, reused when the search is resumed. '
+             'An SQLite database for .db or .sqlite extension and a file of JSON records otherwise'
+    )
     parser.add_argument(
         'swarm',
         action='store',
@@ -238,7 +257,8 @@ if __name__ == '__main__':
         args.stddev_path,
         args.diagonal_path,
         args.moment_path,
-        args.patience
+        args.patience,
+        args.archive_path
     )
 
     pso.run(
@@ -248,5 +268,6 @@ if __name__ == '__main__':
         args.minSamples,
         args.maxSamples,
         args.minneighborhood,
-        args.maxneighborhood
+        args.maxneighborhood,
+        args.threads
     )
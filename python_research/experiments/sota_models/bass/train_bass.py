@@ -28,6 +28,11 @@ class Arguments(NamedTuple):
     labels_path: str
     dest_path: str
     classes: int
+    cache_dir: str
+    cache_size: float
+    workers: int
+    test_batch: int
+    tuned_model: str
 
 
 def arguments() -> Arguments:
@@ -61,6 +66,19 @@ def arguments() -> Arguments:
     parser.add_argument("--labels_path", dest="labels_path", help="Path to the file with labels.", type=str)
     parser.add_argument("--dest_path", dest="dest_path", help="Path to destination folder.", type=str)
     parser.add_argument("--classes", dest="classes", help="Number of classes for the model.", type=int)
+    parser.add_argument("--cache_dir", dest="cache_dir", help="Directory of the cache of prepared samples. (Optional argument).",
+                        type=str)
+    parser.add_argument("--cache_size", dest="cache_size", help="Maximal size of the cache in gigabytes.", type=float,
+                        default=10)
+    parser.add_argument("--workers", dest="workers", help="Number of data loader worker processes.", type=int,
+                        default=0)
+    parser.add_argument("--test_batch", dest="test_batch",
+                        help="Number of samples classified at once during testing. The default is the batch size tuned "
+                             "for --tuned_model, or 1024.", type=int)
+    parser.add_argument("--tuned_model", dest="tuned_model",
+                        help="Path to a model of the same architecture and input size tuned with inference_tuning. "
+                             "Its number of threads and batch size are used for testing. (Optional argument).",
+                        type=str)
     return Arguments(**vars(parser.parse_args()))
 
 
@@ -78,7 +96,7 @@ def main(args: Arguments):
         dtype = "torch.cuda.FloatTensor"
     model = Bass(classes=args.classes, in_channels_in_block1=args.in_channels,
                  out_channels_in_block1=args.out_channels,
-                 nb=args.nb, batch_size=args.batch, dtype=dtype,
+                 nb=args.nb, dtype=dtype,
                  neighborhood_size=args.neighborhood_size).to(device=device)
     run_model(args=args, model=model, data_prep_function=prep_sets_by_sizes)
 
@@ -1,13 +1,18 @@
 import argparse
 import copy
+import multiprocessing
 import numpy as np
 import os
 import torch
 import pickle
+from functools import partial
+from python_research.dataset_structures import LazyHyperspectralDataset
+from python_research.sample_cache import SampleCache
 from python_research.experiments.sota_models.conv_3D import conv_3D
 from python_research.experiments.sota_models.utils.monte_carlo import prep_monte_carlo
 from python_research.experiments.sota_models.utils.models_runner import run_model
-from python_research.fastPSO.pso import Pso, Particle, Bounds
+from python_research.fastPSO.archive import open_archive
+from python_research.fastPSO.pso import Pso
 
 from typing import List, NamedTuple
 
@@ -36,6 +41,13 @@ class Arguments(NamedTuple):
     channels_step: List
     input_depth: int
     swarm_size: int
+    cache_dir: str
+    cache_size: float
+    workers: int
+    test_batch: int
+    tuned_model: str
+    pso_workers: int
+    archive_path: str
 
 
 class PsoRunner:
@@ -49,7 +61,8 @@ class PsoRunner:
         :param args: Arguments for runner.
         """
         self.args = args
-        self.archive = {}
+        self.archive = open_archive(args.archive_path)
+        self.samples = None
 
     def _extract_parameters(self, position):
         """
@@ -67,42 +80,48 @@ class PsoRunner:
 
         return neighborhood_size, channels
 
-    def _objective_function(self, particle: Particle):
+    def _archive_key(self, position: np.ndarray) -> str:
+        """
+        Key of the particle in the archive.
+        :param position: Position of the particle.
+        :return: Parameters of the particle.
+        """
+        return '{},{}'.format(*self._extract_parameters(position))
+
+    def _objective_function(self, position: np.ndarray):
         """
         PSO objective function
-        :param particle: Particle data.
+        :param position: Position of the particle.
         :return: Particle score.
         """
-        neighborhood_size, channels = self._extract_parameters(particle.position())
+        neighborhood_size, channels = self._extract_parameters(position)
         print('Processing: neighborhood = {}, channels = {}'.format(neighborhood_size, channels))
 
-        archive_index = '{},{}'.format(neighborhood_size, channels)
-        if archive_index in self.archive:
-            return self.archive[archive_index]
-
         args = lambda: None
         for field in self.args._fields:
             setattr(args, field, getattr(self.args, field))
         args.neighborhood_size = neighborhood_size
+        if multiprocessing.current_process().daemon:
+            # Processes of the PSO pool are daemonic and cannot start data loader workers
+            args.workers = 0
         args.input_dim = [args.input_depth, neighborhood_size, neighborhood_size]
         args.channels = channels
-        args.run_idx = 'pso_{}_{}'.format(self.args.run_idx, archive_index)
+        args.run_idx = 'pso_{}_{}'.format(self.args.run_idx, self._archive_key(position))
 
         model = conv_3D.ConvNet3D(
             classes=args.classes,
             channels=list(map(int, args.channels)),
             input_dim=np.asarray(list(map(int, args.input_dim))),
-            batch_size=args.batch,
             dtype=args.dtype
         )
 
         if torch.cuda.is_available():
             model = model.cuda()
 
-        history_pack = run_model(args=args, model=model, data_prep_function=prep_monte_carlo)
+        history_pack = run_model(args=args, model=model,
+                                 data_prep_function=partial(prep_monte_carlo, dataset=self.samples))
 
         score = max(history_pack.val.acc)
-        self.archive[archive_index] = score
         print('Score = {}'.format(score))
 
         return score
@@ -125,12 +144,23 @@ class PsoRunner:
         lower_bounds = np.array([self.args.min_neighborhood_size] + min_channels)
         upper_bounds = np.array([self.args.max_neighborhood_size] + max_channels)
 
+        # Samples are extracted once in the largest neighborhood, particles use center crops of them
+        cache = SampleCache(self.args.cache_dir, self.args.cache_size) if self.args.cache_dir is not None else None
+        self.samples = LazyHyperspectralDataset(dataset=self.args.data_path, ground_truth=self.args.labels_path,
+                                                neighbourhood_size=self.args.max_neighborhood_size | 1,
+                                                dtype=np.float32, cache=cache)
+        if self.args.pso_workers > 1:
+            # The runner is pickled with every particle, so the cube is sent as a path to shared memory
+            self.samples.share_memory()
+
         pso = Pso(
             swarm_size=self.args.swarm_size,
             objective_function=self._objective_function,
             lower_bound=lower_bounds,
             upper_bound=upper_bounds,
-            threads=1
+            threads=self.args.pso_workers,
+            archive=self.archive,
+            key=self._archive_key
         )
         best_position, best_score = pso.run()
 
@@ -192,6 +222,13 @@ def arguments() -> Arguments:
     parser.add_argument('--channels_step', dest='channels_step', nargs='+', help='List of step value between min and max channels.', required=True)
     parser.add_argument('--input_depth', dest='input_depth', help='Input depth dimensionality.', type=int, required=True)
     parser.add_argument('--swarm_size', dest='swarm_size', help='Swarm size.', type=int, required=True)
+    parser.add_argument('--cache_dir', dest='cache_dir', help='Directory of the cache of prepared samples.', type=str)
+    parser.add_argument('--cache_size', dest='cache_size', help='Maximal size of the cache in gigabytes.', type=float, default=10)
+    parser.add_argument('--workers', dest='workers', help='Number of data loader worker processes.', type=int, default=0)
+    parser.add_argument('--test_batch', dest='test_batch', help='Number of samples classified at once during testing. The default is the batch size tuned for --tuned_model, or 1024.', type=int)
+    parser.add_argument('--tuned_model', dest='tuned_model', help='Path to a model of the same architecture tuned with inference_tuning. Its number of threads and batch size are used for testing.', type=str)
+    parser.add_argument('--pso_workers', dest='pso_workers', help='Number of processes training particles concurrently. Samples are then loaded in the training processes, without data loader workers.', type=int, default=1)
+    parser.add_argument('--archive_path', dest='archive_path', help='Path to the archive of scores of trained particles, an SQLite database for .db or .sqlite extension and a file of JSON records otherwise. Scores in the archive are reused, so that an interrupted search can be resumed. Each data set and training setup needs a separate archive. Scores are kept in memory if not specified.', type=str)
     args = vars(parser.parse_args())
     return Arguments(**args)
 
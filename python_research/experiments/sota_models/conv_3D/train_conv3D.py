@@ -28,6 +28,11 @@ class Arguments(NamedTuple):
     val_size: float
     channels: list
     input_dim: int
+    cache_dir: str
+    cache_size: float
+    workers: int
+    test_batch: int
+    tuned_model: str
 
 
 def arguments() -> Arguments:
@@ -60,6 +65,19 @@ def arguments() -> Arguments:
     parser.add_argument("--input_dim", dest="input_dim", nargs="+",
                         help="Dimensionality of the input sample, e.g. \"--input_dim (number_of_channels) 7 7\"",
                         required=True)
+    parser.add_argument("--cache_dir", dest="cache_dir", help="Directory of the cache of prepared samples. (Optional argument).",
+                        type=str)
+    parser.add_argument("--cache_size", dest="cache_size", help="Maximal size of the cache in gigabytes.", type=float,
+                        default=10)
+    parser.add_argument("--workers", dest="workers", help="Number of data loader worker processes.", type=int,
+                        default=0)
+    parser.add_argument("--test_batch", dest="test_batch",
+                        help="Number of samples classified at once during testing. The default is the batch size tuned "
+                             "for --tuned_model, or 1024.", type=int)
+    parser.add_argument("--tuned_model", dest="tuned_model",
+                        help="Path to a model of the same architecture and input size tuned with inference_tuning. "
+                             "Its number of threads and batch size are used for testing. (Optional argument).",
+                        type=str)
     return Arguments(**vars(parser.parse_args()))
 
 
@@ -77,7 +95,7 @@ def main(args: Arguments):
         dtype = "torch.cuda.FloatTensor"
     model = conv_3D.ConvNet3D(classes=args.classes, channels=list(map(int, args.channels)),
                               input_dim=np.asarray(list(map(int, args.input_dim))),
-                              batch_size=args.batch, dtype=dtype).to(device=device)
+                              dtype=dtype).to(device=device)
     if torch.cuda.is_available():
         model = model.cuda()
     run_model(args=args, model=model, data_prep_function=prep_monte_carlo)
@@ -1,6 +1,8 @@
 import numpy as np
 import torch
 
+from python_research.metrics import ConfusionMatrix
+
 
 class BaseModule(torch.nn.Module):
     """
@@ -30,11 +32,31 @@ class BaseModule(torch.nn.Module):
         self.test_acc_history = []
         self.test_loss_history = []
 
-        self.acc_per_class = [[] for _ in range(classes)]
+        self.test_confusion_matrix = ConfusionMatrix(classes)
 
     def forward(self, *x) -> torch.Tensor:
         pass
 
+    @property
+    def acc_per_class(self) -> np.ndarray:
+        """
+        Accuracy of each class over all tested samples.
+
+        :return: Accuracies of classes.
+        """
+        return self.test_confusion_matrix.class_accuracies
+
+    def get_outcomes_per_class(self) -> list:
+        """
+        Outcomes of tested samples of each class, True for correctly classified ones, which is the format
+        the acc_per_class artifact is saved in. Correct outcomes come first, the order of samples is not kept.
+
+        :return: List of outcomes of each class.
+        """
+        matrix = self.test_confusion_matrix.matrix
+        return [[True] * int(matrix[label, label]) + [False] * int(matrix[label].sum() - matrix[label, label])
+                for label in range(len(matrix))]
+
     @staticmethod
     def check_dtype(dtype: str) -> list:
         """
@@ -1,3 +1,4 @@
+import numpy as np
 from torch.utils.data.dataset import Dataset
 
 
@@ -32,3 +33,66 @@ class ListDataset(Dataset):
         :return: Length of the data set.
         """
         return len(self.samples)
+
+
+class IndexedDataset(Dataset):
+    """
+    Class that represents datasets as indices of samples of a hyperspectral dataset.
+    Samples are gathered from the source dataset on access, so subsets of the source are views
+    of its storage, e.g. of the padded cube of a LazyHyperspectralDataset, instead of copies of the samples.
+    """
+
+    def __init__(self, source, indices: np.ndarray, bands: np.ndarray = None):
+        """
+        Set the source dataset, indices of its samples and selected bands.
+
+        :param source: Dataset the samples are taken from.
+        :param indices: Indices of samples of the source dataset.
+        :param bands: Indices of bands selected from every sample, all bands are used if None.
+        """
+        self.source = source
+        self.indices = np.asarray(indices, dtype=np.intp)
+        self.bands = bands
+        self.labels = source.get_labels()[self.indices]
+
+    @property
+    def storage(self):
+        """
+        Storage of the source dataset, attached to shared memory by data loader workers.
+        """
+        return self.source.storage
+
+    def subset(self, indices: np.ndarray) -> 'IndexedDataset':
+        """
+        Create a dataset of some of the samples.
+
+        :param indices: Indices of samples of this dataset.
+        :return: Dataset sharing the source dataset.
+        """
+        return IndexedDataset(self.source, self.indices[np.asarray(indices, dtype=np.intp)], self.bands)
+
+    def share_memory(self):
+        """
+        Move the storage of the source dataset to shared memory.
+        """
+        self.source.share_memory()
+
+    def __getitem__(self, item) -> tuple:
+        """
+        Dataloader uses this method for loading the batched data.
+
+        :param item: Index of sample
+        :return: Transposed sample with selected bands and its label.
+        """
+        sample = self.source[self.indices[item]][0]
+        if self.bands is not None:
+            sample = sample[..., self.bands]
+        return sample.transpose(), self.labels[item]
+
+    def __len__(self) -> int:
+        """
+        Return length of the data set.
+
+        :return: Length of the data set.
+        """
+        return len(self.indices)
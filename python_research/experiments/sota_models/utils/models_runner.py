@@ -6,6 +6,10 @@ from typing import NamedTuple
 import torch
 from torch.utils.data.dataloader import DataLoader
 
+from python_research.dataset_structures import attach_shared_memory
+from python_research.inference_tuning import load_config
+from python_research.experiments.sota_models.utils.list_dataset import IndexedDataset
+
 
 class History(NamedTuple):
     acc: list
@@ -19,24 +23,39 @@ class HistoryPack(NamedTuple):
     test: History
 
 
+def share_datasets(*datasets: IndexedDataset):
+    """
+    Move source datasets of subsets to shared memory, each of them once,
+    so that data loader workers map their storage, e.g. the padded cube, instead of copying samples.
+
+    :param datasets: Subsets to share.
+    :return: None.
+    """
+    sources = {id(dataset.source): dataset for dataset in datasets}
+    for dataset in sources.values():
+        dataset.share_memory()
+
+
 def run_model(args, model, data_prep_function) -> HistoryPack:
     """
     Train, validate and test model.
 
-    :param args: Parsed arguments.
+    :param args: Parsed arguments. If args.workers is positive, batches are assembled by that many worker processes.
+                 Testing uses batches of args.test_batch samples. If args.tuned_model is given, testing uses
+                 the number of threads tuned for it with inference_tuning, and its batch size unless
+                 args.test_batch is given. Batches of 1024 samples are used otherwise.
     :param model: Model designed for training, validation and testing.
     :param data_prep_function: Data preparation function.
     :return: Artifacts of the experiment.
     """
     train_dataset, val_dataset, test_dataset = data_prep_function(args=args)
+    if args.workers > 0:
+        share_datasets(train_dataset, val_dataset, test_dataset)
 
     train_data_loader = DataLoader(dataset=train_dataset, batch_size=args.batch, shuffle=False, drop_last=True,
-                                   pin_memory=True)
+                                   pin_memory=True, num_workers=args.workers, worker_init_fn=attach_shared_memory)
     val_data_loader = DataLoader(dataset=val_dataset, batch_size=args.batch, shuffle=False, drop_last=True,
-                                 pin_memory=True)
-
-    test_data_loader = DataLoader(dataset=test_dataset, batch_size=args.batch, shuffle=False, drop_last=True,
-                                  pin_memory=True)
+                                 pin_memory=True, num_workers=args.workers, worker_init_fn=attach_shared_memory)
 
     if args.cont is not None:
         cont = os.path.basename(os.path.normpath(args.cont))
@@ -59,9 +78,26 @@ def run_model(args, model, data_prep_function) -> HistoryPack:
     train_history, val_history = train_model(model=model, train_data_loader=train_data_loader,
                                              val_data_loader=val_data_loader, path=path, args=args)
 
-    test_history = infer_model(model=torch.load(os.path.join(path, "saved_model")),
-                               test_data_loader=test_data_loader,
-                               path=path)
+    config = None
+    if args.tuned_model is not None:
+        config = load_config(args.tuned_model)
+        if config is None:
+            raise ValueError("Model {} was not tuned with inference_tuning".format(args.tuned_model))
+    test_batch = args.test_batch
+    if test_batch is None:
+        test_batch = config.batch_size if config is not None else 1024
+    test_data_loader = DataLoader(dataset=test_dataset, batch_size=test_batch, shuffle=False, drop_last=False,
+                                  pin_memory=True, num_workers=args.workers, worker_init_fn=attach_shared_memory)
+
+    threads = torch.get_num_threads()
+    if config is not None:
+        torch.set_num_threads(config.intra_op_threads)
+    try:
+        test_history = infer_model(model=torch.load(os.path.join(path, "saved_model")),
+                                   test_data_loader=test_data_loader,
+                                   path=path)
+    finally:
+        torch.set_num_threads(threads)
 
     return HistoryPack(
         train=train_history,
@@ -72,7 +108,8 @@ def run_model(args, model, data_prep_function) -> HistoryPack:
 
 def infer_model(model, test_data_loader, path) -> History:
     """
-    Test previously loaded model.
+    Test previously loaded model on every sample of the testing set.
+    Samples are classified with the inference-only predict method, so batches of any size can be used.
 
     :param model: Model for inference.
     :param test_data_loader: Testing data loader.
@@ -83,12 +120,19 @@ def infer_model(model, test_data_loader, path) -> History:
     test_loss_history = []
     test_time_history = []
     model.eval()
+    model.test_confusion_matrix.reset()
+    loss = 0.
     begin = time.time()
-    for x, y in test_data_loader:
-        x = x.type(model.dtype[0])
-        y = y.type(model.dtype[1])
-        model(x, y, test=True)
-    epoch_acc, epoch_loss = model.get_test_results()
+    with torch.no_grad():
+        for x, y in test_data_loader:
+            x = x.type(model.dtype[0])
+            y = y.type(model.dtype[1])
+            probabilities = model.predict(x)
+            loss += torch.nn.functional.nll_loss(torch.log(probabilities.clamp(min=1e-12)), y,
+                                                 reduction="sum").item()
+            model.test_confusion_matrix.update(torch.argmax(probabilities, dim=1), y)
+    epoch_acc = model.test_confusion_matrix.overall_accuracy
+    epoch_loss = loss / model.test_confusion_matrix.count
     print("Testing -> Accuracy: {} Loss: {}".format(epoch_acc, epoch_loss))
     test_acc_history.append(epoch_acc), test_loss_history.append(epoch_loss)
     test_time_history.append(time.time() - begin)
@@ -97,7 +141,7 @@ def infer_model(model, test_data_loader, path) -> History:
     pickle.dump(test_acc_history, open(os.path.join(path, "test_acc"), "wb"))
     pickle.dump(test_loss_history, open(os.path.join(path, "test_loss"), "wb"))
     pickle.dump(test_time_history, open(os.path.join(path, "test_time"), "wb"))
-    pickle.dump(model.acc_per_class, open(os.path.join(path, "acc_per_class"), "wb"))
+    pickle.dump(model.get_outcomes_per_class(), open(os.path.join(path, "acc_per_class"), "wb"))
 
     return History(
         acc=test_acc_history,
@@ -2,10 +2,25 @@ from random import shuffle
 
 import numpy as np
 
+from python_research.dataset_structures import Dataset
 from python_research.experiments.sota_models.utils.sets_prep import generate_samples, prep_dataset, unravel_dataset
 
 
-def prep_monte_carlo(args) -> tuple:
+def remove_chosen(class_: list, chosen_indexes: np.ndarray) -> list:
+    """
+    Remove chosen samples from the list of samples of a given class, preserving the order of the remaining ones.
+    Only indices of samples are kept, so samples are not copied.
+
+    :param class_: List of indices of samples of a given class.
+    :param chosen_indexes: Indexes of samples to remove.
+    :return: List of remaining samples.
+    """
+    remaining = np.ones(len(class_), dtype=bool)
+    remaining[chosen_indexes] = False
+    return [sample for sample, keep in zip(class_, remaining) if keep]
+
+
+def prep_monte_carlo(args, dataset: Dataset = None) -> tuple:
     """
     Finds the size of the smallest population among all classes,
     then divides on three sets:
@@ -16,13 +31,15 @@ def prep_monte_carlo(args) -> tuple:
     - Testing set takes (args.test_size * lowest_class_population) samples.
     args.test_size is the fraction of samples designed for testing set.
     :param args: Parsed arguments.
+    :param dataset: Samples already extracted in a neighborhood not smaller than args.neighborhood_size,
+        passed to generate_samples.
     :return: Training, Validation and Testing objects.
     """
     print("Monte Carlo data prep:")
-    samples = generate_samples(args=args)
+    samples = generate_samples(args=args, dataset=dataset)
     samples_by_classes = [[] for _ in range(args.classes)]
-    for x in samples:
-        samples_by_classes[x[1]].append(x[0].transpose())
+    for index, label in enumerate(samples.labels):
+        samples_by_classes[label].append(index)
 
     [shuffle(x) for x in samples_by_classes]
 
@@ -38,7 +55,7 @@ def prep_monte_carlo(args) -> tuple:
         assert len(np.unique(chosen_indexes)) == len(chosen_indexes)
         for index in chosen_indexes:
             test_set[idx].append([class_[index], idx])
-        samples_by_classes[idx] = np.delete(np.asarray(class_), [chosen_indexes], axis=0)
+        samples_by_classes[idx] = remove_chosen(class_, chosen_indexes)
 
     val_set_size = int(lowest_class_population * args.val_size)
     val_set = [[] for _ in range(args.classes)]
@@ -47,7 +64,7 @@ def prep_monte_carlo(args) -> tuple:
         assert len(np.unique(chosen_indexes)) == len(chosen_indexes)
         for index in chosen_indexes:
             val_set[idx].append([class_[index], idx])
-        samples_by_classes[idx] = np.delete(np.asarray(class_), [chosen_indexes], axis=0)
+        samples_by_classes[idx] = remove_chosen(class_, chosen_indexes)
 
     train_set_size = int(lowest_class_population * (1 - (args.val_size + args.test_size)))
     train_set = [[] for _ in range(args.classes)]
@@ -56,6 +73,6 @@ def prep_monte_carlo(args) -> tuple:
         assert len(np.unique(chosen_indexes)) == len(chosen_indexes)
         for index in chosen_indexes:
             train_set[idx].append([class_[index], idx])
-        samples_by_classes[idx] = np.delete(np.asarray(class_), [chosen_indexes], axis=0)
+        samples_by_classes[idx] = remove_chosen(class_, chosen_indexes)
     train_set, val_set, test_set = unravel_dataset(train_set=train_set, val_set=val_set, test_set=test_set)
-    return prep_dataset(train_set=train_set, val_set=val_set, test_set=test_set)
+    return prep_dataset(train_set=train_set, val_set=val_set, test_set=test_set, samples=samples)
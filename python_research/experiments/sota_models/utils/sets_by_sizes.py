@@ -17,8 +17,8 @@ def prep_sets_by_sizes(args) -> tuple:
     samples = generate_samples(args=args)
     samples_by_classes = [[] for _ in range(args.classes)]
 
-    for x in samples:
-        samples_by_classes[x[1]].append([x[0].transpose(), x[1]])
+    for index, label in enumerate(samples.labels):
+        samples_by_classes[label].append([index, label])
 
     [shuffle(x) for x in samples_by_classes]
 
@@ -33,4 +33,4 @@ def prep_sets_by_sizes(args) -> tuple:
 
     train_set, val_set, test_set = unravel_dataset(train_set=train_set, val_set=val_set, test_set=test_set)
 
-    return prep_dataset(train_set=train_set, val_set=val_set, test_set=test_set)
+    return prep_dataset(train_set=train_set, val_set=val_set, test_set=test_set, samples=samples)
@@ -4,63 +4,69 @@ from typing import List
 
 import numpy as np
 
-from python_research.experiments.sota_models.utils.list_dataset import ListDataset
-from python_research.dataset_structures import HyperspectralDataset
+from python_research.experiments.sota_models.utils.list_dataset import IndexedDataset
+from python_research.dataset_structures import Dataset, LazyHyperspectralDataset
+from python_research.sample_cache import SampleCache
 
 
-def attention_selection(data: np.ndarray, args: argparse.Namespace) -> List:
+def attention_selection(args: argparse.Namespace) -> np.ndarray:
     """
-     Select bands chosen by the attention mechanism.
+     Load bands chosen by the attention mechanism.
 
-    :param data: Hyperspectral data block.
     :param args: Parsed arguments containing path to the file which stores selected bands ids.
+    :return: Sorted indices of selected bands.
     """
     with open(args.cont) as f:
         content = f.readlines()
         content = [int(x.rstrip("\n")) for x in content]
         content.sort()
         content = np.asarray(content, dtype=int)
-    if content is not None:
-        print("Reducing bands from: {}".format(args.cont))
-        data = [x[..., content] for x in data]
-        print(content)
-    return data
+    print("Reducing bands from: {}".format(args.cont))
+    print(content)
+    return content
 
 
-def generate_samples(args: argparse.Namespace) -> List:
+def generate_samples(args: argparse.Namespace, dataset: Dataset = None) -> IndexedDataset:
     """
     Generate samples and normalize them.
+    Samples are gathered from a single padded cube on access, so the patches are not copied until they are batched.
+    They are stored as float32, the precision used by the models.
+    If args.cache_dir is given, the padded cube is cached there and memory-mapped on subsequent runs.
 
     :param args: Parsed arguments.
-    :return: List of samples
+    :param dataset: Samples already extracted in a neighborhood not smaller than args.neighborhood_size.
+        If given, they are cropped to args.neighborhood_size instead of being extracted again.
+    :return: Dataset of all samples, subsets of it are taken with IndexedDataset.subset.
     """
-    samples = HyperspectralDataset(dataset=args.data_path, ground_truth=args.labels_path,
-                                   neighbourhood_size=args.neighborhood_size)
+    if dataset is not None:
+        samples = dataset.crop(args.neighborhood_size)
+    else:
+        cache = SampleCache(args.cache_dir, args.cache_size) if args.cache_dir is not None else None
+        samples = LazyHyperspectralDataset(dataset=args.data_path, ground_truth=args.labels_path,
+                                           neighbourhood_size=args.neighborhood_size, dtype=np.float32,
+                                           cache=cache)
     samples.normalize_min_max()
     samples.normalize_labels()
-    data = samples.get_data()
-    if args.cont is not None:
-        data = attention_selection(data=data, args=args)
-    labels = samples.get_labels()
-    samples = [x for x in zip(data, labels)]
-    return samples
+    bands = attention_selection(args=args) if args.cont is not None else None
+    return IndexedDataset(source=samples, indices=np.arange(len(samples)), bands=bands)
 
 
-def prep_dataset(train_set: List, val_set: List, test_set: List) -> tuple:
+def prep_dataset(train_set: List, val_set: List, test_set: List, samples: IndexedDataset) -> tuple:
     """
-    Stores datasets as objects of type ListDataset.
+    Stores datasets as subsets of all samples.
 
-    :param train_set: Samples designed for training.
-    :param val_set: Samples designed for validation.
-    :param test_set: Samples designed for testing.
+    :param train_set: Indices and labels of samples designed for training.
+    :param val_set: Indices and labels of samples designed for validation.
+    :param test_set: Indices and labels of samples designed for testing.
+    :param samples: Dataset of all samples.
     """
     shuffle(train_set), shuffle(val_set), shuffle(test_set)
-    samples, labels = zip(*train_set)
-    train_dataset = ListDataset(samples=samples, labels=labels)
-    samples, labels = zip(*val_set)
-    val_dataset = ListDataset(samples=samples, labels=labels)
-    samples, labels = zip(*test_set)
-    test_dataset = ListDataset(samples=samples, labels=labels)
+    indices, labels = zip(*train_set)
+    train_dataset = samples.subset(indices)
+    indices, labels = zip(*val_set)
+    val_dataset = samples.subset(indices)
+    indices, labels = zip(*test_set)
+    test_dataset = samples.subset(indices)
     return train_dataset, val_dataset, test_dataset
 
 
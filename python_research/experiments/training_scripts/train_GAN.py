@@ -12,7 +12,8 @@ from python_research.augmentation.GAN.generator import Generator
 from python_research.augmentation.GAN.classifier import Classifier
 from python_research.augmentation.GAN.WGAN import WGAN
 from python_research.dataset_structures import HyperspectralDataset
-from python_research.dataset_structures import OrderedDataLoader
+from python_research.dataset_structures import OrderedDataLoader, attach_shared_memory
+from python_research.sample_cache import SampleCache
 
 parser = argparse.ArgumentParser()
 parser.add_argument('--dataset_path', type=str, help='Path to the dataset in .npy format')
@@ -30,6 +31,9 @@ parser.add_argument('--learning_rate', type=float, default=0.00001, help="Learni
 parser.add_argument('--lambda_gp', type=int, default=10)
 parser.add_argument('--b1', type=float, default=0)
 parser.add_argument('--b2', type=float, default=0.9)
+parser.add_argument('--cache_dir', type=str, default=None, help='Directory of the cache of prepared samples, samples are not cached if not specified')
+parser.add_argument('--cache_size', type=float, default=10, help='Maximal size of the cache in gigabytes')
+parser.add_argument('--workers', type=int, default=0, help='Number of processes loading batches for the classifier, samples are moved to shared memory if it is positive')
 args = parser.parse_args()
 if args.verbose:
     print(args)
@@ -38,10 +42,14 @@ os.makedirs(args.artifacts_path, exist_ok=True)
 
 cuda = True if torch.cuda.is_available() else False
 
-transformed_dataset = HyperspectralDataset(args.dataset_path, args.gt_path)
+cache = SampleCache(args.cache_dir, args.cache_size) if args.cache_dir is not None else None
+transformed_dataset = HyperspectralDataset(args.dataset_path, args.gt_path, cache=cache)
 transformed_dataset.normalize_min_max()
+if args.workers > 0:
+    transformed_dataset.share_memory()
 dataloader = DataLoader(transformed_dataset, batch_size=args.batch_size,
-                        shuffle=True, drop_last=True)
+                        shuffle=True, drop_last=True, num_workers=args.workers,
+                        worker_init_fn=attach_shared_memory)
 
 input_shape = bands_count = transformed_dataset.get_data().shape[-1]
 if args.classes_count == 0:
@@ -13,6 +13,7 @@ from python_research.dataset_structures import BalancedSubset
 from python_research.keras_models import build_1d_model, build_3d_model, build_settings_for_dataset
 from utils import calculate_class_accuracy, load_patches
 from python_research.io import save_to_csv
+from python_research.sample_cache import SampleCache
 
 
 def parse_args():
@@ -53,14 +54,26 @@ def parse_args():
                              "(only for 1D model)")
     parser.add_argument('--verbose', type=int, default=2,
                         help='Verbosity of training')
+    parser.add_argument('--cache_dir', type=str, default=None,
+                        help="Directory of the cache of prepared samples, "
+                             "samples are not cached if not specified")
+    parser.add_argument('--cache_size', type=float, default=10,
+                        help="Maximal size of the cache in gigabytes")
+    parser.add_argument('--dtype', type=str, default='float32',
+                        help="Data type samples are loaded and normalized "
+                             "in, float64 doubles the memory usage")
     return parser.parse_args()
 
 
 def main(args):
     os.makedirs(os.path.join(args.artifacts_path), exist_ok=True)
     # Init data
+    cache = SampleCache(args.cache_dir, args.cache_size) \
+        if args.cache_dir is not None else None
     train_data, test_data = load_patches(args.patches_dir,
-                                         args.pixel_neighborhood)
+                                         args.pixel_neighborhood,
+                                         dtype=args.dtype,
+                                         cache=cache)
     train_data.normalize_labels()
     test_data.normalize_labels()
     if args.pixel_neighborhood == 1:
@@ -77,8 +90,10 @@ def main(args):
     timer = TimeHistory()
 
     # Normalize data
-    max_ = train_data.max if train_data.max > val_data.max else val_data.max
-    min_ = train_data.min if train_data.min < val_data.min else val_data.min
+    statistics = val_data.get_statistics(train_data.get_statistics())
+    statistics.save(os.path.join(args.artifacts_path, args.output_file) +
+                    "_statistics.json")
+    min_, max_ = statistics.min, statistics.max
     train_data.normalize_min_max(min_=min_, max_=max_)
     val_data.normalize_min_max(min_=min_, max_=max_)
     test_data.normalize_min_max(min_=min_, max_=max_)
@@ -17,11 +17,13 @@ from python_research.keras_models import \
 from python_research.keras_custom_callbacks import \
     TimeHistory
 from python_research.dataset_structures import BalancedSubset
-from python_research.dataset_structures import OrderedDataLoader
+from python_research.dataset_structures import OrderedDataLoader, \
+    attach_shared_memory
 from python_research.augmentation.GAN.classifier import Classifier
 from python_research.augmentation.GAN.discriminator import Discriminator
 from python_research.augmentation.GAN.generator import Generator
 from python_research.augmentation.GAN.WGAN import WGAN
+from python_research.sample_cache import SampleCache
 
 
 def parse_args():
@@ -77,6 +79,18 @@ def parse_args():
     parser.add_argument('--lambda_gp', type=int, default=10)
     parser.add_argument('--b1', type=float, default=0)
     parser.add_argument('--b2', type=float, default=0.9)
+    parser.add_argument('--cache_dir', type=str, default=None,
+                        help="Directory of the cache of prepared samples, "
+                             "samples are not cached if not specified")
+    parser.add_argument('--cache_size', type=float, default=10,
+                        help="Maximal size of the cache in gigabytes")
+    parser.add_argument('--dtype', type=str, default='float32',
+                        help="Data type samples are loaded and normalized "
+                             "in, float64 doubles the memory usage")
+    parser.add_argument('--workers', type=int, default=0,
+                        help="Number of processes loading batches for the "
+                             "classifier, samples are moved to shared "
+                             "memory if it is positive")
     return parser.parse_args()
 
 
@@ -90,21 +104,30 @@ def get_samples_per_class_count(y):
 def main(args):
     os.makedirs(os.path.join(args.artifacts_path), exist_ok=True)
     # Init data
-    train_data, test_data = load_patches(args.patches_dir,)
+    cache = SampleCache(args.cache_dir, args.cache_size) \
+        if args.cache_dir is not None else None
+    train_data, test_data = load_patches(args.patches_dir,
+                                         dtype=args.dtype, cache=cache)
     train_data.normalize_labels()
     test_data.normalize_labels()
     val_data = BalancedSubset(train_data, args.val_set_part)
 
     # Normalize data
-    max_ = train_data.max if train_data.max > val_data.max else val_data.max
-    min_ = train_data.min if train_data.min < val_data.min else val_data.min
+    statistics = val_data.get_statistics(train_data.get_statistics())
+    statistics.save(os.path.join(args.artifacts_path, args.output_file) +
+                    "_statistics.json")
+    min_, max_ = statistics.min, statistics.max
     train_data.normalize_min_max(min_=min_, max_=max_)
     val_data.normalize_min_max(min_=min_, max_=max_)
     test_data.normalize_min_max(min_=min_, max_=max_)
+    if args.workers > 0:
+        train_data.share_memory()
     custom_data_loader = OrderedDataLoader(train_data, args.batch_size)
     # train_data.convert_to_tensors()
     data_loader = DataLoader(train_data, batch_size=args.batch_size,
-                             shuffle=True, drop_last=True)
+                             shuffle=True, drop_last=True,
+                             num_workers=args.workers,
+                             worker_init_fn=attach_shared_memory)
 
     cuda = True if torch.cuda.is_available() else False
 
@@ -152,7 +175,6 @@ def main(args):
 
     if cuda:
         generator = generator.cuda()
-    train_data.convert_to_numpy()
 
     device = 'gpu' if cuda is True else 'cpu'
     samples_generator = SamplesGenerator(device=device)
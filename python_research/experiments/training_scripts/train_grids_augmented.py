@@ -7,15 +7,16 @@ import os.path
 import argparse
 from keras.models import load_model
 from keras.callbacks import ModelCheckpoint, EarlyStopping, CSVLogger
-from sklearn.metrics import cohen_kappa_score
 
 from python_research.augmentation.offlin_eaugmenter import OfflineAugmenter
 from python_research.augmentation.transformations import *
 from python_research.keras_custom_callbacks import TimeHistory
 from python_research.dataset_structures import BalancedSubset
 from python_research.keras_models import build_1d_model, build_3d_model, build_settings_for_dataset
-from utils import calculate_class_accuracy, load_patches
+from utils import load_patches
+from python_research.metrics import ConfusionMatrix
 from python_research.io import save_to_csv
+from python_research.sample_cache import SampleCache
 
 
 def parse_args():
@@ -60,14 +61,26 @@ def parse_args():
                         help="number of fold from which to start")
     parser.add_argument('--stop', type=int, default=5,
                         help="number of fold to stop on")
+    parser.add_argument('--cache_dir', type=str, default=None,
+                        help="Directory of the cache of prepared samples, "
+                             "samples are not cached if not specified")
+    parser.add_argument('--cache_size', type=float, default=10,
+                        help="Maximal size of the cache in gigabytes")
+    parser.add_argument('--dtype', type=str, default='float32',
+                        help="Data type samples are loaded and normalized "
+                             "in, float64 doubles the memory usage")
     return parser.parse_args()
 
 
 def main(args):
     os.makedirs(os.path.join(args.artifacts_path), exist_ok=True)
     # Init data
+    cache = SampleCache(args.cache_dir, args.cache_size) \
+        if args.cache_dir is not None else None
     train_data, test_data = load_patches(args.patches_dir,
-                                         args.pixel_neighborhood)
+                                         args.pixel_neighborhood,
+                                         dtype=args.dtype,
+                                         cache=cache)
     train_data.normalize_labels()
     test_data.normalize_labels()
     val_data = BalancedSubset(train_data, args.val_set_part)
@@ -81,8 +94,10 @@ def main(args):
     timer = TimeHistory()
 
     # Normalize data
-    max_ = train_data.max if train_data.max > val_data.max else val_data.max
-    min_ = train_data.min if train_data.min < val_data.min else val_data.min
+    statistics = val_data.get_statistics(train_data.get_statistics())
+    statistics.save(os.path.join(args.artifacts_path, args.output_file) +
+                    "_statistics.json")
+    min_, max_ = statistics.min, statistics.max
     train_data.normalize_min_max(min_=min_, max_=max_)
     val_data.normalize_min_max(min_=min_, max_=max_)
     test_data.normalize_min_max(min_=min_, max_=max_)
@@ -132,9 +147,9 @@ def main(args):
     # Calculate accuracy for each class
     predictions = model.predict(x=test_data.get_data())
     predictions = np.argmax(predictions, axis=1)
-    class_accuracy = calculate_class_accuracy(predictions,
-                                              test_data.get_labels(),
-                                              args.classes_count)
+    confusion_matrix = ConfusionMatrix(args.classes_count)
+    confusion_matrix.update(predictions, test_data.get_labels())
+    class_accuracy = confusion_matrix.class_accuracies
     # Collect metrics
     train_score = max(history.history['acc'])
     val_score = max(history.history['val_acc'])
@@ -142,7 +157,7 @@ def main(args):
     time = times[-1]
     avg_epoch_time = np.average(np.array(timer.average))
     epochs = len(history.epoch)
-    kappa = cohen_kappa_score(predictions, test_data.get_labels())
+    kappa = confusion_matrix.kappa
     # Save metrics
     metrics_path = os.path.join(args.artifacts_path, "metrics.csv")
     kappa_path = os.path.join(args.artifacts_path, "kappa.csv")
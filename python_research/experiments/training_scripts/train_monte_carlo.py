@@ -8,7 +8,6 @@ import argparse
 import numpy as np
 from keras.models import load_model
 from keras.callbacks import ModelCheckpoint, EarlyStopping, CSVLogger
-from sklearn.metrics import cohen_kappa_score
 
 from python_research.keras_custom_callbacks import TimeHistory
 from python_research.dataset_structures import BalancedSubset, \
@@ -17,8 +16,9 @@ from python_research.dataset_structures import HyperspectralDataset
 from python_research.keras_models import \
     build_3d_model, build_settings_for_dataset, \
     build_1d_model
-from utils import calculate_class_accuracy
+from python_research.metrics import ConfusionMatrix
 from python_research.io import save_to_csv
+from python_research.sample_cache import SampleCache
 
 
 def parse_args():
@@ -77,14 +77,26 @@ def parse_args():
                              "(only for 1D model)")
     parser.add_argument('--verbose', type=int, default=2,
                         help='Verbosity of training')
+    parser.add_argument('--cache_dir', type=str, default=None,
+                        help="Directory of the cache of prepared samples, "
+                             "samples are not cached if not specified")
+    parser.add_argument('--cache_size', type=float, default=10,
+                        help="Maximal size of the cache in gigabytes")
+    parser.add_argument('--dtype', type=str, default='float32',
+                        help="Data type samples are loaded and normalized "
+                             "in, float64 doubles the memory usage")
     return parser.parse_args()
 
 
 def main(args):
     os.makedirs(os.path.join(args.artifacts_path), exist_ok=True)
     # Init data
+    cache = SampleCache(args.cache_dir, args.cache_size) \
+        if args.cache_dir is not None else None
     test_data = HyperspectralDataset(args.dataset_path, args.gt_path,
-                                     neighborhood_size=args.pixel_neighborhood)
+                                     neighbourhood_size=args.pixel_neighborhood,
+                                     dtype=args.dtype,
+                                     cache=cache)
     test_data.normalize_labels()
     if args.pixel_neighborhood == 1:
         test_data.expand_dims(axis=-1)
@@ -107,8 +119,10 @@ def main(args):
     timer = TimeHistory()
 
     # Normalize data
-    max_ = train_data.max if train_data.max > val_data.max else val_data.max
-    min_ = train_data.min if train_data.min < val_data.min else val_data.min
+    statistics = val_data.get_statistics(train_data.get_statistics())
+    statistics.save(os.path.join(args.artifacts_path, args.output_file) +
+                    "_statistics.json")
+    min_, max_ = statistics.min, statistics.max
     train_data.normalize_min_max(min_=min_, max_=max_)
     val_data.normalize_min_max(min_=min_, max_=max_)
     test_data.normalize_min_max(min_=min_, max_=max_)
@@ -144,9 +158,9 @@ def main(args):
     # Calculate accuracy for each class
     predictions = model.predict(x=test_data.get_data())
     predictions = np.argmax(predictions, axis=1)
-    class_accuracy = calculate_class_accuracy(predictions,
-                                              test_data.get_labels(),
-                                              args.classes_count)
+    confusion_matrix = ConfusionMatrix(args.classes_count)
+    confusion_matrix.update(predictions, test_data.get_labels())
+    class_accuracy = confusion_matrix.class_accuracies
     # Collect metrics
     train_score = max(history.history['acc'])
     val_score = max(history.history['val_acc'])
@@ -154,7 +168,7 @@ def main(args):
     training_time = times[-1]
     avg_epoch_time = np.average(np.array(timer.average))
     epochs = len(history.epoch)
-    kappa = cohen_kappa_score(predictions, test_data.get_labels())
+    kappa = confusion_matrix.kappa
 
     # Save metrics
     metrics_path = os.path.join(args.artifacts_path, "metrics.csv")
@@ -16,6 +16,7 @@ from python_research.io import save_to_csv
 from python_research.augmentation.online_augmenter import OnlineAugmenter
 from python_research.augmentation.transformations import PCATransformation
 from python_research.augmentation.offlin_eaugmenter import OfflineAugmenter
+from python_research.sample_cache import SampleCache
 
 
 
@@ -72,14 +73,26 @@ def parse_args():
                              "(only for 1D model)")
     parser.add_argument('--verbose', type=int, default=2,
                         help='Verbosity of training')
+    parser.add_argument('--cache_dir', type=str, default=None,
+                        help="Directory of the cache of prepared samples, "
+                             "samples are not cached if not specified")
+    parser.add_argument('--cache_size', type=float, default=10,
+                        help="Maximal size of the cache in gigabytes")
+    parser.add_argument('--dtype', type=str, default='float32',
+                        help="Data type samples are loaded and normalized "
+                             "in, float64 doubles the memory usage")
     return parser.parse_args()
 
 
 def main(args):
     os.makedirs(os.path.join(args.artifacts_path), exist_ok=True)
     # Init data
+    cache = SampleCache(args.cache_dir, args.cache_size) \
+        if args.cache_dir is not None else None
     test_data = HyperspectralDataset(args.dataset_path, args.gt_path,
-                                     neighborhood_size=args.pixel_neighborhood)
+                                     neighbourhood_size=args.pixel_neighborhood,
+                                     dtype=args.dtype,
+                                     cache=cache)
     test_data.normalize_labels()
     if args.balanced == 1:
         train_data = BalancedSubset(test_data, args.train_samples)
@@ -100,8 +113,10 @@ def main(args):
     timer = TimeHistory()
 
     # Normalize data
-    max_ = train_data.max if train_data.max > val_data.max else val_data.max
-    min_ = train_data.min if train_data.min < val_data.min else val_data.min
+    statistics = val_data.get_statistics(train_data.get_statistics())
+    statistics.save(os.path.join(args.artifacts_path, args.output_file) +
+                    "_statistics.json")
+    min_, max_ = statistics.min, statistics.max
     train_data.normalize_min_max(min_=min_, max_=max_)
     val_data.normalize_min_max(min_=min_, max_=max_)
     test_data.normalize_min_max(min_=min_, max_=max_)
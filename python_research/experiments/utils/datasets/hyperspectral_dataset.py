@@ -1,5 +1,5 @@
 import torch
-from collections import Iterable
+from collections.abc import Iterable
 from math import ceil
 from copy import copy
 from os import PathLike
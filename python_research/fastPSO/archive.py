@@ -0,0 +1,217 @@
+"""
+Archives of evaluations memoizing objective functions of PSO. Positions are
+discretized to keys by a key function, so that particles landing on the same
+configuration are evaluated only once. File and SQLite archives persist
+scores, so restarted or repeated searches reuse them, and can be shared by
+several optimizers running at once.
+"""
+from typing import Callable, Dict, Hashable, Iterable, Optional, Tuple
+import json
+import os
+import sqlite3
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+import numpy as np
+
+KeyFunction = Callable[[np.ndarray], Hashable]
+
+
+def default_key(position: np.ndarray) -> str:
+    """
+    Key of a position with values rounded to integers
+    :param position: position of a particle
+    :return: comma separated values of the position
+    """
+    return ','.join(str(int(value)) for value in np.round(position))
+
+
+class EvaluationArchive(object):
+    """
+    Archive base class to be overriden. Maps keys of positions to scores
+    """
+
+    def get(self, key: Hashable) -> Optional[float]:
+        """
+        Get the score of a key
+        :param key: key of a position
+        :return: score or None if the key was not evaluated
+        """
+        raise NotImplementedError
+
+    def put(self, key: Hashable, score: float) -> None:
+        """
+        Store the score of a key. Scores already stored are kept
+        :param key: key of a position
+        :param score: score of the position
+        :return: None
+        """
+        raise NotImplementedError
+
+    def put_many(self, scores: Iterable[Tuple[Hashable, float]]) -> None:
+        """
+        Store scores of several keys
+        :param scores: pairs of keys and scores
+        :return: None
+        """
+        for key, score in scores:
+            self.put(key, score)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return self.get(key) is not None
+
+
+class MemoryArchive(EvaluationArchive):
+    """
+    Archive kept in memory for the lifetime of the optimizer
+    """
+
+    def __init__(self):
+        self._scores = {}
+
+    def get(self, key: Hashable) -> Optional[float]:
+        return self._scores.get(key)
+
+    def put(self, key: Hashable, score: float) -> None:
+        self._scores.setdefault(key, float(score))
+
+    def __len__(self):
+        return len(self._scores)
+
+
+class FileArchive(EvaluationArchive):
+    """
+    Archive appended to a file, one JSON record per line. Keys are stored as
+    strings. Records appended by other processes are read before lookups of
+    unknown keys, appends are serialized with a file lock where available.
+    A record cut short by a crash is skipped
+    """
+
+    def __init__(self, path: os.PathLike):
+        """
+        :param path: path to the file, created if it does not exist
+        """
+        self._path = path
+        self._scores = {}
+        self._offset = 0
+        open(path, 'a').close()
+        self._read()
+
+    @staticmethod
+    def _lock(file, exclusive: bool) -> None:
+        if fcntl is not None:
+            fcntl.flock(file.fileno(), fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+
+    def _read(self) -> None:
+        """
+        Read records appended since the last read
+        :return: None
+        """
+        with open(self._path, 'rb') as file:
+            self._lock(file, exclusive=False)
+            file.seek(self._offset)
+            lines = file.read().split(b'\n')
+        # The last element is empty or a record cut short by a crash
+        for line in lines[:-1]:
+            self._offset += len(line) + 1
+            try:
+                record = json.loads(line.decode())
+            except ValueError:
+                continue
+            self._scores.setdefault(record['key'], record['score'])
+
+    def get(self, key: Hashable) -> Optional[float]:
+        key = str(key)
+        if key not in self._scores:
+            self._read()
+        return self._scores.get(key)
+
+    def put(self, key: Hashable, score: float) -> None:
+        self.put_many([(key, score)])
+
+    def put_many(self, scores: Iterable[Tuple[Hashable, float]]) -> None:
+        records = ''.join(json.dumps({'key': str(key), 'score': float(score)}) + '\n'
+                          for key, score in scores).encode()
+        with open(self._path, 'a+b') as file:
+            self._lock(file, exclusive=True)
+            file.seek(0, os.SEEK_END)
+            if file.tell() > 0:
+                file.seek(-1, os.SEEK_END)
+                if file.read(1) != b'\n':
+                    # Terminate a record cut short by a crash
+                    records = b'\n' + records
+            file.write(records)
+        self._read()
+
+    def __len__(self):
+        self._read()
+        return len(self._scores)
+
+
+class SqliteArchive(EvaluationArchive):
+    """
+    Archive stored in an SQLite database. Keys are stored as strings, the
+    first score stored for a key is kept when several processes evaluate it
+    at once. SQLite stores NaN as NULL, so NULL scores are read back as NaN
+    """
+
+    def __init__(self, path: os.PathLike, timeout: float = 60.):
+        """
+        :param path: path to the database, created if it does not exist
+        :param timeout: time in seconds to wait for other processes writing
+                        to the database
+        """
+        self._path = path
+        self._timeout = timeout
+        self._connection = None
+        with self._connect() as connection:
+            connection.execute('CREATE TABLE IF NOT EXISTS evaluations '
+                               '(key TEXT PRIMARY KEY, score REAL)')
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._connection is None:
+            self._connection = sqlite3.connect(self._path, timeout=self._timeout)
+            self._connection.execute('PRAGMA journal_mode=WAL')
+        return self._connection
+
+    def get(self, key: Hashable) -> Optional[float]:
+        row = self._connect().execute('SELECT score FROM evaluations WHERE key = ?',
+                                      (str(key), )).fetchone()
+        if row is None:
+            return None
+        return float('nan') if row[0] is None else row[0]
+
+    def put(self, key: Hashable, score: float) -> None:
+        self.put_many([(key, score)])
+
+    def put_many(self, scores: Iterable[Tuple[Hashable, float]]) -> None:
+        with self._connect() as connection:
+            connection.executemany('INSERT OR IGNORE INTO evaluations VALUES (?, ?)',
+                                   [(str(key), float(score)) for key, score in scores])
+
+    def __len__(self):
+        return self._connect().execute('SELECT COUNT(*) FROM evaluations').fetchone()[0]
+
+    def __getstate__(self) -> Dict:
+        # Connections cannot be pickled, each process opens its own
+        state = self.__dict__.copy()
+        state['_connection'] = None
+        return state
+
+
+def open_archive(path: os.PathLike = None) -> EvaluationArchive:
+    """
+    Open the archive stored at a path
+    :param path: path to an SQLite database with .db, .sqlite or .sqlite3
+                 extension or to a file of JSON records otherwise. If None,
+                 the archive is kept in memory
+    :return: archive
+    """
+    if path is None:
+        return MemoryArchive()
+    if os.path.splitext(str(path))[1] in ('.db', '.sqlite', '.sqlite3'):
+        return SqliteArchive(path)
+    return FileArchive(path)
@@ -3,15 +3,19 @@ Fast parallel PSO module
 By Pablo Ribalta
 https://github.com/pribalta/fastPSO
 """
-from typing import List, Tuple
-from multiprocessing import Pool
+from typing import Tuple
+from multiprocessing.pool import Pool
+import multiprocessing
 import logging
 import datetime
 import os
+import sys
 import pickle
 
 import numpy as np
 
+from python_research.fastPSO.archive import EvaluationArchive, KeyFunction, default_key
+
 
 class Logger(object):
     def __init__(self, verbose=True):
@@ -65,19 +69,48 @@ class Logger(object):
 
 class ObjectiveFunctionBase(object):
     """
-    Objective function base class to be overriden
+    Objective function base class to be overriden. Objective functions are
+    given the position of a particle and may be evaluated in worker
+    processes, so they have to be picklable
     """
 
-    def __call__(self, *args, **kwargs) -> float:
+    def __call__(self, position: np.ndarray) -> float:
         """
         Function to be evaluated
-        :param args:
-        :param kwargs:
-        :return:
+        :param position: position of a particle
+        :return: score of the position, higher is better
         """
         raise NotImplementedError
 
 
+def _limit_threads(threads: int) -> None:
+    """
+    Limit the number of threads numerical libraries use in a worker process,
+    so that concurrent evaluations do not oversubscribe the cores
+    :param threads: number of threads per worker
+    :return: None
+    """
+    for variable in ('OMP_NUM_THREADS', 'MKL_NUM_THREADS', 'OPENBLAS_NUM_THREADS'):
+        os.environ[variable] = str(threads)
+    if 'torch' in sys.modules:
+        sys.modules['torch'].set_num_threads(threads)
+
+
+def create_pool(workers: int, threads_per_worker: int = None) -> Pool:
+    """
+    Create a pool of worker processes evaluating particles. Workers are
+    spawned rather than forked, so that objectives using CUDA work in them
+    :param workers: number of worker processes
+    :param threads_per_worker: number of threads each worker computes with,
+                               by default the cores are split between workers
+    :return: pool of workers
+    """
+    if threads_per_worker is None:
+        threads_per_worker = max(os.cpu_count() // workers, 1)
+    return multiprocessing.get_context('spawn').Pool(
+        workers, initializer=_limit_threads, initargs=(threads_per_worker, ))
+
+
 class Bounds(object):
     """
     Encapsulation of PSO bounds. Ensures creation and validation
@@ -198,175 +231,12 @@ class PsoParameters(object):
         return self._phig
 
 
-class Particle(object):
-    """
-    A particle is the key entity in the PSO algorithm
-    """
-
-    def __init__(
-        self,
-        bounds: Bounds,
-        parameters: PsoParameters,
-        logger: Logger = Logger(verbose=False)
-    ):
-        """
-        Create a particle
-        :param bounds: boundaries for particle position
-        :param parameters: parameters for particle updates
-        """
-        self._logger = logger
-
-        self._bounds = bounds
-        self._parameters = parameters
-
-        self._position = [self._calculate_initial_position()]
-        self._velocity = [self._calculate_initial_velocity()]
-        self._score = []
-
-        self._logger.log("Created particle:\n\tPosition: {}\n\tVelocity: {}".format(
-            self.position(),
-            self.velocity()
-        ))
-
-    def position(self) -> np.ndarray:
-        """
-        Get current position
-        :return: np.ndarray
-        """
-        return self._position[-1]
-
-    def velocity(self) -> np.ndarray:
-        """
-        Get current velocity
-        :return: np.ndarray
-        """
-        return self._velocity[-1]
-
-    def best_position(self) -> np.ndarray:
-        """
-        Get the best position in the history of a particle
-        :return: np.ndarray
-        """
-        if len(self._position) != len(self._score):
-            self._logger.log("Amount of positions should be the same as amount of scores."
-                             "Received {} and {}".format(len(self._position), len(self._score)),
-                             error=True)
-
-        return self._position[np.argsort(self._score)[-1]]
-
-    def best_score(self) -> float:
-        """
-        Get best score in the lifetime of a particle
-        :return: float
-        """
-        if not self._score:
-            self._logger.log("Cannot update velocity while scores are empty. Evaluate first.",
-                             error=True)
-
-        return self._score[np.argsort(self._score)[-1]]
-
-    def update(self, swarm_best: np.ndarray) -> None:
-        """
-        Update the velocity and position of a particle
-        :param swarm_best:
-        :return: None
-        """
-        if not self._score:
-            self._logger.log("Cannot update while scores are empty. Evaluate first.",
-                             error=True)
-
-        # pylint: disable = invalid-name
-        rp, rg = self._initialize_random_coefficients
-
-        self._velocity.append(self._parameters.omega() * self.velocity()
-                              + self._parameters.phip() * rp * (self.best_position()
-                                                                - self.position())
-                              + self._parameters.phig() * rg * (swarm_best
-                                                                - self.position()))
-        self._position.append(self._calculate_position())
-
-        self._logger.log("Updated particle:\n\tPosition: {}\n\tVelocity: {}".format(
-            self.position(),
-            self.velocity()
-        ))
-
-    def update_score(self, score: float) -> None:
-        """
-        Update a particle's score
-        :param score: score obtained by a particle
-        :return: None
-        """
-        self._score.append(score)
-        self._logger.log("Updated particle:\n\tScore: {}".format(score))
-
-    def _calculate_initial_position(self) -> np.ndarray:
-        """
-        Initialize particle's position
-        :return: np.ndarray
-        """
-        return np.array([np.random.uniform(low, high)
-                         for low, high in zip(self._bounds.lower(),
-                                              self._bounds.upper())]) \
-            .astype(self._bounds.lower().dtype)
-
-    def _calculate_initial_velocity(self) -> np.ndarray:
-        """
-        Initialize a particle's velocity
-        :return: np.ndarray
-        """
-        return np.array([np.random.uniform(-(high - low), high - low)
-                         for low, high in zip(self._bounds.lower(),
-                                              self._bounds.upper())]) \
-            .astype(self._bounds.lower().dtype)
-
-    @property
-    def _initialize_random_coefficients(self) -> Tuple[float, float]:
-        """
-        Initialize the random coefficients for the velocity update
-        :return: Tuple
-        """
-        return np.random.uniform(0, 1), np.random.uniform(0, 1)
-
-    def _calculate_position(self) -> np.ndarray:
-        """
-        Calculate a particle's position
-        :return: New particle's position
-        """
-        new_position = self._position[-1] + self._velocity[-1]
-
-        for i in range(new_position.size):
-            if self._bounds.lower()[i] > new_position[i]:
-                new_position[i] = self._bounds.lower()[i]
-            elif self._bounds.upper()[i] < new_position[i]:
-                new_position[i] = self._bounds.upper()[i]
-
-        return new_position
-
-    def last_movement(self) -> float:
-        """
-        Calculate last movement
-        :return: float
-        """
-        return np.linalg.norm(self._position[-2] - self._position[-1])
-
-    def last_improvement(self) -> float:
-        """
-        Calculate last improvement
-        :return: float
-        """
-        if not self._score:
-            self._logger.log("Cannot calculate improvement while scores are empty. Evaluate first.",
-                             error=True)
-
-        if len(self._score) == 1:
-            return float("inf")
-
-        return self._score[-1] - self._score[-2]
-
-
 class Swarm(object):
     """
-    Encapsulate and efficiently manage a set of particles
+    Encapsulate and efficiently manage a set of particles. Positions and
+    velocities of all particles are kept in (particles, dimensions) matrices
+    and updated at once, personal and global best positions are updated
+    incrementally after each evaluation
     """
 
     def __init__(
@@ -377,7 +247,12 @@ class Swarm(object):
         minimum_step: float,
         minimum_improvement: float,
         objective_function: ObjectiveFunctionBase,
-        logger: Logger = Logger(verbose=False)
+        logger: Logger = Logger(verbose=False),
+        executor=None,
+        vectorized: bool = False,
+        history_size: int = 0,
+        archive: EvaluationArchive = None,
+        key: KeyFunction = default_key
     ):
         """
         Constructs a swarm
@@ -385,18 +260,54 @@ class Swarm(object):
         :param bounds: Bounds for the parameter space
         :param minimum_step: constraint for particle movement
         :param minimum_improvement: constraint for particle improvement
+        :param executor: object evaluating particles with its map method,
+                         which has to return results in order of positions,
+                         e.g. a multiprocessing pool. If None, particles
+                         are evaluated one after another
+        :param vectorized: whether the objective function scores all
+                           positions at once, given as a (particles,
+                           dimensions) matrix
+        :param history_size: number of recent iterations whose positions
+                             and scores are kept, no history is kept if zero
+        :param archive: archive of scores, positions found in it are not
+                        evaluated again and scores of new ones are stored
+        :param key: function discretizing a position to its key in
+                    the archive
         """
         self._logger = logger
         self._objective_function = objective_function
+        self._executor = executor
+        self._vectorized = vectorized
+        self._archive = archive
+        self._key = key
 
         if swarm_size <= 0:
             self._logger.log("Swarm size must be greater than zero",
                              error=True)
 
-        self._particles = [Particle(bounds, parameters, logger) for _ in range(swarm_size)]
-        for particle in self._particles:
-            score = self._objective_function(particle)
-            particle.update_score(score)
+        self._bounds = bounds
+        self._parameters = parameters
+        lower, upper = bounds.lower(), bounds.upper()
+        shape = (swarm_size, lower.size)
+        # Positions and velocities are drawn in the type of the bounds, then
+        # updated as floats
+        self._positions = np.random.uniform(lower, upper, shape) \
+            .astype(lower.dtype).astype(np.float64)
+        self._velocities = np.random.uniform(-(upper - lower), upper - lower, shape) \
+            .astype(lower.dtype).astype(np.float64)
+        self._previous_positions = self._positions.copy()
+        self._scores = np.full(swarm_size, -np.inf)
+        self._previous_scores = np.full(swarm_size, np.nan)
+        self._best_positions = self._positions.copy()
+        self._best_scores = np.full(swarm_size, -np.inf)
+        self._best_particle = 0
+
+        self._history_size = history_size
+        self._history_positions = np.empty((history_size, ) + shape)
+        self._history_scores = np.empty((history_size, swarm_size))
+        self._iterations = 0
+
+        self._evaluate()
 
         self._minimum_step = minimum_step
         self._minimum_improvement = minimum_improvement
@@ -410,69 +321,142 @@ class Swarm(object):
         )
 
     def __iter__(self):
-        return self._particles.__iter__()
+        """
+        Iterate over current positions of particles
+        """
+        return iter(self._positions)
 
     def __len__(self):
-        return len(self._particles)
+        return len(self._positions)
+
+    def _evaluate(self) -> None:
+        """
+        Evaluate current positions of particles, concurrently if the swarm
+        has an executor, and update personal and global bests
+        :return: None
+        """
+        self._previous_scores = self._scores
+        if self._archive is None:
+            self._scores = self._score(self._positions)
+        else:
+            self._scores = self._score_archived()
+
+        improved = self._scores > self._best_scores
+        self._best_scores[improved] = self._scores[improved]
+        self._best_positions[improved] = self._positions[improved]
+        self._best_particle = int(np.argmax(self._best_scores))
+
+        if self._history_size:
+            index = self._iterations % self._history_size
+            self._history_positions[index] = self._positions
+            self._history_scores[index] = self._scores
+        self._iterations += 1
+
+        self._logger.log("Evaluated swarm:\n\tBest score: {}\n\tBest position: {}".format(
+            self.best_score(),
+            self.best_position()
+        ))
+
+    def _score(self, positions: np.ndarray) -> np.ndarray:
+        """
+        Call the objective function on positions
+        :param positions: matrix of positions
+        :return: scores of the positions
+        """
+        if self._vectorized:
+            scores = self._objective_function(positions)
+        else:
+            positions = [position.copy() for position in positions]
+            if self._executor is None:
+                scores = map(self._objective_function, positions)
+            else:
+                scores = self._executor.map(self._objective_function, positions)
+            scores = list(scores)
+        return np.asarray(scores, dtype=np.float64)
+
+    def _score_archived(self) -> np.ndarray:
+        """
+        Score current positions with the archive. Positions sharing a key
+        which is not in the archive are evaluated once
+        :return: scores of the positions
+        """
+        scores = np.empty(len(self))
+        missing = {}
+        for particle, position in enumerate(self._positions):
+            key = self._key(position)
+            score = self._archive.get(key)
+            if score is None:
+                missing.setdefault(key, []).append(particle)
+            else:
+                scores[particle] = score
+        if missing:
+            firsts = [particles[0] for particles in missing.values()]
+            new_scores = self._score(self._positions[firsts])
+            self._archive.put_many(zip(missing, new_scores))
+            for particles, score in zip(missing.values(), new_scores):
+                scores[particles] = score
+        self._logger.log("Evaluated {} of {} positions not found in the archive".format(
+            len(missing),
+            len(self)
+        ))
+        return scores
 
     def still_improving(self) -> bool:
         """
         Determie if the swarm is still improving given the minimum improvement constraint
         :return: bool
         """
-        improvement_deltas = [particle.last_improvement()
-                              for particle in self._particles]
-
-        for delta in improvement_deltas:
-            if delta > self._minimum_improvement:
-                return True
-
-        return False
+        if self._iterations < 2:
+            return True
+        return bool(np.any(self._scores - self._previous_scores > self._minimum_improvement))
 
     def still_moving(self) -> bool:
         """
         Determie if the swarm is still moving given the minimum step constraint
         :return: bool
         """
-        movement_deltas = [particle.last_movement()
-                           for particle in self._particles]
-
-        for delta in movement_deltas:
-            if delta > self._minimum_step:
-                return True
-
-        return False
+        movement = np.linalg.norm(self._positions - self._previous_positions, axis=1)
+        return bool(np.any(movement > self._minimum_step))
 
     def update(self) -> None:
         """
         Update the velocity, position and score of all particles in the swarm
         :return: None
         """
-        swarm_best_position = self.best_position()
+        # pylint: disable = invalid-name
+        rp, rg = np.random.uniform(0, 1, (2, len(self), 1))
 
-        for particle in self._particles:
-            particle.update(swarm_best_position)
-            score = self._objective_function(particle)
-            particle.update_score(score)
+        self._velocities = self._parameters.omega() * self._velocities \
+            + self._parameters.phip() * rp * (self._best_positions - self._positions) \
+            + self._parameters.phig() * rg * (self.best_position() - self._positions)
+        self._previous_positions = self._positions
+        self._positions = np.clip(self._positions + self._velocities,
+                                  self._bounds.lower(), self._bounds.upper())
+        self._evaluate()
 
     def best_position(self) -> np.ndarray:
         """
         Return the best position in the swarm
         :return: np.ndarray
         """
-        best_positions = [particle.best_position() for particle in self._particles]
-        best_scores = [particle.best_score() for particle in self._particles]
-
-        return best_positions[np.argsort(best_scores)[-1]]
+        return self._best_positions[self._best_particle].copy()
 
     def best_score(self) -> float:
         """
         Return the best score in the swarm
         :return: float
         """
-        best_scores = [particle.best_score() for particle in self._particles]
+        return float(self._best_scores[self._best_particle])
 
-        return best_scores[np.argsort(best_scores)[-1]]
+    def history(self) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Return positions and scores of particles in recent iterations
+        :return: (tuple) positions of shape (iterations, particles, dimensions)
+                 and scores of shape (iterations, particles), oldest first
+        """
+        count = min(self._iterations, self._history_size)
+        order = np.arange(self._iterations - count, self._iterations) % max(self._history_size, 1)
+        return self._history_positions[order], self._history_scores[order]
 
 
 class Pso(object):
@@ -493,7 +477,13 @@ class Pso(object):
         minimum_step: float = 10e-8,
         minimum_improvement: float = 10e-8,
         threads: int = 1,
-        verbose: bool = False
+        verbose: bool = False,
+        executor=None,
+        threads_per_worker: int = None,
+        vectorized: bool = False,
+        history_size: int = 0,
+        archive: EvaluationArchive = None,
+        key: KeyFunction = default_key
     ):
         """
         Constructor of a Particle Swarm Optimizer
@@ -507,10 +497,33 @@ class Pso(object):
         :param maximum_iterations: maximum number of iterations for optimization
         :param minimum_step: minimum particle distance
         :param minimum_improvement: minimum allowed improvement
-        :param threads: number of execution threads
+        :param threads: number of worker processes evaluating particles
+                        concurrently, if greater than one and no executor
+                        is given
         :param verbose: enable to receive information about the progress
+        :param executor: object evaluating particles with its map method,
+                         which has to return results in order of positions,
+                         e.g. a multiprocessing pool or a
+                         concurrent.futures executor
+        :param threads_per_worker: number of threads each worker process
+                                   computes with, by default the cores are
+                                   split between workers
+        :param vectorized: whether the objective function scores all
+                           positions at once, given as a (particles,
+                           dimensions) matrix
+        :param history_size: number of recent iterations whose positions
+                             and scores are kept by the swarm
+        :param archive: archive of scores, e.g. persisted by a FileArchive
+                        or an SqliteArchive, so that positions evaluated
+                        before, also by other optimizers sharing it, are not
+                        evaluated again
+        :param key: function discretizing a position to its key in
+                    the archive, by default values are rounded to integers
         """
         self._logger = Logger(verbose)
+        self._pool = None
+        if executor is None and threads > 1:
+            executor = self._pool = create_pool(threads, threads_per_worker)
 
         if maximum_iterations <= 0:
             self._logger.log("Maximum number of iterations must be greater than zero", error=True)
@@ -524,7 +537,12 @@ class Pso(object):
             minimum_step,
             minimum_improvement,
             objective_function,
-            self._logger
+            self._logger,
+            executor,
+            vectorized,
+            history_size,
+            archive,
+            key
         )
 
     def run(self) -> Tuple[np.ndarray, float]:
@@ -532,10 +550,30 @@ class Pso(object):
         Run particle swarm optimization
         :return: (tuple) best position, best score
         """
-        for _ in range(self._maximum_iterations):
-            self._swarm.update()
+        try:
+            for _ in range(self._maximum_iterations):
+                self._swarm.update()
 
-            if not self._swarm.still_improving() or not self._swarm.still_moving():
-                break
+                if not self._swarm.still_improving() or not self._swarm.still_moving():
+                    break
+        finally:
+            self.close()
 
         return self._swarm.best_position(), self._swarm.best_score()
+
+    def history(self) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Return positions and scores of particles in recent iterations
+        :return: (tuple) positions and scores, oldest first
+        """
+        return self._swarm.history()
+
+    def close(self) -> None:
+        """
+        Terminate worker processes created by the optimizer
+        :return: None
+        """
+        if self._pool is not None:
+            self._pool.close()
+            self._pool.join()
+            self._pool = None
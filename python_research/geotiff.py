@@ -0,0 +1,137 @@
+"""
+Tiled, compressed GeoTIFF files written block by block, so that rasters
+larger than the memory can be saved, e.g. classification maps of whole
+scenes.
+"""
+import os
+from typing import Iterable, Tuple
+
+import numpy as np
+
+try:
+    from osgeo import gdal
+except ImportError:
+    try:
+        import gdal
+    except ImportError:
+        gdal = None
+
+
+def _get_data_type(dtype: np.dtype) -> Tuple[int, list]:
+    """
+    :param dtype: Data type of the raster
+    :return: GDAL data type and creation options the raster is stored with,
+             float16 is stored in float32 bands with 16 bits per value
+    """
+    dtype = np.dtype(dtype)
+    if dtype == np.float16:
+        return gdal.GDT_Float32, ['NBITS=16']
+    types = {np.dtype(np.uint8): gdal.GDT_Byte,
+             np.dtype(np.uint16): gdal.GDT_UInt16,
+             np.dtype(np.int16): gdal.GDT_Int16,
+             np.dtype(np.uint32): gdal.GDT_UInt32,
+             np.dtype(np.int32): gdal.GDT_Int32,
+             np.dtype(np.float32): gdal.GDT_Float32,
+             np.dtype(np.float64): gdal.GDT_Float64}
+    if dtype not in types:
+        raise ValueError("Data type {} cannot be written to GeoTIFF"
+                         .format(dtype))
+    return types[dtype], []
+
+
+def encode_probabilities(probabilities: np.ndarray,
+                         dtype: np.dtype) -> np.ndarray:
+    """
+    Convert class probabilities to the data type they are stored as
+    :param probabilities: Probabilities in [0, 1]
+    :param dtype: uint8, probabilities are then scaled to [0, 255], or
+                  a floating point type
+    :return: Converted probabilities
+    """
+    if np.dtype(dtype) == np.uint8:
+        return np.round(probabilities * 255).astype(np.uint8)
+    # float16 is rounded by GDAL when writing float32 bands with 16 bits
+    return probabilities.astype(np.float32)
+
+
+class GeoTiffWriter:
+    """
+    Raster written to a tiled, compressed GeoTIFF file region by region.
+    Only blocks being filled are kept in memory, overviews are built from
+    the file when it is closed.
+    """
+    def __init__(self, path: os.PathLike, height: int, width: int,
+                 bands: int=1, dtype: np.dtype=np.uint8,
+                 block_size: int=256, compression: str='DEFLATE',
+                 overviews: Iterable[int]=(2, 4, 8, 16),
+                 resampling: str='NEAREST', projection: str=None,
+                 geo_transform: Tuple[float, ...]=None):
+        """
+        :param path: Path to the file
+        :param height: Height of the raster
+        :param width: Width of the raster
+        :param bands: Number of bands
+        :param dtype: Data type of the raster, float16 is supported as well
+        :param block_size: Height and width of blocks of the file, has to be
+                           a multiple of 16, writing regions aligned with
+                           blocks is the fastest
+        :param compression: Compression method, e.g. DEFLATE, LZW or ZSTD
+        :param overviews: Downsampling factors of overviews, empty if no
+                          overviews should be built
+        :param resampling: Resampling method of overviews, e.g. NEAREST or
+                           MODE for labels and AVERAGE for probabilities
+        :param projection: Projection of the raster in WKT format
+        :param geo_transform: Affine transformation from pixel to
+                              georeferenced coordinates
+        """
+        if gdal is None:
+            raise ImportError("Writing GeoTIFF files requires gdal")
+        data_type, options = _get_data_type(dtype)
+        options += ['TILED=YES', 'BLOCKXSIZE={}'.format(block_size),
+                    'BLOCKYSIZE={}'.format(block_size),
+                    'COMPRESS={}'.format(compression),
+                    'INTERLEAVE=BAND', 'BIGTIFF=IF_SAFER']
+        self.dataset = gdal.GetDriverByName('GTiff').Create(
+            path, width, height, bands, data_type, options=options)
+        if self.dataset is None:
+            raise IOError("Could not create {}".format(path))
+        if projection is not None:
+            self.dataset.SetProjection(projection)
+        if geo_transform is not None:
+            self.dataset.SetGeoTransform(geo_transform)
+        self.dtype = np.float32 if np.dtype(dtype) == np.float16 else dtype
+        self.overviews = list(overviews)
+        self.resampling = resampling
+
+    def write(self, rows: slice, columns: slice, data: np.ndarray):
+        """
+        Write a region of the raster
+        :param rows: Rows of the region
+        :param columns: Columns of the region
+        :param data: Data of shape (height, width) or (height, width, bands)
+        :return: None
+        """
+        data = np.asarray(data).astype(self.dtype, copy=False)
+        if data.ndim == 2:
+            data = data[..., np.newaxis]
+        for band in range(data.shape[-1]):
+            self.dataset.GetRasterBand(band + 1).WriteArray(
+                data[..., band], columns.start, rows.start)
+
+    def close(self):
+        """
+        Flush written data, build overviews and close the file
+        :return: None
+        """
+        if self.dataset is None:
+            return
+        self.dataset.FlushCache()
+        if self.overviews:
+            self.dataset.BuildOverviews(self.resampling, self.overviews)
+        self.dataset = None
+
+    def __enter__(self) -> 'GeoTiffWriter':
+        return self
+
+    def __exit__(self, *args):
+        self.close()
@@ -0,0 +1,354 @@
+"""
+Local inference server. A model is loaded once and served over HTTP on
+localhost, concurrent requests are coalesced into batches by
+a DynamicBatcher. Samples and class probabilities are sent as .npy
+payloads:
+
+    POST /predict  body: samples in .npy format,
+                   response: class probabilities in .npy format
+    GET /metrics   response: JSON with queue depth, batch and latency
+                   statistics
+"""
+import json
+import time
+import argparse
+import http.client
+from io import BytesIO
+from collections import deque
+from queue import Queue, Empty
+from threading import Thread, Event, Lock
+from socketserver import ThreadingMixIn
+from http.server import HTTPServer, BaseHTTPRequestHandler
+from typing import Callable
+
+import numpy as np
+
+from python_research.dataset_structures import normalize_inplace
+from python_research.inference_tuning import InferenceConfig, \
+    get_torch_loader, limit_threads, load_config
+from python_research.running_statistics import RunningStatistics
+
+
+class InferenceRequest:
+    """
+    Samples submitted for prediction, completed by the batcher
+    """
+    def __init__(self, samples: np.ndarray):
+        self.samples = samples
+        self.probabilities = None
+        self.error = None
+        self.submitted = time.time()
+        self.done = Event()
+
+
+class DynamicBatcher:
+    """
+    Coalesces concurrently submitted requests into batches. A batch is
+    predicted once it holds max_batch_size samples, or max_delay seconds
+    after its first request arrived, whichever comes first.
+    """
+    def __init__(self, predict: Callable[[np.ndarray], np.ndarray],
+                 max_batch_size: int=1024, max_delay: float=0.005,
+                 history_size: int=1000):
+        """
+        :param predict: Function returning class probabilities of a batch
+        :param max_batch_size: Maximal number of samples in a batch, larger
+                               requests are predicted on their own
+        :param max_delay: Maximal time in seconds a request waits for other
+                          requests to join its batch
+        :param history_size: Number of recent requests and batches latency
+                             and batch size statistics are computed over
+        """
+        self.predict = predict
+        self.max_batch_size = max_batch_size
+        self.max_delay = max_delay
+        self.queue = Queue()
+        self.latencies = deque(maxlen=history_size)
+        self.batch_sizes = deque(maxlen=history_size)
+        self.requests_count = 0
+        self.samples_count = 0
+        self.lock = Lock()
+        self.stop_event = Event()
+        self.thread = None
+
+    def start(self) -> 'DynamicBatcher':
+        self.stop_event.clear()
+        self.thread = Thread(target=self._run, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+    def submit(self, samples: np.ndarray,
+               timeout: float=None) -> np.ndarray:
+        """
+        Predict class probabilities of samples, waiting until the batch they
+        are a part of is predicted
+        :param samples: Samples of shape (samples, ...)
+        :param timeout: Maximal time in seconds to wait for the result
+        :return: Class probabilities of shape (samples, classes)
+        """
+        request = InferenceRequest(samples)
+        self.queue.put(request)
+        if not request.done.wait(timeout):
+            raise TimeoutError("Request was not served in {}s"
+                               .format(timeout))
+        if request.error is not None:
+            raise request.error
+        return request.probabilities
+
+    def _next_request(self, timeout: float):
+        try:
+            return self.queue.get(timeout=timeout)
+        except Empty:
+            return None
+
+    def _run(self):
+        pending = None
+        while not self.stop_event.is_set():
+            request = pending or self._next_request(0.1)
+            pending = None
+            if request is None:
+                continue
+            batch, size = [request], len(request.samples)
+            deadline = time.time() + self.max_delay
+            while size < self.max_batch_size:
+                request = self._next_request(max(deadline - time.time(), 0))
+                if request is None:
+                    break
+                if size + len(request.samples) > self.max_batch_size:
+                    pending = request
+                    break
+                batch.append(request)
+                size += len(request.samples)
+            self._process(batch)
+
+    def _process(self, batch):
+        """
+        Predict a batch of requests and complete them. If the batch fails,
+        e.g. because of a request with samples of a wrong shape, its requests
+        are retried one by one, so that only the faulty ones fail.
+        :param batch: List of requests
+        :return: None
+        """
+        try:
+            probabilities = self.predict(np.concatenate(
+                [request.samples for request in batch]))
+            splits = np.cumsum([len(request.samples)
+                                for request in batch])[:-1]
+            for request, result in zip(batch, np.split(probabilities,
+                                                       splits)):
+                request.probabilities = result
+        except Exception as error:
+            if len(batch) > 1:
+                for request in batch:
+                    self._process([request])
+                return
+            batch[0].error = error
+        finished = time.time()
+        with self.lock:
+            self.batch_sizes.append(sum(len(request.samples)
+                                        for request in batch))
+            for request in batch:
+                self.latencies.append(finished - request.submitted)
+                self.requests_count += 1
+                self.samples_count += len(request.samples)
+        for request in batch:
+            request.done.set()
+
+    def get_metrics(self) -> dict:
+        """
+        :return: Number of requests waiting in the queue, numbers of served
+                 requests and samples, mean size of recent batches and
+                 latency percentiles of recent requests in milliseconds
+        """
+        with self.lock:
+            latencies = np.array(self.latencies) * 1000
+            batch_sizes = np.array(self.batch_sizes)
+            metrics = {'queue_depth': self.queue.qsize(),
+                       'requests': self.requests_count,
+                       'samples': self.samples_count}
+        if len(batch_sizes) > 0:
+            metrics['mean_batch_size'] = float(np.mean(batch_sizes))
+        if len(latencies) > 0:
+            metrics['latency_mean_ms'] = float(np.mean(latencies))
+            for percentile in [50, 95, 99]:
+                metrics['latency_p{}_ms'.format(percentile)] = \
+                    float(np.percentile(latencies, percentile))
+        return metrics
+
+
+class InferenceRequestHandler(BaseHTTPRequestHandler):
+    def _respond(self, code: int, body: bytes, content_type: str):
+        self.send_response(code)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        if self.path != '/predict':
+            self._respond(404, b'Not found', 'text/plain')
+            return
+        length = int(self.headers['Content-Length'])
+        try:
+            samples = np.load(BytesIO(self.rfile.read(length)))
+            probabilities = self.server.batcher.submit(samples)
+        except Exception as error:
+            self._respond(500, str(error).encode(), 'text/plain')
+            return
+        buffer = BytesIO()
+        np.save(buffer, np.asarray(probabilities, dtype=np.float32))
+        self._respond(200, buffer.getvalue(), 'application/octet-stream')
+
+    def do_GET(self):
+        if self.path != '/metrics':
+            self._respond(404, b'Not found', 'text/plain')
+            return
+        self._respond(200, json.dumps(self.server.batcher.get_metrics())
+                      .encode(), 'application/json')
+
+    def log_message(self, format, *args):
+        pass
+
+
+class InferenceServer(ThreadingMixIn, HTTPServer):
+    """
+    HTTP server handling each connection in a separate thread, so that
+    concurrent requests reach the batcher together
+    """
+    daemon_threads = True
+
+    def __init__(self, batcher: DynamicBatcher, host: str='127.0.0.1',
+                 port: int=8765):
+        """
+        :param batcher: Started batcher predicting the requests
+        :param host: Address to listen on
+        :param port: Port to listen on, if 0, a free port is chosen
+        """
+        HTTPServer.__init__(self, (host, port), InferenceRequestHandler)
+        self.batcher = batcher
+
+
+def predict_remote(samples: np.ndarray, host: str='127.0.0.1',
+                   port: int=8765, timeout: float=None) -> np.ndarray:
+    """
+    Predict class probabilities of samples with a running inference server
+    :param samples: Samples of shape (samples, ...)
+    :param host: Address of the server
+    :param port: Port of the server
+    :param timeout: Timeout of the connection in seconds
+    :return: Class probabilities of shape (samples, classes)
+    """
+    buffer = BytesIO()
+    np.save(buffer, samples)
+    connection = http.client.HTTPConnection(host, port, timeout=timeout)
+    try:
+        connection.request('POST', '/predict', body=buffer.getvalue(),
+                           headers={'Content-Type':
+                                    'application/octet-stream'})
+        response = connection.getresponse()
+        body = response.read()
+    finally:
+        connection.close()
+    if response.status != 200:
+        raise RuntimeError("Inference server responded with {}: {}"
+                           .format(response.status, body.decode()))
+    return np.load(BytesIO(body))
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Serve a trained keras "
+                                                 "or torch model over HTTP "
+                                                 "on localhost")
+    parser.add_argument('--model_path', type=str, required=True,
+                        help="Path to a keras model in .h5 format or to "
+                             "a torch model saved with torch.save")
+    parser.add_argument('--statistics_path', type=str, default=None,
+                        help="Path to statistics of the training data "
+                             "saved by the training script, samples are "
+                             "not normalized if not specified")
+    parser.add_argument('--host', type=str, default='127.0.0.1',
+                        help="Address to listen on")
+    parser.add_argument('--port', type=int, default=8765,
+                        help="Port to listen on")
+    parser.add_argument('--max_batch_size', type=int, default=None,
+                        help="Maximal number of samples predicted at once, "
+                             "by default the batch size tuned for the "
+                             "model with inference_tuning or 1024")
+    parser.add_argument('--max_delay', type=float, default=5,
+                        help="Maximal time in milliseconds a request waits "
+                             "for other requests to join its batch")
+    return parser.parse_args()
+
+
+def load_predictor(model_path: str, max_batch_size: int,
+                   config: InferenceConfig=None) \
+        -> Callable[[np.ndarray], np.ndarray]:
+    """
+    Load a model to serve, chosen by the type of its file
+    :param model_path: Path to a keras model in .h5 format or to a torch
+                       model with a predict method saved with torch.save,
+                       e.g. Bass or ConvNet3D
+    :param max_batch_size: Maximal number of samples predicted at once
+    :param config: Configuration tuned for the model, its numbers of
+                   threads are used and samples of torch models are cast
+                   to its data type
+    :return: Function returning class probabilities of samples
+    """
+    if model_path.endswith('.h5'):
+        from keras.models import load_model
+        from python_research.scene_inference import get_keras_predictor
+        if config is not None:
+            limit_threads(config.intra_op_threads, config.inter_op_threads)
+        return get_keras_predictor(load_model(model_path), max_batch_size)
+    import torch
+    dtype = config.dtype if config is not None else 'float32'
+    torch_predict = get_torch_loader(model_path, [dtype])(
+        config.intra_op_threads if config is not None
+        else torch.get_num_threads(),
+        config.inter_op_threads if config is not None
+        else torch.get_num_interop_threads())
+
+    def predict(samples: np.ndarray) -> np.ndarray:
+        return torch_predict(samples.astype(dtype, copy=False),
+                             max_batch_size)
+    return predict
+
+
+def main(args):
+    config = load_config(args.model_path)
+    if args.max_batch_size is None:
+        args.max_batch_size = config.batch_size if config is not None \
+            else 1024
+    predict = load_predictor(args.model_path, args.max_batch_size, config)
+    if args.statistics_path is not None:
+        statistics = RunningStatistics.load(args.statistics_path)
+        model_predict = predict
+
+        def predict(samples: np.ndarray) -> np.ndarray:
+            samples = normalize_inplace(samples.astype(np.float32),
+                                        statistics.min,
+                                        statistics.max - statistics.min)
+            return model_predict(samples)
+    batcher = DynamicBatcher(predict, args.max_batch_size,
+                             args.max_delay / 1000.).start()
+    server = InferenceServer(batcher, args.host, args.port)
+    print("Serving {} on {}:{}".format(args.model_path, args.host,
+                                       server.server_address[1]))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        batcher.stop()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    main(args)
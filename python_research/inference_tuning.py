@@ -0,0 +1,300 @@
+"""
+Tuning of inference throughput on CPU. Batch size, numbers of intra-op and
+inter-op threads and the data type of samples are swept for a trained model,
+e.g. built with build_1d_model or build_3d_model, or Bass or ConvNet3D.
+The fastest configuration is saved next to the model, where scene
+classification, the inference server and testing of torch models pick it
+up.
+"""
+import os
+import copy
+import json
+import time
+import argparse
+import itertools
+from typing import Callable, Iterable, List, NamedTuple, Optional
+
+import numpy as np
+
+Predictor = Callable[[np.ndarray, int], np.ndarray]
+
+
+class InferenceConfig(NamedTuple):
+    batch_size: int
+    intra_op_threads: int
+    inter_op_threads: int
+    dtype: str
+
+
+class TuningResult(NamedTuple):
+    config: InferenceConfig
+    pixels_per_second: float
+    latency_p95_ms: float
+    agreement: float
+
+
+def get_config_path(model_path: os.PathLike) -> str:
+    return str(model_path) + '.inference.json'
+
+
+def save_config(config: InferenceConfig, path: os.PathLike):
+    with open(path, 'w') as file:
+        json.dump(config._asdict(), file, indent=4)
+
+
+def load_config(model_path: os.PathLike) -> Optional[InferenceConfig]:
+    """
+    Load the configuration tuned for a model
+    :param model_path: Path to the model
+    :return: Tuned configuration or None if the model was not tuned
+    """
+    path = get_config_path(model_path)
+    if not os.path.exists(path):
+        return None
+    with open(path) as file:
+        return InferenceConfig(**json.load(file))
+
+
+def limit_threads(threads: int, inter_op_threads: int=1):
+    """
+    Limit the number of threads used by the current process for computation
+    with keras and numpy, e.g. so that several processes classifying a scene
+    do not oversubscribe the cores
+    :param threads: Number of intra-op threads
+    :param inter_op_threads: Number of inter-op threads
+    :return: None
+    """
+    for variable in ['OMP_NUM_THREADS', 'MKL_NUM_THREADS',
+                     'OPENBLAS_NUM_THREADS']:
+        os.environ[variable] = str(threads)
+    import tensorflow as tf
+    from keras import backend
+    backend.set_session(tf.Session(config=tf.ConfigProto(
+        intra_op_parallelism_threads=threads,
+        inter_op_parallelism_threads=inter_op_threads)))
+
+
+def measure(predict: Predictor, samples: np.ndarray, batch_size: int,
+            repeats: int=3):
+    """
+    Measure throughput and latency of classifying samples in batches
+    :param predict: Function returning class probabilities of samples,
+                    classified batch_size at a time
+    :param samples: Samples to classify
+    :param batch_size: Number of samples classified at once
+    :param repeats: Number of times the samples are classified
+    :return: Pixels classified per second, 95th percentile of latency of
+             a batch in milliseconds and labels of the samples
+    """
+    # The first batch initializes the backend, so it is not measured
+    predict(samples[:batch_size], batch_size)
+    latencies = []
+    labels = np.empty(len(samples), dtype=np.int64)
+    for _ in range(repeats):
+        for start in range(0, len(samples), batch_size):
+            begin = time.perf_counter()
+            probabilities = predict(samples[start:start + batch_size],
+                                    batch_size)
+            latencies.append(time.perf_counter() - begin)
+            labels[start:start + batch_size] = np.argmax(probabilities,
+                                                         axis=-1)
+    pixels_per_second = repeats * len(samples) / np.sum(latencies)
+    return pixels_per_second, np.percentile(latencies, 95) * 1000, labels
+
+
+def tune(load_predictor: Callable[[int, int], Predictor],
+         samples: np.ndarray, batch_sizes: Iterable[int],
+         threads: Iterable[int], inter_op_threads: Iterable[int]=(1, ),
+         dtypes: Iterable[str]=('float32', ), repeats: int=3,
+         min_agreement: float=0.99) -> List[TuningResult]:
+    """
+    Measure every combination of settings. Configurations which label less
+    than min_agreement of samples the same as the first one, e.g. because of
+    lower precision, or which fail are left out.
+    :param load_predictor: Function loading the model computing with given
+                           numbers of intra-op and inter-op threads
+    :param samples: Samples to classify, synthetic or real
+    :param batch_sizes: Batch sizes to sweep
+    :param threads: Numbers of intra-op threads to sweep
+    :param inter_op_threads: Numbers of inter-op threads to sweep
+    :param dtypes: Data types of samples to sweep, the first one is
+                   the reference for agreement
+    :param repeats: Number of times the samples are classified with each
+                    configuration
+    :param min_agreement: Minimal fraction of samples labeled the same as
+                          with the first configuration
+    :return: Results of configurations, the fastest first
+    """
+    results = []
+    reference = None
+    for intra, inter in itertools.product(threads, inter_op_threads):
+        predict = load_predictor(intra, inter)
+        for dtype, batch_size in itertools.product(dtypes, batch_sizes):
+            config = InferenceConfig(batch_size, intra, inter, dtype)
+            try:
+                pixels_per_second, latency, labels = measure(
+                    predict, samples.astype(dtype), batch_size, repeats)
+            except Exception as error:
+                print("{} failed: {}".format(config, error))
+                continue
+            if reference is None:
+                reference = labels
+            agreement = float(np.mean(labels == reference))
+            print("{}: {:.1f} pixels/s, p95 latency {:.2f} ms, "
+                  "agreement {:.4f}".format(config, pixels_per_second,
+                                            latency, agreement))
+            if agreement >= min_agreement:
+                results.append(TuningResult(config, pixels_per_second,
+                                            latency, agreement))
+    return sorted(results, key=lambda result: -result.pixels_per_second)
+
+
+def select_config(results: List[TuningResult],
+                  max_latency: float=None) -> InferenceConfig:
+    """
+    :param results: Results of tune
+    :param max_latency: Maximal 95th percentile of latency of a batch in
+                        milliseconds, if not specified, latency is not
+                        limited
+    :return: Configuration with the highest throughput within the latency
+             limit
+    """
+    for result in results:
+        if max_latency is None or result.latency_p95_ms <= max_latency:
+            return result.config
+    raise ValueError("No configuration meets the latency limit of {} ms"
+                     .format(max_latency))
+
+
+def get_keras_loader(model_path: os.PathLike) \
+        -> Callable[[int, int], Predictor]:
+    """
+    :param model_path: Path to a trained keras model
+    :return: Function loading the model in a session with given numbers of
+             intra-op and inter-op threads
+    """
+    def load_predictor(intra_op_threads: int,
+                       inter_op_threads: int) -> Predictor:
+        from keras import backend
+        from keras.models import load_model
+        backend.clear_session()
+        limit_threads(intra_op_threads, inter_op_threads)
+        model = load_model(model_path)
+        input_shape = tuple(model.input_shape[1:])
+
+        def predict(samples: np.ndarray, batch_size: int) -> np.ndarray:
+            return model.predict(
+                samples.reshape((len(samples), ) + input_shape),
+                batch_size=batch_size)
+        return predict
+    return load_predictor
+
+
+def get_torch_loader(model_path: os.PathLike,
+                     dtypes: Iterable[str]=('float32', )) \
+        -> Callable[[int, int], Predictor]:
+    """
+    :param model_path: Path to a trained model with a predict method, e.g.
+                       Bass or ConvNet3D, saved with torch.save
+    :param dtypes: Data types of samples, a copy of the model with
+                   parameters of each of them is made up front
+    :return: Function setting given numbers of intra-op and inter-op
+             threads and returning the model on CPU, classifying samples
+             with the copy of the model matching their data type
+    """
+    import torch
+    model = torch.load(model_path, map_location='cpu').eval()
+    models = {np.dtype(dtype): copy.deepcopy(model).to(getattr(torch, dtype))
+              for dtype in dtypes}
+
+    def load_predictor(intra_op_threads: int,
+                       inter_op_threads: int) -> Predictor:
+        torch.set_num_threads(intra_op_threads)
+        try:
+            torch.set_num_interop_threads(inter_op_threads)
+        except RuntimeError:
+            # Inter-op threads can only be set before the first
+            # parallel computation of the process
+            pass
+
+        def predict(samples: np.ndarray, batch_size: int) -> np.ndarray:
+            with torch.no_grad():
+                return models[samples.dtype].predict(
+                    torch.from_numpy(samples)).float().numpy()
+        return predict
+    return load_predictor
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Find the fastest "
+                                                 "configuration of "
+                                                 "inference of a model "
+                                                 "on CPU")
+    parser.add_argument('--model_path', type=str, required=True,
+                        help="Path to a keras model in .h5 format or to "
+                             "a torch model saved with torch.save")
+    parser.add_argument('--samples_path', type=str, default=None,
+                        help="Path to the .npy file with samples, if not "
+                             "specified, synthetic samples are used")
+    parser.add_argument('--input_shape', type=int, nargs='+', default=None,
+                        help="Shape of a synthetic sample, by default the "
+                             "input shape of a keras model. Required for "
+                             "torch models without --samples_path.")
+    parser.add_argument('--samples', type=int, default=8192,
+                        help="Number of synthetic samples")
+    parser.add_argument('--batch_sizes', type=int, nargs='+',
+                        default=[64, 256, 1024, 4096],
+                        help="Batch sizes to sweep")
+    parser.add_argument('--threads', type=int, nargs='+',
+                        default=sorted({1, max(os.cpu_count() // 2, 1),
+                                        os.cpu_count()}),
+                        help="Numbers of intra-op threads to sweep")
+    parser.add_argument('--inter_op_threads', type=int, nargs='+',
+                        default=[1, 2],
+                        help="Numbers of inter-op threads to sweep")
+    parser.add_argument('--dtypes', type=str, nargs='+',
+                        default=['float32', 'float16'],
+                        help="Data types of samples to sweep, the first "
+                             "one is the reference for agreement")
+    parser.add_argument('--repeats', type=int, default=3,
+                        help="Number of times the samples are classified "
+                             "with each configuration")
+    parser.add_argument('--max_latency', type=float, default=None,
+                        help="Maximal 95th percentile of latency of "
+                             "a batch in milliseconds")
+    parser.add_argument('--min_agreement', type=float, default=0.99,
+                        help="Minimal fraction of samples labeled the same "
+                             "as with the first configuration")
+    return parser.parse_args()
+
+
+def main(args):
+    keras_model = args.model_path.endswith('.h5')
+    if args.samples_path is None and args.input_shape is None and \
+            not keras_model:
+        raise ValueError("Synthetic samples of torch models require "
+                         "--input_shape")
+    if keras_model:
+        load_predictor = get_keras_loader(args.model_path)
+    else:
+        load_predictor = get_torch_loader(args.model_path, args.dtypes)
+    if args.samples_path is not None:
+        samples = np.load(args.samples_path)
+    else:
+        input_shape = args.input_shape
+        if input_shape is None:
+            from keras.models import load_model
+            input_shape = load_model(args.model_path).input_shape[1:]
+        samples = np.random.RandomState(0).uniform(
+            size=[args.samples] + list(input_shape))
+    results = tune(load_predictor, samples, args.batch_sizes, args.threads,
+                   args.inter_op_threads, args.dtypes, args.repeats,
+                   args.min_agreement)
+    config = select_config(results, args.max_latency)
+    save_config(config, get_config_path(args.model_path))
+    print("Best configuration: {}".format(config))
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    main(args)
@@ -1,28 +1,97 @@
 import os
-from typing import Iterable
+from typing import Iterable, Tuple
 import numpy as np
 from scipy.io import loadmat
 
+try:
+    import h5py
+except ImportError:
+    h5py = None
 
-def load_data(path: os.PathLike):
+
+def load_data(path: os.PathLike, mmap: bool=False,
+              window: Tuple[slice, slice]=None,
+              bands: Iterable[int]=None):
     """
-    Loading data from NumPy array format (.npy) or from MATLAB format (.mat)
+    Loading data from NumPy array format (.npy) or from MATLAB format (.mat).
+    When only a part of the data is requested, only this part is read from
+    .npy and MATLAB v7.3 (HDF5) files, the latter require h5py.
     :param path: Path to either .npy or .mat type file
+    :param mmap: Whether to memory-map .npy files instead of reading them
+                 into memory. Selecting bands still reads them into memory.
+    :param window: Spatial window to load given as (rows, columns) slices,
+                   if not specified, the whole image is loaded
+    :param bands: Indices of bands to load, if not specified, all bands
+                  are loaded
     :return: numpy array with loaded data
     """
     if path.endswith(".npy"):
-        data = np.load(path)
+        if mmap or window is not None or bands is not None:
+            data = _select(np.load(path, mmap_mode='r'), window, bands)
+            if not mmap:
+                data = np.array(data)
+        else:
+            data = np.load(path)
     elif path.endswith(".mat"):
-        mat = loadmat(path)
-        for key in mat.keys():
-            if "__" not in key:
-                data = mat[key]
-                break
+        if h5py is not None and h5py.is_hdf5(path):
+            data = _load_hdf5_mat(path, window, bands)
+        else:
+            mat = loadmat(path)
+            for key in mat.keys():
+                if "__" not in key:
+                    data = mat[key]
+                    break
+            if window is not None or bands is not None:
+                data = np.array(_select(data, window, bands))
     else:
         raise ValueError("This file type is not supported")
     return data
 
 
+def _select(data: np.ndarray, window: Tuple[slice, slice]=None,
+            bands: Iterable[int]=None) -> np.ndarray:
+    """
+    Select a spatial window and bands from an array. Selecting a window
+    returns a view.
+    :param data: Array of shape (rows, columns) or (rows, columns, bands)
+    :param window: Spatial window given as (rows, columns) slices
+    :param bands: Indices of bands to select
+    :return: Selected part of the data
+    """
+    if window is not None:
+        data = data[window[0], window[1], ...]
+    if bands is not None:
+        data = data[..., list(bands)]
+    return data
+
+
+def _load_hdf5_mat(path: os.PathLike, window: Tuple[slice, slice]=None,
+                   bands: Iterable[int]=None) -> np.ndarray:
+    """
+    Load a variable from a MATLAB v7.3 file, reading only the requested part.
+    MATLAB stores arrays in column-major order, so the stored dataset has
+    its axes reversed.
+    :param path: Path to the .mat file
+    :param window: Spatial window given as (rows, columns) slices
+    :param bands: Indices of bands to load
+    :return: numpy array of shape (rows, columns) or (rows, columns, bands)
+    """
+    rows, columns = window if window is not None else (slice(None),
+                                                       slice(None))
+    with h5py.File(path, 'r') as mat:
+        key = [key for key in mat.keys() if not key.startswith("#")][0]
+        variable = mat[key]
+        if variable.ndim == 2:
+            return np.transpose(variable[columns, rows])
+        if bands is None:
+            return np.transpose(variable[:, columns, rows])
+        bands = np.asarray(list(bands))
+        # h5py only supports reading bands in increasing order
+        unique_bands = np.unique(bands)
+        data = np.transpose(variable[unique_bands.tolist(), columns, rows])
+    return data[..., np.searchsorted(unique_bands, bands)]
+
+
 def save_to_csv(path: os.PathLike, to_save: Iterable, mode: str='a'):
     """
     Save an iterable to a CSV file
@@ -3,11 +3,11 @@ import numpy as np
 from keras.models import Model, Sequential
 from keras.optimizers import Adam
 from keras.layers import MaxPooling2D, Flatten, Conv2D, Softmax, Input, \
-    concatenate, Conv1D, MaxPooling1D, Dense, BatchNormalization
+    concatenate, Conv1D, MaxPooling1D, Dense, BatchNormalization, Cropping2D
 
 
 class ModelSettings(NamedTuple):
-    input_neighbourhood: Tuple[int, int]
+    input_neighborhood: Tuple[int, int]
     first_conv_kernel_size: Tuple[int, int]
 
 
@@ -102,6 +102,67 @@ def build_3d_model(settings: ModelSettings,
     return model
 
 
+def build_dense_3d_model(model: Sequential) -> Model:
+    """
+    Convert a model built with build_3d_model into an equivalent fully
+    convolutional model, which classifies all pixels of a tile in one pass.
+    Its input is a tile padded with neighbourhood // 2 pixels on each side,
+    its output are softmax probabilities of shape (height, width, classes)
+    of the pixels of the tile. Convolutions shared by overlapping patches
+    are computed once:
+    - pooling with stride 2 becomes pooling with stride 1, followed by
+      convolutions with dilation 2,
+    - the 2x2 convolution with 'same' padding sees zeros past the bottom
+      and right edges of a patch, so each of its four output positions
+      becomes a separate convolution with the kernel cut to the taps which
+      fall inside the patch,
+    - the final 2x2 convolution becomes a 1x1 convolution of the four
+      positions stacked along channels.
+    :param model: Model built with build_3d_model, possibly trained
+    :return: Fully convolutional model sharing weights of the model
+    """
+    first_conv, pooling, second_conv, third_conv = model.layers[:4]
+    if not (isinstance(first_conv, Conv2D) and
+            isinstance(pooling, MaxPooling2D) and
+            tuple(pooling.output_shape[1:3]) == (2, 2) and
+            tuple(third_conv.output_shape[1:3]) == (1, 1)):
+        raise ValueError("Model has to be built with build_3d_model")
+    input1 = Input(shape=(None, None, first_conv.input_shape[-1]))
+    features = Conv2D(filters=first_conv.filters,
+                      kernel_size=first_conv.kernel_size,
+                      padding='valid')
+    features_output = features(input1)
+    pooled = MaxPooling2D(pool_size=(2, 2),
+                          strides=(1, 1),
+                          padding='valid')(features_output)
+    kernel, bias = second_conv.get_weights()
+    positions, positions_weights = [], []
+    for row in range(2):
+        for column in range(2):
+            cropped = Cropping2D(cropping=((2 * row, 0),
+                                           (2 * column, 0)))(pooled)
+            position = Conv2D(filters=second_conv.filters,
+                              kernel_size=(2 - row, 2 - column),
+                              dilation_rate=(2, 2),
+                              padding='valid',
+                              activation='relu')
+            positions.append(position(cropped))
+            positions_weights.append((position, [kernel[:2 - row, :2 - column],
+                                                 bias]))
+    scores = Conv2D(filters=third_conv.filters,
+                    kernel_size=(1, 1),
+                    padding='valid')
+    scores_output = scores(concatenate(positions, axis=-1))
+    softmax = Softmax(axis=-1)(scores_output)
+    dense_model = Model(inputs=[input1], outputs=[softmax])
+    features.set_weights(first_conv.get_weights())
+    for position, weights in positions_weights:
+        position.set_weights(weights)
+    kernel, bias = third_conv.get_weights()
+    scores.set_weights([kernel.reshape((1, 1, -1, third_conv.filters)), bias])
+    return dense_model
+
+
 def build_1d_model(input_shape, filters, kernel_size, classes_count, blocks=1):
     optimizer = Adam(lr=0.0001)
 
@@ -0,0 +1,96 @@
+"""
+Classification metrics accumulated batch by batch in a confusion matrix, so
+that predictions never have to be kept in memory.
+"""
+import numpy as np
+import torch
+
+
+class ConfusionMatrix:
+    """
+    Confusion matrix of shape (classes_count, classes_count), rows
+    corresponding to true labels and columns to predicted ones. It is updated
+    with a single bincount per batch, metrics are derived from the matrix in
+    O(classes_count^2).
+    """
+    def __init__(self, classes_count: int):
+        """
+        :param classes_count: Number of classes, labels and predictions have
+                              to be lower than it
+        """
+        self.classes_count = classes_count
+        self.matrix = np.zeros((classes_count, classes_count), dtype=np.int64)
+
+    def update(self, predictions, labels) -> 'ConfusionMatrix':
+        """
+        Count a batch of predictions. Torch tensors are counted on their
+        device, only the counts are copied to memory.
+        :param predictions: Predicted labels, numpy array or torch tensor
+        :param labels: True labels, numpy array or torch tensor
+        :return: Updated confusion matrix
+        """
+        cells = self.classes_count ** 2
+        if isinstance(predictions, torch.Tensor):
+            indices = labels.long().view(-1) * self.classes_count + \
+                predictions.long().view(-1)
+            counts = torch.bincount(indices, minlength=cells).cpu().numpy()
+        else:
+            indices = np.asarray(labels, dtype=np.int64).ravel() * \
+                self.classes_count + np.asarray(predictions,
+                                                dtype=np.int64).ravel()
+            counts = np.bincount(indices, minlength=cells)
+        self.matrix += counts.reshape(self.matrix.shape)
+        return self
+
+    def merge(self, other: 'ConfusionMatrix') -> 'ConfusionMatrix':
+        self.matrix += other.matrix
+        return self
+
+    def reset(self):
+        self.matrix[...] = 0
+
+    @property
+    def count(self) -> int:
+        return int(self.matrix.sum())
+
+    @property
+    def overall_accuracy(self) -> float:
+        """
+        Fraction of correctly classified samples, 0 if there are none
+        """
+        count = self.count
+        if count == 0:
+            return 0.
+        return float(np.trace(self.matrix)) / count
+
+    @property
+    def class_accuracies(self) -> np.ndarray:
+        """
+        Fraction of correctly classified samples of each class, nan for
+        classes without samples
+        """
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return np.diagonal(self.matrix) / self.matrix.sum(axis=1)
+
+    @property
+    def average_accuracy(self) -> float:
+        """
+        Mean of accuracies of classes with samples
+        """
+        return float(np.nanmean(self.class_accuracies))
+
+    @property
+    def kappa(self) -> float:
+        """
+        Cohen's kappa coefficient of agreement between true and predicted
+        labels, 0 if there are no samples
+        """
+        count = self.count
+        if count == 0:
+            return 0.
+        observed = np.trace(self.matrix) / count
+        expected = np.dot(self.matrix.sum(axis=0),
+                          self.matrix.sum(axis=1)) / float(count) ** 2
+        if expected == 1:
+            return 1. if observed == 1 else 0.
+        return float((observed - expected) / (1 - expected))
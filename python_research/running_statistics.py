@@ -0,0 +1,123 @@
+import json
+import os
+
+import numpy as np
+
+
+class RunningStatistics:
+    """
+    Minimum, maximum, mean and standard deviation of data fed to it chunk by
+    chunk, computed in a single pass. Mean and variance of chunks are merged
+    with the parallel variant of Welford's algorithm, which stays accurate
+    for any number of chunks. Statistics are either global or computed
+    separately for each band.
+    """
+    def __init__(self, band_axis: int=None):
+        """
+        :param band_axis: Axis of samples holding bands, e.g. -1, statistics
+                          are then computed for each band separately. If not
+                          specified, global statistics are computed.
+        """
+        self.band_axis = band_axis
+        self.count = 0
+        self.mean = 0.
+        self.m2 = 0.
+        self.min = np.inf
+        self.max = -np.inf
+
+    def _get_reduced_axes(self, ndim: int) -> tuple:
+        if self.band_axis is None:
+            return tuple(range(ndim))
+        return tuple(axis for axis in range(ndim)
+                     if axis != self.band_axis % ndim)
+
+    def update(self, samples: np.ndarray) -> 'RunningStatistics':
+        """
+        Update statistics with a chunk of samples
+        :param samples: Array of samples, the first axis indexing samples
+        :return: Updated statistics
+        """
+        if len(samples) == 0:
+            return self
+        samples = np.asarray(samples)
+        axes = self._get_reduced_axes(samples.ndim)
+        chunk = RunningStatistics(self.band_axis)
+        chunk.count = samples.size // int(np.prod([samples.shape[axis] for axis
+                                                   in range(samples.ndim)
+                                                   if axis not in axes]))
+        # Per-band statistics keep the dimensions of a sample, so that they
+        # broadcast against samples during normalization
+        keepdims = self.band_axis is not None
+        chunk.mean = np.mean(samples, axis=axes, dtype=np.float64,
+                             keepdims=keepdims)
+        chunk.m2 = np.sum(np.square(samples - chunk.mean, dtype=np.float64),
+                          axis=axes, keepdims=keepdims)
+        chunk.min = np.amin(samples, axis=axes, keepdims=keepdims)
+        chunk.max = np.amax(samples, axis=axes, keepdims=keepdims)
+        if keepdims:
+            chunk.mean, chunk.m2, chunk.min, chunk.max = \
+                chunk.mean[0], chunk.m2[0], chunk.min[0], chunk.max[0]
+        return self.merge(chunk)
+
+    def merge(self, other: 'RunningStatistics') -> 'RunningStatistics':
+        """
+        Merge statistics of other data into these statistics
+        :param other: Statistics to merge
+        :return: Updated statistics
+        """
+        if other.count == 0:
+            return self
+        count = self.count + other.count
+        delta = other.mean - self.mean
+        self.mean = self.mean + delta * other.count / count
+        self.m2 = self.m2 + other.m2 + \
+            np.square(delta) * self.count * other.count / count
+        self.count = count
+        self.min = np.minimum(self.min, other.min)
+        self.max = np.maximum(self.max, other.max)
+        return self
+
+    @property
+    def variance(self):
+        return self.m2 / self.count
+
+    @property
+    def std(self):
+        return np.sqrt(self.variance)
+
+    def to_dict(self) -> dict:
+        return {'band_axis': self.band_axis,
+                'count': self.count,
+                'mean': np.asarray(self.mean).tolist(),
+                'm2': np.asarray(self.m2).tolist(),
+                'min': np.asarray(self.min).tolist(),
+                'max': np.asarray(self.max).tolist()}
+
+    @classmethod
+    def from_dict(cls, dictionary: dict) -> 'RunningStatistics':
+        statistics = cls(dictionary['band_axis'])
+        statistics.count = dictionary['count']
+        for name in ['mean', 'm2', 'min', 'max']:
+            value = np.asarray(dictionary[name])
+            setattr(statistics, name, value if value.ndim > 0 else value[()])
+        return statistics
+
+    def save(self, path: os.PathLike):
+        """
+        Save statistics to a JSON file, e.g. to normalize data at inference
+        time with parameters computed on the training data
+        :param path: Path to the file
+        :return: None
+        """
+        with open(path, 'w') as file:
+            json.dump(self.to_dict(), file)
+
+    @classmethod
+    def load(cls, path: os.PathLike) -> 'RunningStatistics':
+        """
+        Load statistics saved with save
+        :param path: Path to the file
+        :return: Loaded statistics
+        """
+        with open(path) as file:
+            return cls.from_dict(json.load(file))
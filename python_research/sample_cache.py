@@ -0,0 +1,185 @@
+"""
+On-disk cache of prepared samples. Entries are keyed by a fingerprint of
+the input files and of the parameters the samples were prepared with, and
+stored as .npy files which are memory-mapped when loaded.
+"""
+import os
+import time
+import shutil
+import hashlib
+import argparse
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+BLOCK_SIZE = 2 ** 16
+BLOCKS_COUNT = 64
+
+
+def fingerprint_file(path: os.PathLike) -> str:
+    """
+    Compute a fingerprint of file contents. Files smaller than
+    BLOCKS_COUNT * BLOCK_SIZE bytes are hashed whole, for larger ones only
+    BLOCKS_COUNT evenly spaced blocks, the file size, modification time and
+    inode are hashed, so the cost does not depend on the size of the file
+    and a file modified in place between the blocks gets a new fingerprint.
+    :param path: Path to the file
+    :return: Hex digest of the fingerprint
+    """
+    stat = os.stat(path)
+    size = stat.st_size
+    digest = hashlib.sha1(str(size).encode())
+    with open(path, 'rb') as file:
+        if size <= BLOCKS_COUNT * BLOCK_SIZE:
+            digest.update(file.read())
+        else:
+            digest.update('{}:{}'.format(stat.st_mtime_ns,
+                                         stat.st_ino).encode())
+            step = (size - BLOCK_SIZE) // (BLOCKS_COUNT - 1)
+            for block in range(BLOCKS_COUNT):
+                file.seek(block * step)
+                digest.update(file.read(BLOCK_SIZE))
+    return digest.hexdigest()
+
+
+class SampleCache:
+    """
+    Content-addressed cache of arrays stored in a directory, one
+    subdirectory per entry. When the total size of entries exceeds max_size,
+    least recently used entries are evicted.
+    """
+    def __init__(self, directory: os.PathLike, max_size_gb: float=10.):
+        """
+        :param directory: Directory in which entries are stored
+        :param max_size_gb: Maximal total size of entries in gigabytes,
+                            if None, the size is not limited
+        """
+        self.directory = directory
+        self.max_size = None if max_size_gb is None \
+            else int(max_size_gb * 2 ** 30)
+        os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def get_key(paths: List[os.PathLike], *parameters) -> str:
+        """
+        Compute a key of an entry
+        :param paths: Paths to files the entry is prepared from
+        :param parameters: Parameters the entry is prepared with
+        :return: Key of the entry
+        """
+        digest = hashlib.sha1()
+        for path in paths:
+            digest.update(fingerprint_file(path).encode())
+        digest.update(repr(parameters).encode())
+        return digest.hexdigest()
+
+    def _get_path(self, key: str) -> str:
+        return os.path.join(self.directory, key)
+
+    def load(self, key: str) -> Dict[str, np.ndarray]:
+        """
+        Load arrays of an entry. Arrays are memory-mapped copy-on-write,
+        so they can be modified in memory without changing the cache.
+        :param key: Key of the entry
+        :return: Dictionary of arrays, None if there is no such entry
+        """
+        path = self._get_path(key)
+        if not os.path.isdir(path):
+            return None
+        arrays = {os.path.splitext(name)[0]:
+                  np.load(os.path.join(path, name), mmap_mode='c')
+                  for name in os.listdir(path)}
+        os.utime(path)
+        return arrays
+
+    def store(self, key: str, **arrays: np.ndarray):
+        """
+        Store arrays as an entry and evict least recently used entries if
+        the cache gets too big. The entry is written to a temporary
+        directory first, so concurrent readers never see it partially
+        written.
+        :param key: Key of the entry
+        :param arrays: Arrays to store, given as keyword arguments
+        :return: None
+        """
+        path = self._get_path(key)
+        temporary_path = '{}.{}.tmp'.format(path, os.getpid())
+        os.makedirs(temporary_path, exist_ok=True)
+        for name, array in arrays.items():
+            np.save(os.path.join(temporary_path, name + '.npy'), array)
+        try:
+            os.rename(temporary_path, path)
+        except OSError:
+            shutil.rmtree(temporary_path, ignore_errors=True)
+        self.evict(keep=key)
+
+    def entries(self) -> List[Tuple[str, int, float]]:
+        """
+        :return: (key, size in bytes, time of last use) of each entry,
+                 starting with the least recently used one
+        """
+        entries = []
+        for key in os.listdir(self.directory):
+            path = self._get_path(key)
+            if key.endswith('.tmp') or not os.path.isdir(path):
+                continue
+            size = sum(os.path.getsize(os.path.join(path, name))
+                       for name in os.listdir(path))
+            entries.append((key, size, os.path.getmtime(path)))
+        return sorted(entries, key=lambda entry: entry[2])
+
+    def evict(self, keep: str=None):
+        """
+        Remove least recently used entries until the cache fits in max_size
+        :param keep: Key of an entry which should not be removed
+        :return: None
+        """
+        if self.max_size is None:
+            return
+        entries = self.entries()
+        total_size = sum(size for _, size, _ in entries)
+        for key, size, _ in entries:
+            if total_size <= self.max_size:
+                break
+            if key != keep:
+                self.remove(key)
+                total_size -= size
+
+    def remove(self, key: str):
+        shutil.rmtree(self._get_path(key), ignore_errors=True)
+
+    def clear(self):
+        """
+        Remove all entries
+        :return: None
+        """
+        for key, _, _ in self.entries():
+            self.remove(key)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Inspect or clear the cache "
+                                                 "of prepared samples")
+    parser.add_argument('--cache_dir', type=str, required=True,
+                        help="Directory of the cache")
+    parser.add_argument('--clear', action='store_true',
+                        help="Remove all entries of the cache")
+    return parser.parse_args()
+
+
+def main(args):
+    cache = SampleCache(args.cache_dir, max_size_gb=None)
+    if args.clear:
+        cache.clear()
+    entries = cache.entries()
+    for key, size, last_used in entries:
+        print("{} {:10.1f} MB last used {}".format(
+            key, size / 2 ** 20, time.strftime('%Y-%m-%d %H:%M:%S',
+                                               time.localtime(last_used))))
+    print("Entries: {} Total size: {:.1f} MB".format(
+        len(entries), sum(size for _, size, _ in entries) / 2 ** 20))
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    main(args)
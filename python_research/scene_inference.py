@@ -0,0 +1,576 @@
+"""
+Classification of whole hyperspectral scenes. The scene is processed in
+tiles, each extended with a halo of neighbouring pixels, so that patches of
+all pixels of a tile can be cut out of it and memory usage is bounded by the
+tile size instead of the size of the scene. Scenes can also be split into
+bands of rows classified by a pool of processes, each with its own copy of
+the model, writing to a map in shared memory. Labels and probabilities of
+classified tiles can be streamed to GeoTIFF files, so that neither has to
+fit in memory.
+"""
+import os
+import time
+import shutil
+import argparse
+import tempfile
+import multiprocessing
+from typing import Callable, Iterable, Iterator, NamedTuple, Tuple
+
+import numpy as np
+from keras.models import load_model
+
+from python_research.io import load_data
+from python_research.dataset_structures import HyperspectralDataset, \
+    normalize_inplace, HEIGHT, WIDTH, DEPTH, SHARED_MEMORY_DIRECTORY
+from python_research.running_statistics import RunningStatistics
+from python_research.keras_models import build_dense_3d_model
+from python_research.geotiff import GeoTiffWriter, encode_probabilities
+from python_research.inference_tuning import limit_threads, load_config
+
+
+class SceneClassification(NamedTuple):
+    labels: np.ndarray
+    probabilities: np.ndarray
+    pixels_per_second: float
+
+
+def get_tiles(height: int, width: int, tile_size: int,
+              rows: slice=None) -> Iterator[Tuple[slice, slice]]:
+    """
+    Split an image into tiles, in row-major order
+    :param height: Height of the image
+    :param width: Width of the image
+    :param tile_size: Height and width of a tile, tiles at the bottom and
+                      right edges of the image may be smaller
+    :param rows: Band of rows of the image to split, if not specified, the
+                 whole image is split
+    :return: Iterator over (rows, columns) slices of tiles
+    """
+    rows = slice(0, height) if rows is None else rows
+    height = min(rows.stop, height)
+    for row in range(rows.start, height, tile_size):
+        for column in range(0, width, tile_size):
+            yield (slice(row, min(row + tile_size, height)),
+                   slice(column, min(column + tile_size, width)))
+
+
+def extract_tile(cube: np.ndarray, rows: slice, columns: slice,
+                 padding_size: int, out: np.ndarray=None) -> np.ndarray:
+    """
+    Copy a tile of the cube extended by padding_size pixels on each side.
+    Pixels outside of the cube are zeros, as in the padded cube samples are
+    extracted from for training.
+    :param cube: Cube of shape (height, width, bands)
+    :param rows: Rows of the tile
+    :param columns: Columns of the tile
+    :param padding_size: Width of the halo around the tile
+    :param out: Array to copy the tile to, it is reused if it has the right
+                shape, otherwise a new one of the same dtype is allocated
+    :return: Array of shape (tile height + 2 * padding_size,
+             tile width + 2 * padding_size, bands)
+    """
+    shape = (rows.stop - rows.start + 2 * padding_size,
+             columns.stop - columns.start + 2 * padding_size,
+             cube.shape[DEPTH])
+    if out is None or out.shape != shape:
+        out = np.empty(shape, dtype=cube.dtype if out is None else out.dtype)
+    top, left = rows.start - padding_size, columns.start - padding_size
+    source_rows = slice(max(top, 0), min(rows.stop + padding_size,
+                                         cube.shape[HEIGHT]))
+    source_columns = slice(max(left, 0), min(columns.stop + padding_size,
+                                             cube.shape[WIDTH]))
+    target_rows = slice(source_rows.start - top, source_rows.stop - top)
+    target_columns = slice(source_columns.start - left,
+                           source_columns.stop - left)
+    if target_rows != slice(0, shape[HEIGHT]) or \
+            target_columns != slice(0, shape[WIDTH]):
+        out.fill(0)
+    out[target_rows, target_columns] = cube[source_rows, source_columns]
+    return out
+
+
+def _predict_patches(tile: np.ndarray,
+                     predict: Callable[[np.ndarray], np.ndarray],
+                     window_size: int, tile_width: int,
+                     batch_size: int) -> np.ndarray:
+    """
+    Classify patches of all pixels of a padded tile, batch_size at a time
+    :param tile: Tile padded with window_size // 2 pixels on each side
+    :param predict: Function returning class probabilities of a batch
+    :param window_size: Spatial size of patches
+    :param tile_width: Width of the tile without padding
+    :param batch_size: Number of patches passed to predict at once
+    :return: Probabilities of shape (pixels, classes), in row-major order
+    """
+    if window_size > 1:
+        windows = HyperspectralDataset._get_sliding_windows(tile, window_size)
+        pixels = windows.shape[HEIGHT] * windows.shape[WIDTH]
+    else:
+        windows = tile.reshape((-1, tile.shape[DEPTH]))
+        pixels = len(windows)
+    probabilities = None
+    for start in range(0, pixels, batch_size):
+        indices = np.arange(start, min(start + batch_size, pixels))
+        if window_size > 1:
+            batch = windows[indices // tile_width, indices % tile_width]
+        else:
+            batch = windows[start:start + batch_size]
+        batch_probabilities = predict(batch)
+        if probabilities is None:
+            probabilities = np.empty((pixels, batch_probabilities.shape[-1]),
+                                     dtype=np.float32)
+        probabilities[indices] = batch_probabilities
+    return probabilities
+
+
+def classify_tiles(cube: np.ndarray,
+                   predict: Callable[[np.ndarray], np.ndarray],
+                   tiles: Iterable[Tuple[slice, slice]],
+                   neighbourhood_size: int=1, batch_size: int=1024,
+                   statistics: RunningStatistics=None,
+                   dtype: type=np.float32, dense: bool=False) \
+        -> Iterator[Tuple[slice, slice, np.ndarray]]:
+    """
+    Classify every pixel of tiles of a scene, one tile at a time. Parameters
+    are the same as of classify_scene.
+    :param tiles: (rows, columns) slices of tiles, e.g. returned by get_tiles
+    :return: Iterator over (rows, columns, probabilities) of tiles,
+             probabilities of shape (tile height, tile width, classes)
+    """
+    padding_size = HyperspectralDataset._get_padding_size(neighbourhood_size)
+    tile = np.empty((0, 0, 0), dtype=dtype)
+    for rows, columns in tiles:
+        tile = extract_tile(cube, rows, columns, padding_size, out=tile)
+        if statistics is not None:
+            normalize_inplace(tile, statistics.min,
+                              statistics.max - statistics.min)
+        tile_width = columns.stop - columns.start
+        if dense:
+            tile_probabilities = predict(tile[np.newaxis])[0]
+        else:
+            tile_probabilities = _predict_patches(tile, predict,
+                                                  padding_size * 2 + 1,
+                                                  tile_width, batch_size)
+        yield rows, columns, tile_probabilities.reshape(
+            (-1, tile_width, tile_probabilities.shape[-1]))
+
+
+def classify_scene(cube: np.ndarray,
+                   predict: Callable[[np.ndarray], np.ndarray],
+                   neighbourhood_size: int=1, tile_size: int=128,
+                   batch_size: int=1024,
+                   statistics: RunningStatistics=None,
+                   return_probabilities: bool=False,
+                   dtype: type=np.float32,
+                   dense: bool=False) -> SceneClassification:
+    """
+    Classify every pixel of a scene
+    :param cube: Cube of shape (height, width, bands), may be memory-mapped
+    :param predict: Function returning class probabilities of shape
+                    (samples, classes) for a batch of samples of shape
+                    (samples, neighbourhood_size, neighbourhood_size, bands),
+                    or (samples, bands) if neighbourhood_size is 1
+    :param neighbourhood_size: Spatial size of samples the model was trained
+                               with
+    :param tile_size: Height and width of tiles the scene is processed in
+    :param batch_size: Number of samples passed to predict at once
+    :param statistics: Statistics of the training data, samples are min-max
+                       normalized with them if specified
+    :param return_probabilities: Whether to return class probabilities of
+                                 each pixel
+    :param dtype: Data type of samples passed to predict
+    :param dense: Whether predict is a fully convolutional model, e.g. built
+                  with build_dense_3d_model. It is then given whole padded
+                  tiles of shape (1, height, width, bands) and returns
+                  probabilities of shape (1, height, width, classes) of
+                  their pixels.
+    :return: Map of labels of shape (height, width), probabilities of shape
+             (height, width, classes) or None and the number of pixels
+             classified per second
+    """
+    start_time = time.time()
+    height, width = cube.shape[HEIGHT], cube.shape[WIDTH]
+    labels = np.empty((height, width), dtype=np.int32)
+    probabilities = None
+    for rows, columns, tile_probabilities in classify_tiles(
+            cube, predict, get_tiles(height, width, tile_size),
+            neighbourhood_size, batch_size, statistics, dtype, dense):
+        labels[rows, columns] = np.argmax(tile_probabilities, axis=-1)
+        if return_probabilities:
+            if probabilities is None:
+                probabilities = np.empty(
+                    (height, width, tile_probabilities.shape[-1]),
+                    dtype=np.float32)
+            probabilities[rows, columns] = tile_probabilities
+    pixels_per_second = height * width / (time.time() - start_time)
+    return SceneClassification(labels, probabilities, pixels_per_second)
+
+
+def write_classification(tiles: Iterable[Tuple[slice, slice, np.ndarray,
+                                                np.ndarray]],
+                         height: int, width: int, labels_path: os.PathLike,
+                         probabilities_path: os.PathLike=None,
+                         probabilities_dtype: np.dtype=np.uint8,
+                         block_size: int=256, **kwargs):
+    """
+    Write classified tiles of a scene to tiled, compressed GeoTIFF files as
+    they come, labels as uint8
+    :param tiles: Iterable over (rows, columns, labels, probabilities) of
+                  tiles, probabilities of shape (tile height, tile width,
+                  classes), they may be None if probabilities_path is not
+                  specified
+    :param height: Height of the scene
+    :param width: Width of the scene
+    :param labels_path: Path to the file of labels
+    :param probabilities_path: Path to the file of probabilities, they are
+                               not written if not specified
+    :param probabilities_dtype: Data type of probabilities, uint8 scaled to
+                                [0, 255] or float16
+    :param block_size: Height and width of blocks of the files
+    :param kwargs: Other parameters of GeoTiffWriter, e.g. projection
+    :return: None
+    """
+    probabilities_writer = None
+    with GeoTiffWriter(labels_path, height, width, dtype=np.uint8,
+                       block_size=block_size, resampling='MODE',
+                       **kwargs) as labels_writer:
+        try:
+            for rows, columns, labels, probabilities in tiles:
+                labels_writer.write(rows, columns, labels)
+                if probabilities_path is None:
+                    continue
+                if probabilities_writer is None:
+                    probabilities_writer = GeoTiffWriter(
+                        probabilities_path, height, width,
+                        probabilities.shape[-1], probabilities_dtype,
+                        block_size=block_size, resampling='AVERAGE',
+                        **kwargs)
+                probabilities_writer.write(
+                    rows, columns,
+                    encode_probabilities(probabilities, probabilities_dtype))
+        finally:
+            if probabilities_writer is not None:
+                probabilities_writer.close()
+
+
+def _get_block_size(tile_size: int) -> int:
+    # Blocks of GeoTIFF files have to be multiples of 16, blocks matching
+    # tiles are written as soon as the tiles are classified
+    return tile_size if tile_size % 16 == 0 else 256
+
+
+def classify_scene_to_geotiff(cube: np.ndarray,
+                              predict: Callable[[np.ndarray], np.ndarray],
+                              labels_path: os.PathLike,
+                              probabilities_path: os.PathLike=None,
+                              probabilities_dtype: np.dtype=np.uint8,
+                              neighbourhood_size: int=1, tile_size: int=128,
+                              batch_size: int=1024,
+                              statistics: RunningStatistics=None,
+                              dtype: type=np.float32, dense: bool=False,
+                              **kwargs) -> float:
+    """
+    Classify every pixel of a scene, streaming labels and probabilities of
+    each classified tile to GeoTIFF files, so that memory usage does not
+    depend on the size of the scene. Remaining parameters are the same as
+    of classify_scene and write_classification.
+    :param kwargs: Other parameters of GeoTiffWriter, e.g. projection
+    :return: Number of pixels classified per second
+    """
+    start_time = time.time()
+    height, width = cube.shape[HEIGHT], cube.shape[WIDTH]
+    tiles = ((rows, columns, np.argmax(probabilities, axis=-1), probabilities)
+             for rows, columns, probabilities in classify_tiles(
+                 cube, predict, get_tiles(height, width, tile_size),
+                 neighbourhood_size, batch_size, statistics, dtype, dense))
+    write_classification(tiles, height, width, labels_path,
+                         probabilities_path, probabilities_dtype,
+                         _get_block_size(tile_size), **kwargs)
+    return height * width / (time.time() - start_time)
+
+
+def get_keras_predictor(model,
+                        batch_size: int=1024) -> Callable[[np.ndarray],
+                                                          np.ndarray]:
+    """
+    Wrap a keras model trained on samples of the shape returned by
+    HyperspectralDataset, e.g. build_1d_model or build_3d_model, so that it
+    can be passed to classify_scene
+    :param model: Keras model
+    :param batch_size: Batch size used by the model
+    :return: Predict function
+    """
+    input_shape = tuple(model.input_shape[1:])
+
+    def predict(samples: np.ndarray) -> np.ndarray:
+        return model.predict(samples.reshape((len(samples), ) + input_shape),
+                             batch_size=batch_size)
+    return predict
+
+
+def load_predictor(model_path: os.PathLike, batch_size: int=1024,
+                   dense: bool=False) -> Tuple[Callable[[np.ndarray],
+                                                        np.ndarray], int]:
+    """
+    Load a trained keras model to classify a scene with
+    :param model_path: Path to the model
+    :param batch_size: Batch size used by the model
+    :param dense: Whether to convert a model built with build_3d_model into
+                  a fully convolutional one
+    :return: Predict function and the neighbourhood size of the model
+    """
+    model = load_model(model_path)
+    input_shape = model.input_shape[1:]
+    # Models of spectral samples take them as (bands, 1)
+    neighbourhood_size = input_shape[0] if len(input_shape) == 3 else 1
+    if dense:
+        return build_dense_3d_model(model).predict, neighbourhood_size
+    return get_keras_predictor(model, batch_size), neighbourhood_size
+
+
+# State of a worker process of classify_scene_parallel, set by _init_worker
+_worker = {}
+
+
+def _init_worker(cube_path: os.PathLike, model_path: os.PathLike,
+                 labels_path: os.PathLike, probabilities_path: os.PathLike,
+                 threads: int, settings: dict):
+    # A pool replaces workers whose initializer raises instead of failing,
+    # so the error is raised by _classify_band
+    try:
+        limit_threads(threads)
+        predict, neighbourhood_size = load_predictor(model_path,
+                                                     settings['batch_size'],
+                                                     settings['dense'])
+        _worker.update(settings)
+        _worker.update(
+            cube=load_data(cube_path, mmap=True), predict=predict,
+            neighbourhood_size=neighbourhood_size,
+            labels=np.load(labels_path, mmap_mode='r+'),
+            probabilities=np.load(probabilities_path, mmap_mode='r+')
+            if probabilities_path is not None else None)
+    except Exception as exception:
+        _worker['error'] = exception
+
+
+def _classify_band(rows: slice) -> Tuple[float, float]:
+    """
+    Classify a band of rows of the scene in a worker process
+    :param rows: Rows of the band
+    :return: Times the classification started and finished at
+    """
+    if 'error' in _worker:
+        raise _worker['error']
+    start_time = time.time()
+    cube, labels, probabilities = _worker['cube'], _worker['labels'], \
+        _worker['probabilities']
+    tiles = get_tiles(cube.shape[HEIGHT], cube.shape[WIDTH],
+                      _worker['tile_size'], rows)
+    for rows, columns, tile_probabilities in classify_tiles(
+            cube, _worker['predict'], tiles, _worker['neighbourhood_size'],
+            _worker['batch_size'], _worker['statistics'], _worker['dtype'],
+            _worker['dense']):
+        labels[rows, columns] = np.argmax(tile_probabilities, axis=-1)
+        if probabilities is not None:
+            probabilities[rows, columns] = tile_probabilities
+    return start_time, time.time()
+
+
+def classify_scene_parallel(cube_path: os.PathLike, model_path: os.PathLike,
+                            workers: int=None, threads: int=1,
+                            band_height: int=None, tile_size: int=128,
+                            batch_size: int=1024,
+                            statistics: RunningStatistics=None,
+                            return_probabilities: bool=False,
+                            dtype: type=np.float32, dense: bool=False,
+                            output_directory: os.PathLike=None) \
+        -> SceneClassification:
+    """
+    Classify every pixel of a scene with a pool of processes. The scene is
+    split into bands of rows, each worker process memory-maps the cube,
+    loads its own copy of the model and writes labels of the bands it
+    classifies to a memory-mapped map shared by all workers. Remaining
+    parameters are the same as of classify_scene.
+    :param cube_path: Path to the scene in .npy format, other formats are
+                      read into memory by each worker
+    :param model_path: Path to the trained keras model
+    :param workers: Number of worker processes, all cores by default
+    :param threads: Number of threads each worker computes with
+    :param band_height: Number of rows of a band, by default the scene is
+                        split into four bands per worker, so that workers
+                        finishing early take over remaining ones
+    :param output_directory: Directory the map of labels and probabilities
+                             are saved to as labels.npy and
+                             probabilities.npy, returned arrays are then
+                             memory-mapped. If not specified, they are
+                             returned in memory.
+    :return: Map of labels of shape (height, width), probabilities of shape
+             (height, width, classes) or None and the number of pixels
+             classified per second, not counting the time of starting
+             workers and loading models
+    """
+    workers = workers or os.cpu_count()
+    cube = load_data(cube_path, mmap=True)
+    height, width = cube.shape[HEIGHT], cube.shape[WIDTH]
+    if band_height is None:
+        band_height = -(-height // (workers * 4))
+    bands = [slice(row, min(row + band_height, height))
+             for row in range(0, height, band_height)]
+    directory = output_directory
+    if directory is None:
+        directory = tempfile.mkdtemp(
+            prefix='scene_', dir=SHARED_MEMORY_DIRECTORY
+            if os.path.isdir(SHARED_MEMORY_DIRECTORY) else None)
+    labels_path = os.path.join(directory, 'labels.npy')
+    labels = np.lib.format.open_memmap(labels_path, mode='w+',
+                                       dtype=np.int32, shape=(height, width))
+    probabilities_path, probabilities = None, None
+    if return_probabilities:
+        probabilities_path = os.path.join(directory, 'probabilities.npy')
+        probabilities = np.lib.format.open_memmap(
+            probabilities_path, mode='w+', dtype=np.float32,
+            shape=(height, width, load_model(model_path).output_shape[-1]))
+    settings = {'tile_size': tile_size, 'batch_size': batch_size,
+                'statistics': statistics, 'dtype': dtype, 'dense': dense}
+    try:
+        # Workers are spawned, as the backend of keras does not survive
+        # forking
+        context = multiprocessing.get_context('spawn')
+        with context.Pool(workers, initializer=_init_worker,
+                          initargs=(cube_path, model_path, labels_path,
+                                    probabilities_path, threads,
+                                    settings)) as pool:
+            times = np.array(pool.map(_classify_band, bands, chunksize=1))
+        pixels_per_second = height * width / (times[:, 1].max() -
+                                              times[:, 0].min())
+        if output_directory is None:
+            labels = np.array(labels)
+            probabilities = np.array(probabilities) \
+                if return_probabilities else None
+    finally:
+        if output_directory is None:
+            shutil.rmtree(directory, ignore_errors=True)
+    return SceneClassification(labels, probabilities, pixels_per_second)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Classify every pixel of "
+                                                 "a hyperspectral scene with "
+                                                 "a trained keras model")
+    parser.add_argument('--dataset_path', type=str, required=True,
+                        help="Path to the scene in .npy or .mat format")
+    parser.add_argument('--model_path', type=str, required=True,
+                        help="Path to the trained model")
+    parser.add_argument('--output_path', type=str, required=True,
+                        help="Path of the .npy file the map of labels "
+                             "will be saved to. If it is a .tif file, "
+                             "labels and probabilities are streamed to "
+                             "tiled, compressed GeoTIFF files instead.")
+    parser.add_argument('--statistics_path', type=str, default=None,
+                        help="Path to statistics of the training data "
+                             "saved by the training script, samples are "
+                             "not normalized if not specified")
+    parser.add_argument('--probabilities_path', type=str, default=None,
+                        help="Path of the .npy or .tif file class "
+                             "probabilities will be saved to, they are "
+                             "not saved if not specified")
+    parser.add_argument('--probabilities_dtype', type=str, default='uint8',
+                        choices=['uint8', 'float16'],
+                        help="Data type of probabilities saved to GeoTIFF, "
+                             "uint8 probabilities are scaled to [0, 255]")
+    parser.add_argument('--tile_size', type=int, default=128,
+                        help="Height and width of tiles the scene is "
+                             "processed in")
+    parser.add_argument('--batch_size', type=int, default=None,
+                        help="Number of samples classified at once, by "
+                             "default the one tuned for the model with "
+                             "inference_tuning or 1024")
+    parser.add_argument('--dense', action='store_true',
+                        help="Convert a model built with build_3d_model "
+                             "into a fully convolutional one, which "
+                             "classifies whole tiles at once")
+    parser.add_argument('--workers', type=int, default=1,
+                        help="Number of processes classifying bands of "
+                             "rows of the scene")
+    parser.add_argument('--threads', type=int, default=None,
+                        help="Number of threads each process computes "
+                             "with, by default all cores are shared by "
+                             "the processes, a single process uses "
+                             "the number tuned for the model")
+    return parser.parse_args()
+
+
+def main(args):
+    statistics = RunningStatistics.load(args.statistics_path) \
+        if args.statistics_path is not None else None
+    return_probabilities = args.probabilities_path is not None
+    geotiff = args.output_path.endswith(('.tif', '.tiff'))
+    config = load_config(args.model_path)
+    if args.batch_size is None:
+        args.batch_size = config.batch_size if config is not None else 1024
+    dtype = np.dtype(config.dtype) if config is not None else np.float32
+    if args.workers > 1:
+        threads = args.threads or max(os.cpu_count() // args.workers, 1)
+        # Maps classified in parallel are memory-mapped next to the GeoTIFF
+        # files until they are written
+        directory = tempfile.mkdtemp(dir=os.path.dirname(
+            os.path.abspath(args.output_path))) if geotiff else None
+        try:
+            result = classify_scene_parallel(
+                args.dataset_path, args.model_path, workers=args.workers,
+                threads=threads, tile_size=args.tile_size,
+                batch_size=args.batch_size, statistics=statistics,
+                return_probabilities=return_probabilities, dtype=dtype,
+                dense=args.dense, output_directory=directory)
+            height, width = result.labels.shape
+            if geotiff:
+                tiles = ((rows, columns, result.labels[rows, columns],
+                          result.probabilities[rows, columns]
+                          if return_probabilities else None)
+                         for rows, columns in get_tiles(height, width,
+                                                        args.tile_size))
+                write_classification(tiles, height, width, args.output_path,
+                                     args.probabilities_path,
+                                     args.probabilities_dtype,
+                                     _get_block_size(args.tile_size))
+        finally:
+            if directory is not None:
+                shutil.rmtree(directory)
+        pixels_per_second = result.pixels_per_second
+    else:
+        if args.threads is not None:
+            limit_threads(args.threads)
+        elif config is not None:
+            limit_threads(config.intra_op_threads, config.inter_op_threads)
+        predict, neighbourhood_size = load_predictor(args.model_path,
+                                                     args.batch_size,
+                                                     args.dense)
+        cube = load_data(args.dataset_path, mmap=True)
+        height, width = cube.shape[HEIGHT], cube.shape[WIDTH]
+        if geotiff:
+            pixels_per_second = classify_scene_to_geotiff(
+                cube, predict, args.output_path, args.probabilities_path,
+                args.probabilities_dtype,
+                neighbourhood_size=neighbourhood_size,
+                tile_size=args.tile_size, batch_size=args.batch_size,
+                statistics=statistics, dtype=dtype, dense=args.dense)
+        else:
+            result = classify_scene(cube, predict,
+                                    neighbourhood_size=neighbourhood_size,
+                                    tile_size=args.tile_size,
+                                    batch_size=args.batch_size,
+                                    statistics=statistics,
+                                    return_probabilities=return_probabilities,
+                                    dtype=dtype, dense=args.dense)
+            pixels_per_second = result.pixels_per_second
+    if not geotiff:
+        np.save(args.output_path, result.labels)
+        if return_probabilities:
+            np.save(args.probabilities_path, result.probabilities)
+    print("Classified {} pixels, {:.1f} pixels/s".format(
+        height * width, pixels_per_second))
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    main(args)
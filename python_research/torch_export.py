@@ -0,0 +1,181 @@
+"""
+Export of trained torch models, i.e. Bass, ConvNet3D and the attention-based
+Model2, Model3 and Model4, to TorchScript modules running their
+inference-only predict method on CPU. Linear layers of the exported modules
+can be dynamically quantized to int8. A report compares accuracy and latency
+of the exported modules with the eager float32 model.
+"""
+import argparse
+import copy
+import json
+import time
+
+import numpy as np
+import torch
+
+
+class InferenceModule(torch.nn.Module):
+    """
+    Wrapper exposing the predict method of a model as forward, so that the
+    model can be traced without labels, loss or metric bookkeeping.
+    """
+
+    def __init__(self, model: torch.nn.Module):
+        super(InferenceModule, self).__init__()
+        self.model = model
+
+    def forward(self, x: torch.Tensor) -> torch.Tensor:
+        return self.model.predict(x)
+
+
+def quantize(model: torch.nn.Module) -> torch.nn.Module:
+    """
+    Dynamically quantize linear layers of a model to int8. Weights are
+    quantized per output channel ahead of time, activations on the fly.
+
+    :param model: Model in evaluation mode on CPU.
+    :return: Quantized copy of the model.
+    """
+    qconfig = torch.quantization.per_channel_dynamic_qconfig
+    return torch.quantization.quantize_dynamic(model, {torch.nn.Linear: qconfig}, dtype=torch.qint8)
+
+
+def export_model(model: torch.nn.Module, example: torch.Tensor,
+                 quantized: bool = False) -> torch.jit.ScriptModule:
+    """
+    Trace the predict method of a model into a TorchScript module running on CPU.
+
+    :param model: Trained model with a predict method.
+    :param example: Batch of input samples used for tracing, the exported module accepts batches
+        of any size.
+    :param quantized: Whether to dynamically quantize linear layers to int8.
+    :return: TorchScript module returning class probabilities.
+    """
+    module = InferenceModule(copy.deepcopy(model).cpu()).eval()
+    if quantized:
+        module = quantize(module)
+    with torch.no_grad():
+        return torch.jit.trace(module, example.cpu())
+
+
+def evaluate(predict, samples: np.ndarray, labels: np.ndarray,
+             batch_size: int) -> dict:
+    """
+    Measure accuracy and latency of a model.
+
+    :param predict: Function returning class probabilities of a batch of samples.
+    :param samples: Samples in the layout expected by the model.
+    :param labels: Labels of the samples.
+    :param batch_size: Number of samples classified at once.
+    :return: Accuracy, mean and 95th percentile of latency of a batch in milliseconds and
+             throughput in samples per second.
+    """
+    correct = 0
+    latencies = []
+    with torch.no_grad():
+        # The first calls of a TorchScript module optimize it, so they are not measured.
+        predict(torch.from_numpy(samples[:batch_size]))
+        for start in range(0, len(samples), batch_size):
+            x = torch.from_numpy(samples[start:start + batch_size])
+            begin = time.perf_counter()
+            probabilities = predict(x)
+            latencies.append(time.perf_counter() - begin)
+            predicted = torch.argmax(probabilities, dim=1).numpy()
+            correct += int(np.sum(predicted == labels[start:start + batch_size]))
+    latencies = np.asarray(latencies) * 1000
+    return {
+        "accuracy": correct / len(samples),
+        "latency_ms": float(np.mean(latencies)),
+        "latency_p95_ms": float(np.percentile(latencies, 95)),
+        "samples_per_second": len(samples) / (np.sum(latencies) / 1000)
+    }
+
+
+def get_report(model: torch.nn.Module, samples: np.ndarray, labels: np.ndarray,
+               batch_size: int = 1024, exported: dict = None) -> dict:
+    """
+    Compare exported modules with the eager float32 model on CPU.
+
+    :param model: Trained model with a predict method.
+    :param samples: Samples in the layout expected by the model.
+    :param labels: Labels of the samples, either integer or one-hot encoded.
+    :param batch_size: Number of samples classified at once.
+    :param exported: Exported modules by name, if not specified, float32 and int8 modules are
+        exported.
+    :return: Metrics of each variant, accuracy deltas are relative to the eager model.
+    """
+    samples = samples.astype(np.float32)
+    if labels.ndim > 1:
+        labels = np.argmax(labels, axis=1)
+    if exported is None:
+        example = torch.from_numpy(samples[:batch_size])
+        exported = {"torchscript": export_model(model, example),
+                    "torchscript_int8": export_model(model, example, quantized=True)}
+    eager = copy.deepcopy(model).cpu().eval()
+    report = {"eager": evaluate(eager.predict, samples, labels, batch_size)}
+    for name, module in exported.items():
+        report[name] = evaluate(module, samples, labels, batch_size)
+    for metrics in report.values():
+        metrics["accuracy_delta"] = metrics["accuracy"] - report["eager"]["accuracy"]
+        metrics["speedup"] = metrics["samples_per_second"] / \
+            report["eager"]["samples_per_second"]
+    return report
+
+
+def arguments() -> argparse.Namespace:
+    """
+    Argument parser method.
+
+    :return: Namespace object holding attributes.
+    """
+    parser = argparse.ArgumentParser(description="Export a trained torch model to TorchScript.")
+    parser.add_argument("--model_path", dest="model_path", type=str,
+                        help="Path to the model saved with torch.save.")
+    parser.add_argument("--samples_path", dest="samples_path", type=str,
+                        help="Path to the .npy file with samples in the layout expected by the "
+                             "model, e.g. (samples, 1, bands) for the attention-based models.")
+    parser.add_argument("--labels_path", dest="labels_path", type=str,
+                        help="Path to the .npy file with labels of the samples.")
+    parser.add_argument("--output_path", dest="output_path", type=str,
+                        help="Path prefix of the exported modules, they are saved to "
+                             "<output_path>.pt and <output_path>_int8.pt.")
+    parser.add_argument("--report_path", dest="report_path", type=str,
+                        help="Path to the JSON report. (Optional argument).")
+    parser.add_argument("--batch_size", dest="batch_size", type=int, default=1024,
+                        help="Number of samples classified at once.")
+    parser.add_argument("--threads", dest="threads", type=int, default=None,
+                        help="Number of intra-op threads, all cores are used if not "
+                             "specified.")
+    return parser.parse_args()
+
+
+def main(args: argparse.Namespace):
+    """
+    Export the model, save modules and report.
+
+    :param args: Parsed arguments.
+    :return: None.
+    """
+    if args.threads is not None:
+        torch.set_num_threads(args.threads)
+    model = torch.load(args.model_path, map_location="cpu")
+    samples = np.load(args.samples_path).astype(np.float32)
+    labels = np.load(args.labels_path)
+    example = torch.from_numpy(samples[:args.batch_size])
+    exported = {"torchscript": export_model(model, example),
+                "torchscript_int8": export_model(model, example, quantized=True)}
+    exported["torchscript"].save(args.output_path + ".pt")
+    exported["torchscript_int8"].save(args.output_path + "_int8.pt")
+    report = get_report(model, samples, labels, args.batch_size, exported)
+    for name, metrics in report.items():
+        print("{}: accuracy {:.4f} ({:+.4f}), {:.2f} ms per batch, {:.1f} samples/s, "
+              "{:.2f}x".format(name, metrics["accuracy"], metrics["accuracy_delta"],
+                               metrics["latency_ms"], metrics["samples_per_second"],
+                               metrics["speedup"]))
+    if args.report_path is not None:
+        with open(args.report_path, "w") as file:
+            json.dump(report, file, indent=4)
+
+
+if __name__ == "__main__":
+    main(args=arguments())
@@ -0,0 +1,58 @@
+import os
+
+import numpy as np
+import pytest
+
+from python_research.fastPSO.archive import FileArchive, MemoryArchive, \
+    SqliteArchive, open_archive
+from python_research.fastPSO.pso import Pso
+
+
+@pytest.mark.parametrize('name', ['archive.jsonl', 'archive.db'])
+def test_archive_keeps_first_scores_across_reopening(tmpdir, name):
+    path = os.path.join(str(tmpdir), name)
+    archive = open_archive(path)
+    assert isinstance(archive, SqliteArchive if name.endswith('.db')
+                      else FileArchive)
+    assert archive.get('1,2') is None
+    archive.put('1,2', 0.5)
+    archive.put_many([('1,2', 0.7), ('3,4', float('nan')), ((5, 6), 0.1)])
+    reopened = open_archive(path)
+    assert len(reopened) == 3
+    assert reopened.get('1,2') == 0.5
+    assert np.isnan(reopened.get('3,4'))
+    assert '3,4' in reopened and '7,8' not in reopened
+    assert reopened.get((5, 6)) == 0.1
+
+
+def test_memory_archive_keeps_first_scores():
+    archive = open_archive()
+    assert isinstance(archive, MemoryArchive)
+    archive.put_many([('1', 0.5), ('1', 0.7), ('2', float('nan'))])
+    assert len(archive) == 2 and archive.get('1') == 0.5
+    assert np.isnan(archive.get('2'))
+
+
+@pytest.mark.parametrize('name', ['archive.jsonl', 'archive.db'])
+def test_resumed_search_reuses_archived_scores(tmpdir, name):
+    path = os.path.join(str(tmpdir), name)
+    evaluated = []
+
+    def objective(position: np.ndarray) -> float:
+        evaluated.append(position)
+        return -float(np.sum(np.square(np.round(position) - 2)))
+
+    def search():
+        np.random.seed(0)
+        return Pso(objective, np.zeros(2), np.full(2, 5.), swarm_size=8,
+                   maximum_iterations=5, minimum_step=-1,
+                   minimum_improvement=-np.inf,
+                   archive=open_archive(path)).run()
+
+    position, score = search()
+    evaluations = len(evaluated)
+    assert 0 < evaluations <= 8 * 5
+    resumed_position, resumed_score = search()
+    assert len(evaluated) == evaluations
+    np.testing.assert_array_equal(resumed_position, position)
+    assert resumed_score == score
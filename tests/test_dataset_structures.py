@@ -0,0 +1,104 @@
+import numpy as np
+import pytest
+import torch
+
+from python_research.dataset_structures import BatchLoader, ConcatDataset, \
+    Dataset, HyperspectralDataset, LazyHyperspectralDataset, \
+    OrderedDataLoader, normalize_inplace
+
+
+def test_concat_dataset_converts_labels_assigned_after_compacting():
+    dataset = ConcatDataset([Dataset(np.zeros((3, 2)), np.array([0, 1, 2])),
+                             Dataset(np.ones((2, 2)), np.array([3, 4]))])
+    dataset.compact()
+    dataset.labels = np.array([4, 3, 2, 1, 0])
+    dataset.convert_to_tensors()
+    assert isinstance(dataset.labels, torch.Tensor)
+    np.testing.assert_array_equal(dataset.labels.numpy(), [4, 3, 2, 1, 0])
+    np.testing.assert_array_equal(dataset.data.numpy(),
+                                  [[0, 0]] * 3 + [[1, 1]] * 2)
+
+
+def _hyperspectral_scene():
+    cube = np.arange(6 * 5 * 3, dtype=np.uint16).reshape((6, 5, 3))
+    ground_truth = np.tile(np.array([0, 1, 2, 1, 2]), (6, 1))
+    return cube, ground_truth
+
+
+def _sorted_samples(samples: np.ndarray, labels: np.ndarray):
+    samples = samples.reshape((len(samples), -1))
+    order = np.lexsort(samples.T[::-1])
+    return samples[order], labels[order]
+
+
+@pytest.mark.parametrize('make_dataset', [
+    lambda: Dataset(np.arange(24, dtype=np.uint8).reshape((12, 2)),
+                    np.repeat(np.arange(3, dtype=np.uint8), 4)),
+    lambda: HyperspectralDataset(*_hyperspectral_scene(),
+                                 neighbourhood_size=3),
+    lambda: LazyHyperspectralDataset(*_hyperspectral_scene(),
+                                     neighbourhood_size=3),
+    lambda: LazyHyperspectralDataset(*_hyperspectral_scene(),
+                                     dtype=np.float16)])
+def test_ordered_data_loader_returns_float32_batches_of_all_samples(
+        make_dataset):
+    dataset = make_dataset()
+    loader = OrderedDataLoader(dataset, batch_size=4, seed=0)
+    batches = list((samples.clone(), labels.clone())
+                   for samples, labels in loader)
+    assert len(batches) * 4 == len(dataset)
+    for samples, labels in batches:
+        assert samples.dtype == labels.dtype == torch.float32
+        assert samples.shape == (4, ) + dataset.shape[1:]
+    samples = torch.cat([samples for samples, _ in batches]).numpy()
+    labels = torch.cat([labels for _, labels in batches]).numpy()
+    # Classes are returned in a fixed order
+    np.testing.assert_array_equal(labels, np.sort(labels))
+    expected_samples, expected_labels = dataset[:]
+    expected_samples, expected_labels = _sorted_samples(
+        expected_samples.astype(np.float32),
+        expected_labels.astype(np.float32))
+    samples, labels = _sorted_samples(samples, labels)
+    np.testing.assert_array_equal(samples, expected_samples)
+    np.testing.assert_array_equal(labels, expected_labels)
+
+
+def test_batch_loader_rejects_samples_deleted_after_creating_it():
+    dataset = Dataset(np.zeros((8, 2)), np.zeros(8))
+    loader = BatchLoader(dataset, batch_size=4, shuffle=False)
+    dataset.delete_by_indices([0])
+    with pytest.raises(IndexError):
+        list(loader)
+
+
+def test_normalized_crops_share_the_cube_of_a_lazy_dataset():
+    dataset = LazyHyperspectralDataset(*_hyperspectral_scene(),
+                                       neighbourhood_size=5,
+                                       dtype=np.float32)
+    samples, _ = dataset[:]
+    for neighbourhood_size in [3, 5]:
+        cropped = dataset.crop(neighbourhood_size)
+        cropped.normalize_min_max()
+        cropped.standardize(0.5, 2.)
+        assert cropped.storage.cube is dataset.storage.cube
+        offset = 2 - neighbourhood_size // 2
+        window = slice(offset, offset + neighbourhood_size)
+        expected = samples[:, window, window]
+        expected = (expected - expected.min()) / \
+            (expected.max() - expected.min())
+        expected = (expected - 0.5) / 2.
+        np.testing.assert_allclose(cropped[:][0], expected, rtol=1e-6)
+        batch = np.empty((4, ) + cropped.shape[1:], dtype=np.float32)
+        cropped.gather(np.arange(4), batch, np.empty(4, dtype=np.uint8))
+        np.testing.assert_allclose(batch, expected[:4], rtol=1e-6)
+    np.testing.assert_array_equal(dataset[:][0], samples)
+
+
+def test_normalize_inplace_keeps_floating_dtype_of_read_only_data():
+    data = np.arange(6, dtype=np.float32).reshape((3, 2))
+    data.flags.writeable = False
+    normalized = normalize_inplace(data, 1., 2.)
+    assert normalized is not data and normalized.dtype == np.float32
+    np.testing.assert_array_equal(normalized, (data - 1.) / 2.)
+    np.testing.assert_array_equal(data, np.arange(6).reshape((3, 2)))
+    assert normalize_inplace(np.arange(3), 0., 1.).dtype == np.float64
@@ -0,0 +1,40 @@
+import os
+
+import numpy as np
+import torch
+
+from python_research.inference_server import load_predictor
+from python_research.inference_tuning import InferenceConfig, \
+    get_config_path, load_config, save_config
+
+
+class LinearClassifier(torch.nn.Module):
+    def __init__(self):
+        super(LinearClassifier, self).__init__()
+        self.linear = torch.nn.Linear(4, 3)
+
+    def forward(self, x: torch.Tensor) -> torch.Tensor:
+        return self.linear(x)
+
+    def predict(self, x: torch.Tensor) -> torch.Tensor:
+        return torch.softmax(self.forward(x), dim=1)
+
+
+def test_load_predictor_serves_torch_models_in_tuned_dtype(tmpdir):
+    model = LinearClassifier().eval()
+    model_path = os.path.join(str(tmpdir), 'model.pt')
+    torch.save(model, model_path)
+    save_config(InferenceConfig(batch_size=8, intra_op_threads=1,
+                                inter_op_threads=1, dtype='float64'),
+                get_config_path(model_path))
+    threads = torch.get_num_threads()
+    try:
+        predict = load_predictor(model_path, 8, load_config(model_path))
+        samples = np.random.RandomState(0).uniform(size=(5, 4))
+        probabilities = predict(samples.astype(np.float32))
+    finally:
+        torch.set_num_threads(threads)
+    with torch.no_grad():
+        expected = model.double().predict(torch.from_numpy(samples))
+    assert probabilities.shape == (5, 3)
+    np.testing.assert_allclose(probabilities, expected.numpy(), rtol=1e-6)
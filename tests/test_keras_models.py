@@ -0,0 +1,28 @@
+import numpy as np
+import pytest
+
+from python_research.keras_models import build_3d_model, \
+    build_settings_for_dataset, build_dense_3d_model
+from python_research.scene_inference import classify_scene, \
+    get_keras_predictor
+
+
+@pytest.mark.parametrize('neighbourhood_size', [5, 7, 9])
+def test_dense_3d_model_returns_probabilities_of_patches(neighbourhood_size):
+    cube = np.random.RandomState(0).uniform(
+        size=(13, 11, 4)).astype(np.float32)
+    settings = build_settings_for_dataset((neighbourhood_size,
+                                           neighbourhood_size))
+    model = build_3d_model(settings, 3, cube.shape[-1])
+    assert model.input_shape[1:] == (neighbourhood_size, neighbourhood_size,
+                                     cube.shape[-1])
+    patches = classify_scene(cube, get_keras_predictor(model, 64),
+                             neighbourhood_size=neighbourhood_size,
+                             tile_size=8, batch_size=64,
+                             return_probabilities=True)
+    dense = classify_scene(cube, build_dense_3d_model(model).predict,
+                           neighbourhood_size=neighbourhood_size,
+                           tile_size=8, return_probabilities=True,
+                           dense=True)
+    np.testing.assert_allclose(dense.probabilities, patches.probabilities,
+                               atol=1e-6)
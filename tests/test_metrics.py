@@ -0,0 +1,41 @@
+import numpy as np
+import torch
+from sklearn.metrics import accuracy_score, balanced_accuracy_score, \
+    cohen_kappa_score
+
+from python_research.metrics import ConfusionMatrix
+
+
+def test_confusion_matrix_metrics_match_sklearn():
+    random_state = np.random.RandomState(0)
+    labels = random_state.randint(0, 5, size=1000)
+    predictions = np.where(random_state.uniform(size=1000) < 0.7, labels,
+                           random_state.randint(0, 5, size=1000))
+    matrix = ConfusionMatrix(5)
+    for start in range(0, 1000, 300):
+        matrix.update(predictions[start:start + 300],
+                      labels[start:start + 300])
+    assert matrix.count == 1000
+    np.testing.assert_allclose(matrix.overall_accuracy,
+                               accuracy_score(labels, predictions))
+    np.testing.assert_allclose(matrix.average_accuracy,
+                               balanced_accuracy_score(labels, predictions))
+    np.testing.assert_allclose(matrix.kappa,
+                               cohen_kappa_score(labels, predictions))
+
+
+def test_confusion_matrix_counts_tensors_and_merges():
+    labels = np.array([0, 1, 2, 2, 1])
+    predictions = np.array([0, 2, 2, 1, 1])
+    merged = ConfusionMatrix(3).update(torch.from_numpy(predictions[:2]),
+                                       torch.from_numpy(labels[:2]))
+    merged.merge(ConfusionMatrix(3).update(predictions[2:], labels[2:]))
+    np.testing.assert_array_equal(
+        merged.matrix, ConfusionMatrix(3).update(predictions, labels).matrix)
+
+
+def test_confusion_matrix_metrics_of_no_samples():
+    matrix = ConfusionMatrix(3)
+    assert matrix.overall_accuracy == 0.
+    assert matrix.kappa == 0.
+    assert np.all(np.isnan(matrix.class_accuracies))
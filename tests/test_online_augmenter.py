@@ -0,0 +1,23 @@
+import numpy as np
+
+from python_research.augmentation.online_augmenter import OnlineAugmenter
+from python_research.augmentation.transformations import \
+    RandomFlipTransform
+from python_research.dataset_structures import Dataset
+
+
+class ConstantModel:
+    output_shape = (None, 3)
+
+    def predict(self, x: np.ndarray, batch_size: int) -> np.ndarray:
+        probabilities = np.zeros((len(x), 3))
+        probabilities[:, 1] = 1
+        return probabilities
+
+
+def test_evaluate_returns_no_accuracies_of_empty_dataset():
+    dataset = Dataset(np.zeros((0, 5, 5, 2)), np.zeros(0, dtype=np.uint8))
+    accuracy, class_accuracies = OnlineAugmenter().evaluate(
+        ConstantModel(), dataset, RandomFlipTransform())
+    assert accuracy == 0.
+    assert len(class_accuracies) == 0
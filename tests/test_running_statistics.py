@@ -0,0 +1,45 @@
+import os
+
+import numpy as np
+import pytest
+
+from python_research.running_statistics import RunningStatistics
+
+
+@pytest.mark.parametrize('band_axis', [None, -1])
+def test_merged_statistics_of_chunks_match_numpy(band_axis):
+    random_state = np.random.RandomState(0)
+    samples = random_state.normal(1000., 3., size=(1000, 3, 3, 4)) \
+        .astype(np.float32)
+    first, second = RunningStatistics(band_axis), RunningStatistics(band_axis)
+    for start, stop in [(0, 1), (1, 300), (300, 301), (301, 700)]:
+        first.update(samples[start:stop])
+    second.update(samples[700:])
+    statistics = first.merge(second)
+    assert statistics.count * (1 if band_axis is None else 4) == samples.size
+
+    def reduce(function, array):
+        if band_axis is None:
+            return function(array)
+        # Per-band statistics keep the dimensions of a sample
+        return function(array, axis=(0, 1, 2), keepdims=True)[0]
+    np.testing.assert_allclose(statistics.mean,
+                               reduce(np.mean, samples.astype(np.float64)),
+                               rtol=1e-10)
+    np.testing.assert_allclose(statistics.std,
+                               reduce(np.std, samples.astype(np.float64)),
+                               rtol=1e-8)
+    np.testing.assert_array_equal(statistics.min, reduce(np.amin, samples))
+    np.testing.assert_array_equal(statistics.max, reduce(np.amax, samples))
+
+
+def test_merge_ignores_empty_statistics(tmpdir):
+    statistics = RunningStatistics().update(np.arange(10.))
+    statistics.merge(RunningStatistics())
+    path = os.path.join(str(tmpdir), 'statistics.json')
+    statistics.save(path)
+    loaded = RunningStatistics.load(path)
+    assert loaded.count == 10
+    np.testing.assert_allclose(loaded.mean, 4.5)
+    np.testing.assert_allclose(loaded.std, np.std(np.arange(10.)))
+    assert (loaded.min, loaded.max) == (0., 9.)
@@ -0,0 +1,36 @@
+import os
+
+import numpy as np
+
+from python_research.sample_cache import BLOCK_SIZE, BLOCKS_COUNT, \
+    SampleCache, fingerprint_file
+
+
+def test_sample_cache_evicts_least_recently_used_entries(tmpdir):
+    array = np.zeros(1000)
+    entry_size = array.nbytes + 128
+    cache = SampleCache(str(tmpdir), max_size_gb=2.5 * entry_size / 2 ** 30)
+    cache.store('a', data=array)
+    cache.store('b', data=array)
+    os.utime(os.path.join(str(tmpdir), 'a'), (1, 1))
+    os.utime(os.path.join(str(tmpdir), 'b'), (2, 2))
+    np.testing.assert_array_equal(cache.load('a')['data'], array)
+    cache.store('c', data=array + 1)
+    assert sorted(key for key, _, _ in cache.entries()) == ['a', 'c']
+    assert cache.load('b') is None
+    np.testing.assert_array_equal(cache.load('c')['data'], array + 1)
+
+
+def test_fingerprint_of_large_file_changes_when_modified_between_blocks(
+        tmpdir):
+    path = os.path.join(str(tmpdir), 'scene.npy')
+    with open(path, 'wb') as file:
+        file.write(bytes(2 * BLOCKS_COUNT * BLOCK_SIZE))
+    fingerprint = fingerprint_file(path)
+    assert fingerprint_file(path) == fingerprint
+    with open(path, 'r+b') as file:
+        # Between the first and the second hashed block
+        file.seek(BLOCK_SIZE + 1)
+        file.write(b'\x01')
+    os.utime(path, ns=(0, os.stat(path).st_mtime_ns + 1))
+    assert fingerprint_file(path) != fingerprint
@@ -0,0 +1,42 @@
+import os
+
+import numpy as np
+import pytest
+
+from python_research.keras_models import build_3d_model, \
+    build_settings_for_dataset
+from python_research.scene_inference import classify_scene, \
+    classify_scene_parallel, get_keras_predictor
+
+
+@pytest.fixture
+def scene(tmpdir):
+    cube = np.random.RandomState(0).uniform(
+        size=(20, 15, 4)).astype(np.float32)
+    cube_path = os.path.join(str(tmpdir), 'scene.npy')
+    np.save(cube_path, cube)
+    model = build_3d_model(build_settings_for_dataset((5, 5)), 3,
+                           cube.shape[-1])
+    model_path = os.path.join(str(tmpdir), 'model.h5')
+    model.save(model_path)
+    return cube, cube_path, model, model_path
+
+
+def test_classify_scene_parallel_returns_labels_of_classify_scene(scene):
+    cube, cube_path, model, model_path = scene
+    expected = classify_scene(cube, get_keras_predictor(model, 64),
+                              neighbourhood_size=5, tile_size=8,
+                              batch_size=64, return_probabilities=True)
+    result = classify_scene_parallel(cube_path, model_path, workers=2,
+                                     tile_size=8, batch_size=64,
+                                     return_probabilities=True)
+    np.testing.assert_allclose(result.probabilities,
+                               expected.probabilities, atol=1e-6)
+    np.testing.assert_array_equal(result.labels, expected.labels)
+
+
+def test_classify_scene_parallel_raises_errors_of_workers(scene):
+    _, cube_path, _, model_path = scene
+    with pytest.raises((IOError, ValueError)):
+        classify_scene_parallel(cube_path, model_path + '.missing',
+                                workers=2, tile_size=8)
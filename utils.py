@@ -12,9 +12,10 @@ from base64 import b64encode
 from ipyleaflet import Map, ImageOverlay
 from matplotlib import pyplot as plt
 from matplotlib.patches import Rectangle
-from sklearn.metrics import confusion_matrix
 from python_research.dataset_structures import HyperspectralDataset
 from python_research.dataset_structures import ConcatDataset
+from python_research.sample_cache import SampleCache
+from python_research.metrics import ConfusionMatrix
 
 
 def normalize_to_zero_one(image_data: np.ndarray) -> np.ndarray:
@@ -118,13 +119,12 @@ def calculate_class_accuracy(y_pred: np.ndarray,
     :param classes_count: Number of classes in the dataset
     :return: An accuracy for each class individually
     """
-    matrix = confusion_matrix(y_true, y_pred,
-                              labels=[x for x in range(classes_count)])
-    matrix = matrix / matrix.astype(np.float32).sum(axis=1)
-    return np.diagonal(matrix)
+    return ConfusionMatrix(classes_count).update(y_pred,
+                                                 y_true).class_accuracies
 
 
-def load_patches(directory: os.PathLike, neighborhood_size: int=1):
+def load_patches(directory: os.PathLike, neighborhood_size: int=1,
+                 dtype: type=np.float64, cache: SampleCache=None):
     patches_paths = [x for x in os.listdir(directory)
                      if 'gt' not in x and 'patch' in x]
     gt_paths = [x for x in os.listdir(directory) if 'gt' in x and 'patch' in x]
@@ -135,18 +135,23 @@ def load_patches(directory: os.PathLike, neighborhood_size: int=1):
     for patch_path, gt_path in zip(patches_paths, gt_paths):
         data.append(HyperspectralDataset(os.path.join(directory, patch_path),
                                          os.path.join(directory, gt_path),
-                                         neighborhood_size))
+                                         neighborhood_size, dtype=dtype,
+                                         cache=cache))
     test_data = HyperspectralDataset(os.path.join(directory, test_paths[0]),
                                      os.path.join(directory, test_paths[1]),
-                                     neighborhood_size)
+                                     neighborhood_size, dtype=dtype,
+                                     cache=cache)
     return ConcatDataset(data), test_data
 
 
-def combine_patches(patches, patches_gt, test, test_gt, neighborhood_size:int=1):
+def combine_patches(patches, patches_gt, test, test_gt, neighborhood_size:int=1,
+                    dtype: type=np.float64):
     data = []
     for patch, gt in zip(patches, patches_gt):
-        data.append(HyperspectralDataset(patch, gt, neighborhood_size))
-    test_set = HyperspectralDataset(test, test_gt, neighborhood_size)
+        data.append(HyperspectralDataset(patch, gt, neighborhood_size,
+                                         dtype=dtype))
+    test_set = HyperspectralDataset(test, test_gt, neighborhood_size,
+                                    dtype=dtype)
     return ConcatDataset(data), test_set
 
 